@@ -0,0 +1,76 @@
+from collections import deque
+from typing import Iterable, Iterator
+
+
+class AhoCorasick:
+    """
+    Matches many literal patterns in one pass over the text, in time linear in the text and the matches.
+
+    `finditer` reports every occurrence of every pattern, overlapping ones included, as
+    `(start, end, index)` where `index` is the position of the pattern in the constructor argument.
+    `advance` steps the automaton one character at a time, for text that arrives in pieces.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._outputs: list[list[int]] = [[]]
+        # Length of the pattern prefix each state stands for.
+        self._depth: list[int] = [0]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                raise ValueError("Patterns must not be empty")
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                    self._depth.append(self._depth[state] + 1)
+                state = next_state
+            self._outputs[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def finditer(self, text: str) -> Iterator[tuple[int, int, int]]:
+        goto, fail, outputs, patterns = self._goto, self._fail, self._outputs, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                yield position + 1 - len(patterns[index]), position + 1, index
+
+    def advance(self, state: int, char: str) -> int:
+        """Return the state after reading `char` in `state`; the start state is 0."""
+        goto, fail = self._goto, self._fail
+        while state and char not in goto[state]:
+            state = fail[state]
+        return goto[state].get(char, 0)
+
+    def outputs(self, state: int) -> list[int]:
+        """Indexes of the patterns that end at `state`."""
+        return self._outputs[state]
+
+    def depth(self, state: int) -> int:
+        """How many of the last characters read may still be the start of a match."""
+        return self._depth[state]
+
+    def search(self, text: str) -> tuple[int, int, int] | None:
+        """Return the first match to end in `text`, or None."""
+        return next(self.finditer(text), None)
@@ -0,0 +1,35 @@
+"""
+A minimal runner for the `*_checks` modules: runnable assertions against local fakes, no DIAL needed.
+
+Every check is a function, sync or async, that fails by raising. `run_checks` runs them all, prints one
+line per check and returns the number of failures, so a module ends with
+
+    if __name__ == "__main__":
+        raise SystemExit(1 if run_checks(CHECKS) else 0)
+"""
+import asyncio
+import inspect
+import time
+import traceback
+from typing import Callable
+
+
+def run_checks(checks: list[Callable]) -> int:
+    if not __debug__:
+        raise SystemExit("The checks use assert: run them without -O")
+    failures = 0
+    for check in checks:
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(check):
+                asyncio.run(check())
+            else:
+                check()
+        except Exception:
+            failures += 1
+            print(f"FAIL {check.__name__}")
+            traceback.print_exc()
+        else:
+            print(f"ok   {check.__name__} ({time.perf_counter() - started:.2f} s)")
+    print(f"{len(checks) - failures}/{len(checks)} checks passed")
+    return failures
@@ -0,0 +1,38 @@
+from typing import TYPE_CHECKING
+
+from pydantic import SecretStr
+
+from tasks._constants import DIAL_URL, API_KEY
+from tasks.metrics import MetricsCallbackHandler
+
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+
+DEPLOYMENT = 'gpt-4.1-nano-2025-04-14'
+
+
+def create_client(max_connections: int = 100, max_keepalive_connections: int = 20, **kwargs) -> 'AzureChatOpenAI':
+    """
+    Create a DIAL chat client whose sync and async HTTP clients keep a pool of connections, so one
+    client can be shared by every guardrail stage and request. Its calls are reported to the metrics
+    registry.
+
+    langchain_openai is only imported here, so modules that hold a client import quickly until they use it.
+    """
+    import httpx
+    from langchain_openai import AzureChatOpenAI
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+    options = dict(
+        temperature=0.0,
+        seed=1234,
+        azure_deployment=DEPLOYMENT,
+        azure_endpoint=DIAL_URL,
+        api_key=SecretStr(API_KEY),
+        api_version="",
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits),
+        callbacks=[MetricsCallbackHandler()],
+    )
+    options.update(kwargs)
+    return AzureChatOpenAI(**options)
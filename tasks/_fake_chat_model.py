@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    A local chat model that answers with scripted responses, for exercising the guardrails without DIAL.
+
+    Every call takes the next response from `responses`, cycling when they run out. A response is either
+    a string, which is streamed in chunks of `chunk_size` characters, or a list of the exact chunks to
+    stream. `latency` is the delay in seconds before every chunk; pass a callable to draw it from a
+    distribution.
+    """
+
+    responses: list[str | list[str]]
+    chunk_size: int = 4
+    latency: float | Callable[[], float] = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-model"
+
+    def _next_chunks(self) -> list[str]:
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        if isinstance(response, str):
+            return [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)]
+        return list(response)
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _generate(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: CallbackManagerForLLMRun | None = None,
+            **kwargs: Any
+    ) -> ChatResult:
+        content = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _agenerate(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: AsyncCallbackManagerForLLMRun | None = None,
+            **kwargs: Any
+    ) -> ChatResult:
+        content = "".join([chunk.message.content async for chunk in self._astream(messages, stop, run_manager, **kwargs)])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: CallbackManagerForLLMRun | None = None,
+            **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._next_chunks():
+            time.sleep(self._delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(
+            self,
+            messages: list[BaseMessage],
+            stop: list[str] | None = None,
+            run_manager: AsyncCallbackManagerForLLMRun | None = None,
+            **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self._next_chunks():
+            await asyncio.sleep(self._delay())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, TextIO
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnablePassthrough
+from pydantic import BaseModel
+
+
+@dataclass
+class BatchResult:
+    index: int
+    input: str
+    result: BaseModel | None = None
+    error: str | None = None
+    # `local` when the verdict came from the local checks, `llm` when from the chain.
+    source: str | None = None
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'index': self.index,
+            'input': self.input,
+            'result': self.result.model_dump() if self.result is not None else None,
+            'error': self.error,
+            'source': self.source,
+        }, ensure_ascii=False)
+
+
+def prepare_chain(
+        chain: Runnable,
+        requests_per_second: float | None = None,
+        max_retries: int = 3
+) -> Runnable:
+    """Rate limit every attempt of `chain` and retry failed items with exponential backoff and jitter."""
+    if requests_per_second:
+        limiter = InMemoryRateLimiter(requests_per_second=requests_per_second, check_every_n_seconds=0.01)
+
+        def acquire(value: Any) -> Any:
+            limiter.acquire()
+            return value
+
+        async def aacquire(value: Any) -> Any:
+            await limiter.aacquire()
+            return value
+
+        chain = RunnableLambda(acquire, afunc=aacquire) | chain
+    if max_retries:
+        # `*_as_completed` on a retry binding goes straight to the chain it wraps and never retries, while
+        # a sequence runs every item through `invoke`, retries included.
+        chain = RunnablePassthrough() | chain.with_retry(stop_after_attempt=max_retries + 1, wait_exponential_jitter=True)
+    return chain
+
+
+def _check_locally(
+        inputs: list[str],
+        local: Callable[[str], BaseModel | None] | None
+) -> tuple[list[BatchResult], list[BatchResult]]:
+    """Split the inputs into results decided locally and the ones left for the chain."""
+    decided, remaining = [], []
+    for index, text in enumerate(inputs):
+        verdict = local(text) if local is not None else None
+        if verdict is not None:
+            decided.append(BatchResult(index, text, verdict, source='local'))
+        else:
+            remaining.append(BatchResult(index, text, source='llm'))
+    return decided, remaining
+
+
+def _record(result: BatchResult, output: BaseModel | Exception, sink: TextIO | None):
+    if isinstance(output, Exception):
+        result.error = f"{type(output).__name__}: {output}"
+    else:
+        result.result = output
+    if sink is not None:
+        sink.write(result.to_json() + '\n')
+        sink.flush()
+
+
+def validate_batch(
+        chain: Runnable,
+        inputs: Iterable[str],
+        input_key: str,
+        local: Callable[[str], BaseModel | None] | None = None,
+        max_concurrency: int = 8,
+        requests_per_second: float | None = None,
+        max_retries: int = 3,
+        sink: TextIO | None = None
+) -> list[BatchResult]:
+    """
+    Validate every input with `chain` through `batch`, at most `max_concurrency` at a time.
+
+    Inputs that `local` can decide never reach the chain. An item that still fails after `max_retries`
+    retries is reported with its error instead of failing the batch. Every result is written to
+    `sink` as a JSON line as soon as it is known; the returned list is in input order.
+    """
+    decided, remaining = _check_locally(list(inputs), local)
+    for result in decided:
+        _record(result, result.result, sink)
+
+    chain = prepare_chain(chain, requests_per_second, max_retries)
+    config = RunnableConfig(max_concurrency=max_concurrency)
+    for position, output in chain.batch_as_completed(
+            [{input_key: result.input} for result in remaining], config=config, return_exceptions=True
+    ):
+        _record(remaining[position], output, sink)
+
+    return sorted(decided + remaining, key=lambda result: result.index)
+
+
+async def avalidate_batch(
+        chain: Runnable,
+        inputs: Iterable[str],
+        input_key: str,
+        local: Callable[[str], BaseModel | None] | None = None,
+        max_concurrency: int = 8,
+        requests_per_second: float | None = None,
+        max_retries: int = 3,
+        sink: TextIO | None = None
+) -> list[BatchResult]:
+    """The async version of `validate_batch`, built on `abatch_as_completed`."""
+    decided, remaining = _check_locally(list(inputs), local)
+    for result in decided:
+        _record(result, result.result, sink)
+
+    chain = prepare_chain(chain, requests_per_second, max_retries)
+    config = RunnableConfig(max_concurrency=max_concurrency)
+    async for position, output in chain.abatch_as_completed(
+            [{input_key: result.input} for result in remaining], config=config, return_exceptions=True
+    ):
+        _record(remaining[position], output, sink)
+
+    return sorted(decided + remaining, key=lambda result: result.index)
+
+
+def read_inputs(lines: Iterable[str], field: str) -> list[str]:
+    """Read one input per JSONL line: `field` of an object, a bare JSON string, or the raw line."""
+    inputs = []
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            inputs.append(line)
+            continue
+        if isinstance(record, dict):
+            inputs.append(str(record.get(field, '')))
+        elif isinstance(record, str):
+            inputs.append(record)
+        else:
+            inputs.append(line)
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a JSONL file of chat turns with the t_2 or t_3 validator.")
+    parser.add_argument('validator', choices=['input', 'output'], help="input: t_2 prompt injections, output: t_3 PII leaks")
+    parser.add_argument('path', help="JSONL file with one turn per line, '-' for stdin")
+    parser.add_argument('--field', default='content', help="Field holding the text in every JSON object")
+    parser.add_argument('--output', '-o', help="Where to write the JSONL results (default: stdout)")
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    parser.add_argument('--requests-per-second', type=float, default=None)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument(
+        '--local-first', action=argparse.BooleanOptionalAction, default=None,
+        help="Decide what the local checks are sure about without the LLM (default: on for input, off for output)"
+    )
+    args = parser.parse_args()
+
+    if args.validator == 'input':
+        from tasks.t_2.input_llm_based_validation import avalidate_many
+    else:
+        from tasks.t_3.output_llm_based_validation import avalidate_many
+
+    if args.path == '-':
+        inputs = read_inputs(sys.stdin, args.field)
+    else:
+        with open(args.path, encoding='utf-8') as source:
+            inputs = read_inputs(source, args.field)
+    sink = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+
+    # The output patterns miss PII they cannot see, such as numbers spelled out, so only input is local-first by default.
+    local_first = args.validator == 'input' if args.local_first is None else args.local_first
+    try:
+        results = asyncio.run(avalidate_many(
+            inputs,
+            local_first=local_first,
+            max_concurrency=args.max_concurrency,
+            requests_per_second=args.requests_per_second,
+            max_retries=args.max_retries,
+            sink=sink
+        ))
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+
+    invalid = sum(1 for result in results if result.result is not None and not result.result.valid)
+    errors = sum(1 for result in results if result.error)
+    local = sum(1 for result in results if result.source == 'local')
+    print(f"{len(results)} validated: {invalid} invalid, {errors} errors, {local} decided locally", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+An OpenAI-style chat completions gateway in front of the guardrails.
+
+Every request to `POST /v1/chat/completions` goes through the input pipeline (local rules, then the
+LLM validator), then the model, and the answer is streamed back through a streaming PII guardrail,
+as server-sent events with `"stream": true` or as one completion otherwise. A blocked input is
+answered with `finish_reason: "content_filter"`.
+
+The conversation history is kept by the gateway, never taken from the caller: a request sends only
+the new user message, which is the only text the input pipeline has to check. `POST /v1/sessions`
+opens a session and returns its id; requests with that id in an `X-Session-Id` header continue the
+conversation kept for it, the others start from scratch. Session ids are issued by the gateway and
+unguessable, so a caller cannot pick one and read into someone else's conversation. The gateway
+always puts its own system prompt and profile first; system messages from the caller are ignored.
+
+All requests share one pooled upstream client. `GET /metrics` serves the metrics in the Prometheus
+format and `GET /healthz` reports the number of sessions.
+
+Run with `python -m tasks.gateway.app --port 8080`.
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Callable
+
+from aiohttp import web
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from tasks.history import ConversationHistory
+from tasks.metrics import MetricsRegistry, NullRegistry, get_registry, set_registry
+from tasks.pipeline import INPUT_PIPELINE, GuardrailPipeline
+from tasks.t_3.async_guardrail_stream import StreamingGuardrail, astream_guarded
+from tasks.t_3.streaming_pii_guardrail import PROFILE, SYSTEM_PROMPT, CascadingPIIGuardrail, StreamingPIIGuardrail
+
+# Streaming guardrails by name, with whether their analysis blocks and should run off the event loop.
+GUARDRAILS: dict[str, tuple[Callable[[], StreamingGuardrail], bool]] = {
+    'regex': (StreamingPIIGuardrail, False),
+    'cascading': (CascadingPIIGuardrail, True),
+}
+
+
+@dataclass
+class Session:
+    history: ConversationHistory
+    # Turns of one session run one after the other, so each sees the history of the previous one.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = 0.0
+
+
+class SessionStore:
+    """
+    Conversation state per session id, evicting the least recently used sessions and the idle ones.
+    Only ids issued by `create` are known.
+    """
+
+    def __init__(
+            self,
+            prefix: list[BaseMessage],
+            max_sessions: int = 10000,
+            ttl: float = 3600,
+            history_tokens: int = 3000,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self.prefix = prefix
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_tokens = history_tokens
+        self.clock = clock
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self) -> str:
+        session_id = secrets.token_urlsafe(24)
+        self._sessions[session_id] = Session(
+            ConversationHistory(self.prefix, max_tokens=self.history_tokens), last_used=self.clock()
+        )
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session_id
+
+    def get(self, session_id: str) -> Session | None:
+        """The session with `session_id`, or None if it was never issued, was evicted or has expired."""
+        now = self.clock()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if now - session.last_used > self.ttl:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+
+class RequestError(Exception):
+    pass
+
+
+class Gateway:
+    def __init__(
+            self,
+            client: BaseChatModel,
+            input_pipeline: GuardrailPipeline | None,
+            guardrail: str = 'regex',
+            max_sessions: int = 10000,
+            history_tokens: int = 3000
+    ):
+        self.client = client
+        self.input_pipeline = input_pipeline
+        self.guardrail_factory, self.offload = GUARDRAILS[guardrail]
+        self.prefix = [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=PROFILE)]
+        self.sessions = SessionStore(self.prefix, max_sessions=max_sessions, history_tokens=history_tokens)
+        self.model = getattr(client, 'deployment_name', None) or getattr(client, 'model_name', None) or 'guardrail-gateway'
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 2)
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        app.router.add_post('/v1/sessions', self.create_session)
+        app.router.add_get('/metrics', self.metrics)
+        app.router.add_get('/healthz', self.healthz)
+        return app
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'sessions': len(self.sessions)})
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        session_id = self.sessions.create()
+        return web.json_response(
+            {'id': session_id, 'object': 'session'}, status=201, headers={'X-Session-Id': session_id}
+        )
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        registry = get_registry()
+        text = registry.to_prometheus() if isinstance(registry, MetricsRegistry) else ""
+        return web.Response(text=text, content_type='text/plain', charset='utf-8')
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        stream = False
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            body = await request.json()
+            if not isinstance(body, dict):
+                raise RequestError("the request body must be a JSON object")
+            stream = bool(body.get('stream'))
+            session_id = request.headers.get('X-Session-Id')
+            user_input = self._user_input(body)
+
+            session = self.sessions.get(session_id) if session_id else None
+            if session_id and session is None:
+                raise RequestError("unknown or expired session: open a new one with POST /v1/sessions")
+            if session is None:
+                response, outcome = await self._complete(request, body, stream, user_input, None)
+            else:
+                async with session.lock:
+                    response, outcome = await self._complete(request, body, stream, user_input, session.history)
+            return response
+        except (RequestError, json.JSONDecodeError) as error:
+            outcome = 'invalid'
+            return self._error(400, 'invalid_request_error', str(error))
+        finally:
+            registry = get_registry()
+            registry.inc('gateway_requests_total', stream=stream, outcome=outcome)
+            registry.observe('gateway_request_seconds', time.perf_counter() - started, stream=stream)
+
+    @staticmethod
+    def _user_input(body: dict) -> str:
+        messages = body.get('messages')
+        if not isinstance(messages, list) or not messages or not all(isinstance(message, dict) for message in messages):
+            raise RequestError("'messages' must be a non-empty list of messages")
+        last = messages[-1]
+        if last.get('role') != 'user' or not isinstance(last.get('content'), str):
+            raise RequestError("the last message must be a user message with text content")
+        # Earlier turns would reach the model without being validated, so only the session history is used.
+        if any(message.get('role') in ('user', 'assistant') for message in messages[:-1]):
+            raise RequestError(
+                "the conversation history is kept by the gateway: send only the new user message, "
+                "with an X-Session-Id to continue a conversation"
+            )
+        return last['content']
+
+    def _conversation(self, user_input: str, history: ConversationHistory | None) -> list[BaseMessage]:
+        messages = history.messages if history is not None else list(self.prefix)
+        return messages + [HumanMessage(content=user_input)]
+
+    async def _complete(
+            self,
+            request: web.Request,
+            body: dict,
+            stream: bool,
+            user_input: str,
+            history: ConversationHistory | None
+    ) -> tuple[web.StreamResponse, str]:
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get('model') or self.model
+
+        if self.input_pipeline is not None:
+            verdict = await self.input_pipeline.acheck(user_input)
+            if not verdict.valid:
+                content = f"Blocked: {verdict.description}"
+                if stream:
+                    response = await self._prepare_stream(request)
+                    try:
+                        await self._send_chunk(response, completion_id, model, {'role': 'assistant', 'content': content})
+                        await self._finish_stream(response, completion_id, model, 'content_filter')
+                    except ConnectionResetError:
+                        return response, 'disconnected'
+                    return response, 'blocked'
+                return web.json_response(self._completion(completion_id, model, content, 'content_filter')), 'blocked'
+
+        messages = self._conversation(user_input, history)
+        guardrail = self.guardrail_factory()
+        chunks = astream_guarded(self.client, messages, guardrail, offload=self.offload)
+
+        if not stream:
+            try:
+                async with aclosing(chunks):
+                    content = "".join([chunk async for chunk in chunks])
+            except Exception as error:
+                return self._error(502, 'upstream_error', f"{type(error).__name__}: {error}"), 'upstream_error'
+            self._remember(history, user_input, content)
+            return web.json_response(self._completion(completion_id, model, content, 'stop')), 'ok'
+
+        response = await self._prepare_stream(request)
+        parts = []
+        try:
+            try:
+                async with aclosing(chunks):
+                    await self._send_chunk(response, completion_id, model, {'role': 'assistant', 'content': ''})
+                    async for chunk in chunks:
+                        parts.append(chunk)
+                        await self._send_chunk(response, completion_id, model, {'content': chunk})
+            except ConnectionResetError:
+                raise
+            except Exception as error:
+                await self._send_event(
+                    response, {'error': {'message': f"{type(error).__name__}: {error}", 'type': 'upstream_error'}}
+                )
+                await response.write_eof()
+                return response, 'upstream_error'
+
+            self._remember(history, user_input, "".join(parts))
+            await self._finish_stream(response, completion_id, model, 'stop')
+            return response, 'ok'
+        except ConnectionResetError:
+            # The caller went away; leaving `aclosing` closed the upstream stream as well.
+            return response, 'disconnected'
+
+    @staticmethod
+    def _remember(history: ConversationHistory | None, user_input: str, content: str):
+        if history is not None:
+            history.append(HumanMessage(content=user_input))
+            history.append(AIMessage(content=content))
+
+    @staticmethod
+    def _completion(completion_id: str, model: str, content: str, finish_reason: str) -> dict:
+        return {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason,
+            }],
+        }
+
+    @staticmethod
+    def _error(status: int, error_type: str, message: str) -> web.Response:
+        return web.json_response({'error': {'message': message, 'type': error_type}}, status=status)
+
+    @staticmethod
+    async def _prepare_stream(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        return response
+
+    @staticmethod
+    async def _send_event(response: web.StreamResponse, data: dict | str):
+        payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        await response.write(f"data: {payload}\n\n".encode())
+
+    async def _send_chunk(
+            self,
+            response: web.StreamResponse,
+            completion_id: str,
+            model: str,
+            delta: dict,
+            finish_reason: str | None = None
+    ):
+        await self._send_event(response, {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        })
+
+    async def _finish_stream(self, response: web.StreamResponse, completion_id: str, model: str, finish_reason: str):
+        await self._send_chunk(response, completion_id, model, {}, finish_reason)
+        await self._send_event(response, "[DONE]")
+        await response.write_eof()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve guarded OpenAI-style chat completions.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--upstream', default=None, help="Chat completions endpoint (default: DIAL)")
+    parser.add_argument('--max-connections', type=int, default=4096, help="Pooled upstream connections")
+    parser.add_argument('--guardrail', choices=list(GUARDRAILS), default='regex')
+    parser.add_argument('--no-input-validation', action='store_true', help="Skip the input pipeline")
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    parser.add_argument('--history-tokens', type=int, default=3000)
+    parser.add_argument('--no-metrics', action='store_true', help="Keep the no-op metrics registry")
+    args = parser.parse_args()
+
+    from tasks._client import create_client
+
+    options = {'azure_endpoint': args.upstream} if args.upstream else {}
+    client = create_client(
+        max_connections=args.max_connections, max_keepalive_connections=args.max_connections, **options
+    )
+    set_registry(NullRegistry() if args.no_metrics else MetricsRegistry())
+    input_pipeline = None if args.no_input_validation else GuardrailPipeline.from_config(INPUT_PIPELINE, client=client)
+
+    gateway = Gateway(client, input_pipeline, args.guardrail, args.max_sessions, args.history_tokens)
+    web.run_app(gateway.create_app(), host=args.host, port=args.port, backlog=4096, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
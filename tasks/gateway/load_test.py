@@ -0,0 +1,185 @@
+"""
+Load test for the gateway: many concurrent streaming chat completions from one process.
+
+With `--spawn`, the stub LLM server and the gateway are started on free local ports first, so the
+whole test runs on one machine without DIAL:
+
+    python -m tasks.gateway.load_test --spawn --concurrency 2000 --requests 4000
+
+Reports the completed streams per second, the time to first content chunk and the stream duration
+percentiles, the errors, and how many answers still contained one of the profile secrets.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import aiohttp
+
+# Values of the t_3 profile that the streaming guardrail must never let through.
+SECRETS = ("234-56-7890", "9823 Sunset Boulevard", "3782 8224 6310 0051", "5647382910", "CA-DL-C7394856")
+QUESTION = "What can you tell me about Amanda?"
+
+
+async def stream_once(session: aiohttp.ClientSession, url: str, session_id: str | None) -> dict:
+    """Send one streaming request and time it."""
+    headers = {'X-Session-Id': session_id} if session_id else {}
+    body = {'messages': [{'role': 'user', 'content': QUESTION}], 'stream': True}
+    started = time.perf_counter()
+    first_chunk = None
+    parts = []
+    async with session.post(url, json=body, headers=headers) as response:
+        if response.status != 200:
+            return {'error': f"HTTP {response.status}"}
+        async for line in response.content:
+            line = line.strip()
+            if not line.startswith(b"data: ") or line == b"data: [DONE]":
+                continue
+            event = json.loads(line[6:])
+            if 'error' in event:
+                return {'error': event['error']['type']}
+            content = event['choices'][0]['delta'].get('content')
+            if content:
+                first_chunk = first_chunk or time.perf_counter()
+                parts.append(content)
+    finished = time.perf_counter()
+    answer = "".join(parts)
+    return {
+        'first_chunk': (first_chunk or finished) - started,
+        'duration': finished - started,
+        'leaked': any(secret in answer for secret in SECRETS),
+    }
+
+
+async def open_session(session: aiohttp.ClientSession, base: str) -> str:
+    async with session.post(f"{base}/v1/sessions") as response:
+        response.raise_for_status()
+        return (await response.json())['id']
+
+
+async def run(base: str, concurrency: int, requests: int, sessions: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+    url = f"{base}/v1/chat/completions"
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        session_ids = [await open_session(session, base) for _ in range(sessions)]
+
+        async def one(index: int) -> dict:
+            async with semaphore:
+                try:
+                    return await stream_once(session, url, session_ids[index % sessions] if sessions else None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    return {'error': type(error).__name__}
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    completed = [result for result in results if 'error' not in result]
+    errors: dict[str, int] = {}
+    for result in results:
+        if 'error' in result:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+
+    def percentiles(key: str) -> dict:
+        values = sorted(result[key] for result in completed)
+        if not values:
+            return {}
+        return {
+            'p50_ms': values[len(values) // 2] * 1e3,
+            'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))] * 1e3,
+            'mean_ms': statistics.fmean(values) * 1e3,
+        }
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'completed': len(completed),
+        'errors': errors,
+        'seconds': elapsed,
+        'streams_per_second': len(completed) / elapsed,
+        'first_chunk': percentiles('first_chunk'),
+        'duration': percentiles('duration'),
+        'leaked': sum(result['leaked'] for result in completed),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+            await asyncio.sleep(0.2)
+
+
+@contextmanager
+def spawn(gateway_args: list[str], stub_args: list[str]) -> Iterator[str]:
+    """Start the stub LLM server and a gateway in front of it; yield the gateway URL."""
+    stub_port, gateway_port = _free_port(), _free_port()
+    # The stub does not check the key, but the gateway will not create its client without one.
+    env = dict(os.environ, DIAL_API_KEY=os.environ.get('DIAL_API_KEY') or 'load-test')
+    stub = subprocess.Popen(
+        [sys.executable, '-m', 'tasks.gateway.stub_llm', '--port', str(stub_port), *stub_args], env=env
+    )
+    gateway = subprocess.Popen([
+        sys.executable, '-m', 'tasks.gateway.app', '--port', str(gateway_port),
+        '--upstream', f"http://127.0.0.1:{stub_port}", *gateway_args
+    ], env=env)
+    try:
+        base = f"http://127.0.0.1:{gateway_port}"
+        asyncio.run(_wait_until_up(f"http://127.0.0.1:{stub_port}/"))
+        asyncio.run(_wait_until_up(f"{base}/healthz"))
+        yield base
+    finally:
+        for process in (gateway, stub):
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the guardrail gateway with concurrent SSE streams.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="Gateway base URL")
+    parser.add_argument('--spawn', action='store_true', help="Start a stub LLM server and a gateway for the test")
+    parser.add_argument('--concurrency', type=int, default=1000, help="Streams open at the same time")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=0, help="Spread the requests over this many sessions")
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help="Stub seconds between chunks (--spawn)")
+    parser.add_argument('--gateway-arg', action='append', default=[], help="Extra gateway argument (--spawn)")
+    parser.add_argument('--output', '-o', help="Where to save the JSON report")
+    args = parser.parse_args()
+
+    if args.spawn:
+        with spawn(args.gateway_arg, ['--chunk-delay', str(args.chunk_delay)]) as base:
+            report = asyncio.run(run(base, args.concurrency, args.requests, args.sessions))
+    else:
+        report = asyncio.run(run(args.url, args.concurrency, args.requests, args.sessions))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+A local stand-in for the DIAL chat completions API, for load testing the gateway on one machine.
+
+Answers every chat completion with `--reply`, streamed in `--chunk-size` character pieces every
+`--chunk-delay` seconds. Requests carrying the JSON format instructions of a validation chain get a
+passing verdict instead, so the input and output validators work against it too.
+
+Run with `python -m tasks.gateway.stub_llm --port 8081` and point the gateway at it with
+`--upstream http://127.0.0.1:8081`.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from aiohttp import web
+
+DEFAULT_REPLY = (
+    "Amanda Grace Johnson is a Financial Consultant. You can reach her at (310) 555-0734 or "
+    "amanda_hello@mailpro.net. Her SSN is 234-56-7890 and she lives at 9823 Sunset Boulevard, "
+    "Los Angeles, CA 90028."
+)
+VALIDATION_REPLY = '{"valid": true, "description": null}'
+# Part of the format instructions PydanticOutputParser adds to every validation prompt.
+FORMAT_INSTRUCTIONS_MARKER = "The output should be formatted as a JSON instance"
+
+
+def _reply_for(messages: list[dict], reply: str) -> str:
+    if any(FORMAT_INSTRUCTIONS_MARKER in str(message.get('content', '')) for message in messages):
+        return VALIDATION_REPLY
+    return reply
+
+
+def _usage(messages: list[dict], content: str) -> dict:
+    prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(reply: str = DEFAULT_REPLY, chunk_size: int = 4, chunk_delay: float = 0.02, model: str = 'stub') -> web.Application:
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get('messages', [])
+        content = _reply_for(messages, reply)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get('stream'):
+            await asyncio.sleep(chunk_delay * len(content) / chunk_size)
+            return web.json_response({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': _usage(messages, content),
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish_reason: str | None = None):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({'role': 'assistant', 'content': ''})
+        for start in range(0, len(content), chunk_size):
+            await asyncio.sleep(chunk_delay)
+            await send({'content': content[start:start + chunk_size]})
+        await send({}, finish_reason='stop')
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post('/{path:.*}chat/completions', chat_completions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve canned chat completions for load tests.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--reply', default=DEFAULT_REPLY)
+    parser.add_argument('--chunk-size', type=int, default=4, help="Characters per streamed chunk")
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help="Seconds between streamed chunks")
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(args.reply, args.chunk_size, args.chunk_delay),
+        host=args.host, port=args.port, backlog=4096, access_log=None
+    )
+
+
+if __name__ == "__main__":
+    main()
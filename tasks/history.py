@@ -0,0 +1,121 @@
+from collections import deque
+from typing import TYPE_CHECKING, Callable
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+# Tokens the chat format adds around every message, on top of its content.
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """Summarise the conversation below for the assistant that continues it, in at most 100 words.
+Keep the questions the user asked and what the assistant answered or refused. Do not repeat any personal data
+values such as numbers, dates or addresses.
+
+{previous_summary}"""
+
+
+def approximate_tokens(text: str) -> int:
+    """About four characters per token for English text, without loading a tokenizer."""
+    return (len(text) + 3) // 4
+
+
+def tiktoken_counter(encoding: str = 'o200k_base') -> Callable[[str], int]:
+    """Exact token counts for the GPT-4.1 models. The encoding is downloaded on first use."""
+    import tiktoken
+    tokenizer = tiktoken.get_encoding(encoding)
+    return lambda text: len(tokenizer.encode(text, disallowed_special=()))
+
+
+def summarize_with_llm(client: 'BaseChatModel') -> Callable[[str | None, list[BaseMessage]], str]:
+    """A summarizer for `ConversationHistory` that asks `client` to fold trimmed turns into the summary."""
+
+    def summarize(previous_summary: str | None, messages: list[BaseMessage]) -> str:
+        previous = f"Summary of the conversation before these turns: {previous_summary}" if previous_summary else ""
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in messages)
+        response = client.invoke([
+            SystemMessage(content=SUMMARY_PROMPT.format(previous_summary=previous)),
+            HumanMessage(content=transcript)
+        ])
+        return response.content
+
+    return summarize
+
+
+class ConversationHistory:
+    """
+    The messages of a chat session, kept within `max_tokens`.
+
+    `prefix` (the system prompt and the profile) is sent first and unchanged on every turn, so the
+    provider can reuse its prompt cache for it. When the conversation grows past the budget, the
+    oldest turns are dropped, whole turns at a time, and the latest turn is always kept. With a
+    `summarize` function the dropped turns are folded into a summary message sent right after the
+    prefix instead of being forgotten. The summary is an assistant message labelled as a summary, not
+    a system one: it is made from what the user wrote, so it must not carry the system prompt's authority.
+
+    Every message is counted once, when it is added, so the size is known without re-tokenizing the
+    history on every turn.
+    """
+
+    def __init__(
+            self,
+            prefix: list[BaseMessage],
+            max_tokens: int = 3000,
+            count_tokens: Callable[[str], int] = approximate_tokens,
+            summarize: Callable[[str | None, list[BaseMessage]], str] | None = None
+    ):
+        self.prefix = tuple(prefix)
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.summary: str | None = None
+        self._summary_message: AIMessage | None = None
+        self._summary_tokens = 0
+        self.prefix_tokens = sum(self._count(message) for message in self.prefix)
+        self._turns: deque[list[tuple[BaseMessage, int]]] = deque()
+        self._turns_tokens = 0
+        self.trimmed_turns = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prefix_tokens + self._summary_tokens + self._turns_tokens
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        messages = list(self.prefix)
+        if self._summary_message is not None:
+            messages.append(self._summary_message)
+        messages.extend(message for turn in self._turns for message, _ in turn)
+        return messages
+
+    def append(self, message: BaseMessage):
+        """Add `message`; a `HumanMessage` starts a new turn. Older turns are trimmed if needed."""
+        tokens = self._count(message)
+        if isinstance(message, HumanMessage) or not self._turns:
+            self._turns.append([])
+        self._turns[-1].append((message, tokens))
+        self._turns_tokens += tokens
+        self._trim()
+
+    def extend(self, messages: list[BaseMessage]):
+        for message in messages:
+            self.append(message)
+
+    def _count(self, message: BaseMessage) -> int:
+        return self.count_tokens(message.text) + MESSAGE_OVERHEAD
+
+    def _trim(self):
+        trimmed: list[BaseMessage] = []
+        while len(self._turns) > 1 and self.tokens > self.max_tokens:
+            turn = self._turns.popleft()
+            self._turns_tokens -= sum(tokens for _, tokens in turn)
+            trimmed.extend(message for message, _ in turn)
+            self.trimmed_turns += 1
+
+        if trimmed and self.summarize is not None:
+            self.summary = self.summarize(self.summary, trimmed)
+            self._summary_message = AIMessage(content=f"[Summary of the earlier conversation] {self.summary}")
+            self._summary_tokens = self._count(self._summary_message)
+            # A longer summary may take the history over the budget again.
+            self._trim()
@@ -0,0 +1,106 @@
+"""
+Import-time budget for the guardrail modules.
+
+Imports every module in a fresh interpreter, with stdin closed so a stray `input()` fails instead of
+waiting, and checks that it stays within its time budget, does not load the heavy dependencies that
+it only needs on use, and does not create a chat client. Exits with status 1 on any violation.
+
+Run with `python -m tasks.import_budget`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Loaded on first use only: presidio and spaCy take seconds, langchain_openai about one.
+HEAVY_MODULES = ('presidio_analyzer', 'presidio_anonymizer', 'spacy', 'langchain_openai')
+
+# Milliseconds for the fastest of the runs. Modules built on langchain_core pay for importing it: about
+# 0.3 s for the messages and 0.8 s once chat models and runnables, with langsmith, are in.
+BUDGETS = {
+    'tasks.t_3.pii_redaction': 100,
+    'tasks.t_3.chunk_buffer': 100,
+    'tasks.t_3.bulk_redaction': 100,
+    'tasks.t_3.secret_index': 100,
+    'tasks.t_2.rule_engine': 100,
+    'tasks.t_2.ngram_classifier': 300,
+    'tasks.metrics': 800,
+    'tasks.history': 800,
+    'tasks.resilience': 800,
+    'tasks.t_3.presidio_registry': 800,
+    'tasks.pipeline': 1500,
+    'tasks.t_3.streaming_pii_guardrail': 1500,
+    'tasks.t_2.input_llm_based_validation': 1500,
+    'tasks.t_3.output_llm_based_validation': 1500,
+    'tasks.t_1.prompt_injection': 1500,
+}
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__({module!r}, fromlist=['_'])
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'milliseconds': elapsed * 1e3,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+    'client': getattr(module, 'client', None) is not None,
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """Import `module` in a new interpreter and report how long it took and what it loaded."""
+    env = dict(os.environ, DIAL_API_KEY=os.environ.get('DIAL_API_KEY') or 'import-budget')
+    completed = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60, env=env
+    )
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check(module: str, budget: float, runs: int) -> tuple[dict, list[str]]:
+    results = [probe(module) for _ in range(runs)]
+    errors = [result['error'] for result in results if 'error' in result]
+    if errors:
+        return {'module': module, 'budget_ms': budget}, [f"import failed: {errors[0]}"]
+    best = min(results, key=lambda result: result['milliseconds'])
+    report = {'module': module, 'budget_ms': budget, **best}
+
+    violations = []
+    if best['milliseconds'] > budget:
+        violations.append(f"{best['milliseconds']:.0f} ms over the {budget} ms budget")
+    if best['heavy']:
+        violations.append(f"loads {', '.join(best['heavy'])}")
+    if best['client']:
+        violations.append("creates a chat client")
+    return report, violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time and side effects of the guardrail modules.")
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS), help="Modules to check (default: all)")
+    parser.add_argument('--runs', type=int, default=3, help="Imports per module; the fastest one counts")
+    parser.add_argument('--json', action='store_true', help="Print the reports as JSON")
+    args = parser.parse_args()
+
+    reports, failed = [], False
+    for module in args.modules:
+        report, violations = check(module, BUDGETS.get(module, 1500), args.runs)
+        report['violations'] = violations
+        reports.append(report)
+        failed = failed or bool(violations)
+        if not args.json:
+            status = 'FAIL ' + '; '.join(violations) if violations else 'ok'
+            milliseconds = report.get('milliseconds')
+            timing = f"{milliseconds:7.0f} ms" if milliseconds is not None else '      - ms'
+            print(f"{module:45} {timing} / {report['budget_ms']:5} ms  {status}")
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
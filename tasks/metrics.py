@@ -0,0 +1,233 @@
+"""
+Metrics for the guardrail hot path.
+
+Every stage reports to the process-wide registry returned by `get_registry()`. The default one is a
+`NullRegistry` that drops everything, so instrumented code costs a method call until a
+`MetricsRegistry` is installed with `set_registry()`:
+
+    registry = set_registry(MetricsRegistry())
+    ...
+    print(registry.to_prometheus())
+
+Metrics reported by the guardrails:
+
+- `llm_request_seconds`, `llm_tokens_total{direction}`, `llm_errors_total`: chat model calls, from
+  `MetricsCallbackHandler`
+- `validation_seconds{validator}`, `validation_verdicts_total{validator,source,valid}`: t_2 and t_3 validators
+- `pipeline_stage_seconds{stage}`, `pipeline_verdicts_total{stage,valid}`: `GuardrailPipeline` stages
+- `pipeline_fallbacks_total{stage,fail_open}`: stages that gave no verdict in time, see `ResilientStage`
+- `resilience_hedges_total{call}`, `resilience_failures_total{call,reason}`: hedged attempts and failed
+  calls of `ResilientCall` (`error`, `deadline` or `circuit_open`)
+- `stream_held_chars{guardrail}`, `stream_flushed_chars{guardrail}`: characters held back and released per chunk
+- `redaction_seconds{engine}`, `redactions_total{entity}`: regex redaction and the entities it redacted
+- `analyzer_seconds{engine}`: Presidio analysis
+
+Histograms named `*_seconds` use `TIME_BUCKETS`, all others `SIZE_BUCKETS`.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Iterator, TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+LabelKey = tuple[tuple[str, str], ...]
+VerdictT = TypeVar('VerdictT')
+
+
+class NullRegistry:
+    """The default registry: it records nothing."""
+
+    enabled = False
+
+    def inc(self, name: str, amount: float = 1, **labels: Any):
+        pass
+
+    def observe(self, name: str, value: float, **labels: Any):
+        pass
+
+    def timer(self, name: str, **labels: Any) -> ContextManager:
+        return nullcontext()
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+class MetricsRegistry(NullRegistry):
+    """Counters and histograms keyed by name and labels, exported as Prometheus text or JSON."""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, _Histogram]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: Any):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: Any):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(TIME_BUCKETS if name.endswith('_seconds') else SIZE_BUCKETS)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                'histograms': {
+                    name: [
+                        {
+                            'labels': dict(key),
+                            'count': histogram.count,
+                            'sum': histogram.sum,
+                            'buckets': dict(zip(map(str, histogram.buckets), histogram.counts)),
+                        }
+                        for key, histogram in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+_registry: NullRegistry = NullRegistry()
+
+
+def get_registry() -> NullRegistry:
+    return _registry
+
+
+def set_registry(registry: NullRegistry) -> NullRegistry:
+    """Install `registry` for every guardrail in the process and return it."""
+    global _registry
+    _registry = registry
+    return registry
+
+
+def record_verdict(validator: str, source: str, verdict: VerdictT) -> VerdictT:
+    """Count `verdict` of `validator`, decided by `source` (`local`, `classifier`, `cache`, `llm` or `fallback`), and return it."""
+    _registry.inc('validation_verdicts_total', validator=validator, source=source, valid=verdict.valid)
+    return verdict
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Reports the round trip time and token usage of every chat model call to the current registry."""
+
+    # Run in the caller's thread and loop, so the timings do not include a hop to an executor.
+    run_inline = True
+
+    def __init__(self):
+        self._started: dict[UUID, tuple[float, str]] = {}
+
+    def on_chat_model_start(
+            self,
+            serialized: dict[str, Any],
+            messages: list[list[BaseMessage]],
+            *,
+            run_id: UUID,
+            metadata: dict[str, Any] | None = None,
+            **kwargs: Any
+    ):
+        if get_registry().enabled:
+            self._started[run_id] = (time.perf_counter(), (metadata or {}).get('ls_model_name') or 'unknown')
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        registry = get_registry()
+        started_at, model = started
+        registry.observe('llm_request_seconds', time.perf_counter() - started_at, model=model)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if usage:
+                    registry.inc('llm_tokens_total', usage['input_tokens'], model=model, direction='input')
+                    registry.inc('llm_tokens_total', usage['output_tokens'], model=model, direction='output')
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            get_registry().inc('llm_errors_total', model=started[1], error=type(error).__name__)
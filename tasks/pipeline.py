@@ -0,0 +1,293 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Callable, NamedTuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+from tasks.metrics import get_registry
+from tasks.resilience import GuardrailUnavailable, ResilientCall
+
+
+def build_validation_chain(prompt: str, schema: type[BaseModel], client: BaseChatModel) -> Runnable:
+    """
+    Build `prompt | client | parser` for a system prompt with `{format_instructions}`. The chain takes
+    the text to check as `user_input`.
+    """
+    parser = PydanticOutputParser(pydantic_object=schema)
+    messages = [
+        SystemMessagePromptTemplate.from_template(template=prompt),
+        HumanMessagePromptTemplate.from_template(template="{user_input}")
+    ]
+    template = ChatPromptTemplate.from_messages(messages=messages).partial(
+        format_instructions=parser.get_format_instructions()
+    )
+    return template | client | parser
+
+
+class LazyChain:
+    """Builds a chain on first use, and again only when it is asked for with a different client."""
+
+    def __init__(self, build: Callable[[BaseChatModel], Runnable]):
+        self._build = build
+        self._client: BaseChatModel | None = None
+        self._chain: Runnable | None = None
+
+    def __call__(self, client: BaseChatModel) -> Runnable:
+        if self._chain is None or self._client is not client:
+            self._chain = self._build(client)
+            self._client = client
+        return self._chain
+
+
+class StageVerdict(NamedTuple):
+    valid: bool
+    description: str | None = None
+    # The text to pass on instead of the checked one, e.g. the redacted response.
+    text: str | None = None
+
+
+class PipelineResult(NamedTuple):
+    valid: bool
+    text: str
+    description: str | None
+    # The stage that decided, or None when no stage was decisive.
+    decided_by: str | None
+    stages_run: list[str]
+
+
+class Stage(ABC):
+    """
+    One check of a guardrail pipeline. `check` returns a verdict when the stage is decisive and None
+    to leave the text to the next stage. `cost` orders the stages: cheap local checks run first.
+    """
+
+    name = 'stage'
+    cost = 0
+
+    @abstractmethod
+    def check(self, text: str) -> StageVerdict | None:
+        ...
+
+    async def acheck(self, text: str) -> StageVerdict | None:
+        return self.check(text)
+
+
+class RuleStage(Stage):
+    """Rejects obvious prompt injections with the local rule engine."""
+
+    name = 'rules'
+    cost = 1
+
+    def __init__(self):
+        from tasks.t_2.rule_engine import DEFAULT_RULE_ENGINE
+        self.engine = DEFAULT_RULE_ENGINE
+
+    def check(self, text: str) -> StageVerdict | None:
+        verdict = self.engine.check(text)
+        if verdict.reject:
+            return StageVerdict(False, f"Rejected by local rules: {verdict.category} ('{verdict.phrase}')")
+        return None
+
+
+class PatternStage(Stage):
+    """
+    Redacts PII with the compiled patterns when they are sure that nothing else is left. Text they find
+    nothing in is left to the later stages: the patterns cannot vouch for PII they do not see.
+    """
+
+    name = 'patterns'
+    cost = 2
+
+    def __init__(self):
+        from tasks.t_3.pii_redaction import DEFAULT_ENGINE
+        self.engine = DEFAULT_ENGINE
+
+    def check(self, text: str) -> StageVerdict | None:
+        assessment = self.engine.assess(text)
+        if not assessment.sure or not assessment.redactions:
+            return None
+        leaked_pii = dict.fromkeys(redaction.entity for redaction in assessment.redactions)
+        return StageVerdict(False, ", ".join(leaked_pii), assessment.redacted_text)
+
+
+class SecretStage(Stage):
+    """Rejects text that holds a known secret value of `profile`, redacted, whatever its formatting."""
+
+    name = 'secrets'
+    cost = 1
+
+    def __init__(self, profile: str):
+        from tasks.t_3.secret_index import SecretIndex
+        self.index = SecretIndex.from_profile(profile)
+
+    def check(self, text: str) -> StageVerdict | None:
+        redactions = self.index.find(text)
+        if not redactions:
+            return None
+        from tasks.t_3.pii_redaction import apply_redactions
+        leaked = dict.fromkeys(redaction.entity for redaction in redactions)
+        return StageVerdict(False, "Known secrets: " + ", ".join(leaked), apply_redactions(text, redactions))
+
+
+class LLMStage(Stage):
+    """Asks the model with a prebuilt validation chain. It always decides."""
+
+    cost = 100
+
+    def __init__(self, name: str, prompt: str, schema: type[BaseModel], client: BaseChatModel, cache=None):
+        self.name = name
+        self.chain = build_validation_chain(prompt, schema, client)
+        self.cache = cache
+        self._model = None
+        if cache is not None:
+            from tasks.t_2.validation_cache import model_id
+            self._prompt = prompt
+            self._model = model_id(client)
+
+    def check(self, text: str) -> StageVerdict | None:
+        key, cached = self._lookup(text)
+        result = cached or self.chain.invoke({"user_input": text})
+        return self._verdict(key, cached, result)
+
+    async def acheck(self, text: str) -> StageVerdict | None:
+        key, cached = self._lookup(text)
+        result = cached or await self.chain.ainvoke({"user_input": text})
+        return self._verdict(key, cached, result)
+
+    def _lookup(self, text: str) -> tuple[str | None, Any]:
+        if self.cache is None:
+            return None, None
+        from tasks.t_2.validation_cache import cache_key
+        key = cache_key(text, self._prompt, self._model)
+        return key, self.cache.get(key)
+
+    def _verdict(self, key: str | None, cached: Any, result: Any) -> StageVerdict:
+        if key is not None and cached is None:
+            self.cache.put(key, result)
+        return StageVerdict(result.valid, result.description, getattr(result, 'redacted_text', None))
+
+
+class ResilientStage(Stage):
+    """
+    Runs another stage through a `ResilientCall`: within its deadline, hedged and behind its circuit
+    breaker. When no verdict comes in time, the text is rejected, or left to the next stage with
+    `fail_open`.
+    """
+
+    def __init__(self, stage: Stage, call: ResilientCall):
+        self.stage = stage
+        self.call = call
+        self.name = stage.name
+        self.cost = stage.cost
+
+    def check(self, text: str) -> StageVerdict | None:
+        try:
+            return self.call.call(lambda: self.stage.check(text))
+        except GuardrailUnavailable as error:
+            return self._fallback(error)
+
+    async def acheck(self, text: str) -> StageVerdict | None:
+        try:
+            return await self.call.acall(lambda: self.stage.acheck(text))
+        except GuardrailUnavailable as error:
+            return self._fallback(error)
+
+    def _fallback(self, error: GuardrailUnavailable) -> StageVerdict | None:
+        get_registry().inc('pipeline_fallbacks_total', stage=self.name, fail_open=self.call.fail_open)
+        if self.call.fail_open:
+            return None
+        return StageVerdict(False, f"Validation unavailable: {error}")
+
+
+def _input_llm_stage(client: BaseChatModel, cache: bool = True) -> LLMStage:
+    # The verdicts are keyed the same way as in `validate_with_llm`, so both share the module's cache.
+    from tasks.t_2.input_llm_based_validation import VALIDATION_PROMPT, Validation, validation_cache
+    return LLMStage('input_llm', VALIDATION_PROMPT, Validation, client, validation_cache if cache else None)
+
+
+def _output_llm_stage(client: BaseChatModel) -> LLMStage:
+    from tasks.t_3.output_llm_based_validation import VALIDATION_PROMPT, Validation
+    return LLMStage('output_llm', VALIDATION_PROMPT, Validation, client)
+
+
+def _output_filter_stage(client: BaseChatModel) -> LLMStage:
+    from tasks.t_3.output_llm_based_validation import VALIDATE_AND_FILTER_PROMPT, FilteredValidation
+    return LLMStage('output_filter', VALIDATE_AND_FILTER_PROMPT, FilteredValidation, client)
+
+
+# Stage factories by the `type` used in pipeline configurations. Every factory gets the shared client.
+STAGE_TYPES: dict[str, Callable[..., Stage]] = {
+    'rules': lambda client: RuleStage(),
+    'patterns': lambda client: PatternStage(),
+    'secrets': lambda client, profile: SecretStage(profile),
+    'input_llm': _input_llm_stage,
+    'output_llm': _output_llm_stage,
+    'output_filter': _output_filter_stage,
+}
+
+INPUT_PIPELINE: list[dict[str, Any]] = [{'type': 'rules'}, {'type': 'input_llm'}]
+OUTPUT_PIPELINE: list[dict[str, Any]] = [{'type': 'patterns'}, {'type': 'output_filter'}]
+
+
+class GuardrailPipeline:
+    """
+    Runs guardrail stages from the cheapest to the most expensive and stops at the first decisive one.
+
+    Stages are built once, with their prompts, parsers and chains, and share one client. Text that no
+    stage decides on is accepted.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = sorted(stages, key=lambda stage: stage.cost)
+
+    @classmethod
+    def from_config(cls, config: list[dict[str, Any]], client: BaseChatModel | None = None) -> 'GuardrailPipeline':
+        """
+        Build the stages declared as `{'type': ..., **options}`; `client` defaults to a new pooled one.
+        A `resilience` option holds the `ResilientCall` settings to run the stage with, such as
+        `{'deadline': 2.0, 'fail_open': False}`.
+        """
+        if client is None:
+            from tasks._client import create_client
+            client = create_client()
+        stages = []
+        for entry in config:
+            options = dict(entry)
+            resilience = options.pop('resilience', None)
+            stage = STAGE_TYPES[options.pop('type')](client, **options)
+            if resilience is not None:
+                stage = ResilientStage(stage, ResilientCall(stage.name, **resilience))
+            stages.append(stage)
+        return cls(stages)
+
+    def check(self, text: str) -> PipelineResult:
+        stages_run = []
+        for stage in self.stages:
+            stages_run.append(stage.name)
+            with get_registry().timer('pipeline_stage_seconds', stage=stage.name):
+                verdict = stage.check(text)
+            if verdict is not None:
+                return self._result(text, verdict, stage, stages_run)
+        return PipelineResult(True, text, None, None, stages_run)
+
+    async def acheck(self, text: str) -> PipelineResult:
+        stages_run = []
+        for stage in self.stages:
+            stages_run.append(stage.name)
+            with get_registry().timer('pipeline_stage_seconds', stage=stage.name):
+                verdict = await stage.acheck(text)
+            if verdict is not None:
+                return self._result(text, verdict, stage, stages_run)
+        return PipelineResult(True, text, None, None, stages_run)
+
+    async def acheck_many(self, texts: list[str]) -> list[PipelineResult]:
+        return list(await asyncio.gather(*(self.acheck(text) for text in texts)))
+
+    @staticmethod
+    def _result(text: str, verdict: StageVerdict, stage: Stage, stages_run: list[str]) -> PipelineResult:
+        get_registry().inc('pipeline_verdicts_total', stage=stage.name, valid=verdict.valid)
+        return PipelineResult(verdict.valid, verdict.text or text, verdict.description, stage.name, stages_run)
@@ -0,0 +1,240 @@
+"""
+Deadlines, hedged requests and circuit breaking for the guardrail LLM calls.
+
+A `ResilientCall` wraps one kind of call, such as the input validation chain or the output filter:
+
+- The whole call, hedges included, must finish within `deadline` seconds.
+- Once an attempt has taken longer than the `hedge_percentile` of the recent latencies, a duplicate
+  attempt is started (`hedge_delay` stands in until `min_samples` latencies are known). The first
+  answer wins and the other attempts are cancelled. Only first attempts are timed, the ones that lose
+  with the time they ran: the hedges that win are the fast tail, and would drag the delay down. An attempt that fails is replaced at once
+  while attempts are left. Sync calls run their attempts on a thread pool: a thread cannot be
+  interrupted, so a losing attempt that has already started is abandoned and its result dropped.
+- After `failure_threshold` failed calls in a row (errors or missed deadlines) the circuit opens and
+  calls fail at once for `reset_timeout` seconds; then one trial call is let through, which closes
+  the circuit again or reopens it.
+
+A call that cannot be answered raises `GuardrailUnavailable`: `DeadlineExceeded` or `CircuitOpen`.
+The caller then applies the policy of `fail_open`: to accept the text, or to treat it as a violation.
+
+`python -m tasks.resilience_benchmark` shows the effect on tail latency with a local model.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, TypeVar
+
+from tasks.metrics import get_registry
+
+T = TypeVar('T')
+
+
+class GuardrailUnavailable(Exception):
+    """The guarded call could not be answered; the caller falls back to its fail-open or fail-closed policy."""
+
+
+class DeadlineExceeded(GuardrailUnavailable):
+    pass
+
+
+class CircuitOpen(GuardrailUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` failures in a row and stays open for `reset_timeout` seconds.
+    Then it is half open: one trial call is allowed, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            # One trial call per `reset_timeout`, in case a trial never reports back.
+            if self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._opened_at = self.clock()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = self.clock()
+
+
+class ResilientCall:
+    """
+    The deadline, hedging and circuit breaker of one kind of guardrail call, see the module docstring.
+    `fail_open` is only read by the callers, which decide what accepting the text means for them.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            deadline: float | None = None,
+            max_attempts: int = 2,
+            hedge_percentile: float = 95,
+            hedge_delay: float = 1.0,
+            min_hedge_delay: float = 0.01,
+            min_samples: int = 20,
+            window: int = 500,
+            fail_open: bool = False,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            max_workers: int = 16
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max(max_attempts, 1)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.fail_open = fail_open
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_workers = max_workers
+        self.latencies: deque[float] = deque(maxlen=window)
+        self._executor: ThreadPoolExecutor | None = None
+
+    def current_hedge_delay(self) -> float:
+        """Seconds after which a still running attempt gets a duplicate."""
+        if len(self.latencies) < self.min_samples:
+            return max(self.hedge_delay, self.min_hedge_delay)
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(self.hedge_percentile / 100 * len(latencies)))
+        return max(latencies[index], self.min_hedge_delay)
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run `fn` within the deadline, hedged, in the pool of this call."""
+        self._admit()
+        started = time.perf_counter()
+        deadline = None if self.deadline is None else started + self.deadline
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"resilient-{self.name}")
+
+        running: dict[Future, float] = {}
+        first: Future | None = None
+        error: BaseException | None = None
+        attempts = 0
+        try:
+            while True:
+                if attempts < self.max_attempts:
+                    future = self._executor.submit(fn)
+                    running[future] = time.perf_counter()
+                    first = first or future
+                    attempts = self._count_attempt(attempts)
+
+                timeout = self.current_hedge_delay() if attempts < self.max_attempts else None
+                if deadline is not None:
+                    left = deadline - time.perf_counter()
+                    if left <= 0:
+                        raise self._deadline_exceeded()
+                    timeout = left if timeout is None else min(timeout, left)
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    attempt_started = running.pop(future)
+                    if future.exception() is None:
+                        if future is first:
+                            self._record_latency(attempt_started)
+                        return self._succeed(future.result())
+                    error = future.exception()
+                if not running and attempts >= self.max_attempts:
+                    self._fail('error')
+                    raise error
+        finally:
+            if first in running:
+                self._record_latency(running[first])
+            for future in running:
+                future.cancel()
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()` within the deadline, hedged; the attempts that lose are cancelled."""
+        self._admit()
+        # No deadline with None.
+        timeout = asyncio.timeout(self.deadline)
+        try:
+            async with timeout:
+                return await self._ahedged(fn)
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            raise self._deadline_exceeded() from None
+
+    async def _ahedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        running: dict[asyncio.Task, float] = {}
+        first: asyncio.Task | None = None
+        error: BaseException | None = None
+        attempts = 0
+        try:
+            while True:
+                if attempts < self.max_attempts:
+                    task = asyncio.ensure_future(fn())
+                    running[task] = time.perf_counter()
+                    first = first or task
+                    attempts = self._count_attempt(attempts)
+
+                timeout = self.current_hedge_delay() if attempts < self.max_attempts else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt_started = running.pop(task)
+                    if task.exception() is None:
+                        if task is first:
+                            self._record_latency(attempt_started)
+                        return self._succeed(task.result())
+                    error = task.exception()
+                if not running and attempts >= self.max_attempts:
+                    self._fail('error')
+                    raise error
+        finally:
+            if first in running:
+                self._record_latency(running[first])
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            get_registry().inc('resilience_failures_total', call=self.name, reason='circuit_open')
+            raise CircuitOpen(f"{self.name}: circuit open after {self.breaker.failures} failures")
+
+    def _count_attempt(self, attempts: int) -> int:
+        if attempts:
+            get_registry().inc('resilience_hedges_total', call=self.name)
+        return attempts + 1
+
+    def _record_latency(self, attempt_started: float):
+        """Time a first attempt; one that is cancelled counts with the time it ran, a lower bound."""
+        self.latencies.append(time.perf_counter() - attempt_started)
+
+    def _succeed(self, result: T) -> T:
+        self.breaker.record_success()
+        return result
+
+    def _fail(self, reason: str):
+        get_registry().inc('resilience_failures_total', call=self.name, reason=reason)
+        self.breaker.record_failure()
+
+    def _deadline_exceeded(self) -> DeadlineExceeded:
+        self._fail('deadline')
+        return DeadlineExceeded(f"{self.name}: no answer within {self.deadline:g} s")
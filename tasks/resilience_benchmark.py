@@ -0,0 +1,149 @@
+"""
+Tail latency of the LLM input validation with and without `ResilientCall`, on a local model.
+
+The model is a `ScriptedChatModel` that always answers that the input is valid, after a delay drawn
+from `--median`/`--sigma` (log-normal), with a `--straggler-rate` share of the calls taking
+`--straggler-seconds` instead, like an overloaded replica. Every configuration validates the same
+number of inputs through a `GuardrailPipeline` with `--concurrency` requests in flight and reports the
+latency percentiles, the extra model calls the hedges cost and the fallback verdicts. The `outage`
+scenario makes every call slow, to show the deadline and the circuit breaker.
+
+Run with `python -m tasks.resilience_benchmark`.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Callable
+
+from tasks._fake_chat_model import ScriptedChatModel
+from tasks.metrics import MetricsRegistry, set_registry
+from tasks.pipeline import GuardrailPipeline
+
+ANSWER = '{"valid": true, "description": null}'
+
+# Resilience settings of the input LLM stage per configuration; None runs it as it is.
+CONFIGURATIONS: dict[str, dict[str, Any] | None] = {
+    'plain': None,
+    'hedged': {'max_attempts': 2, 'hedge_percentile': 95},
+    'hedged+deadline': {'max_attempts': 2, 'hedge_percentile': 95, 'deadline': 0.5},
+    'deadline+fail-open': {'max_attempts': 1, 'deadline': 0.5, 'fail_open': True},
+}
+
+
+def latency_distribution(
+        median: float, sigma: float, straggler_rate: float, straggler_seconds: float, seed: int
+) -> Callable[[], float]:
+    generator = random.Random(seed)
+
+    def latency() -> float:
+        if generator.random() < straggler_rate:
+            return straggler_seconds
+        return generator.lognormvariate(0, sigma) * median
+
+    return latency
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(percentile / 100 * len(values)))]
+
+
+async def measure(
+        name: str,
+        resilience: dict[str, Any] | None,
+        latency: Callable[[], float],
+        requests: int,
+        concurrency: int
+) -> dict:
+    model = ScriptedChatModel(responses=[ANSWER], chunk_size=len(ANSWER), latency=latency)
+    entry: dict[str, Any] = {'type': 'input_llm', 'cache': False}
+    if resilience is not None:
+        entry['resilience'] = resilience
+    pipeline = GuardrailPipeline.from_config([entry], client=model)
+    registry = set_registry(MetricsRegistry())
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, rejected = [], 0
+
+    async def one(index: int):
+        nonlocal rejected
+        async with semaphore:
+            started = time.perf_counter()
+            result = await pipeline.acheck(f"What is the phone number of colleague {index}?")
+            latencies.append(time.perf_counter() - started)
+            rejected += not result.valid
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    counters = registry.snapshot()['counters']
+
+    def total(counter: str, **labels: str) -> int:
+        return int(sum(
+            series['value'] for series in counters.get(counter, [])
+            if all(series['labels'].get(key) == value for key, value in labels.items())
+        ))
+
+    return {
+        'configuration': name,
+        'requests': requests,
+        'seconds': elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1e3,
+        'p95_ms': _percentile(latencies, 95) * 1e3,
+        'p99_ms': _percentile(latencies, 99) * 1e3,
+        'max_ms': max(latencies) * 1e3,
+        'mean_ms': statistics.fmean(latencies) * 1e3,
+        'model_calls': model.calls,
+        'extra_calls': model.calls - requests,
+        'rejected': rejected,
+        'hedges': total('resilience_hedges_total'),
+        'fallbacks': total('pipeline_fallbacks_total'),
+        'circuit_open': total('resilience_failures_total', reason='circuit_open'),
+    }
+
+
+def _print_row(result: dict):
+    print(
+        f"{result['configuration']:20} p50={result['p50_ms']:7.1f}ms p95={result['p95_ms']:7.1f}ms "
+        f"p99={result['p99_ms']:7.1f}ms max={result['max_ms']:7.1f}ms  "
+        f"model calls={result['model_calls']:5} ({result['extra_calls'] / result['requests']:+.1%})  "
+        f"hedges={result['hedges']:4} fallbacks={result['fallbacks']:4} (circuit open {result['circuit_open']}) "
+        f"rejected={result['rejected']}",
+        flush=True
+    )
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    results = []
+    for name in args.configurations:
+        latency = latency_distribution(args.median, args.sigma, args.straggler_rate, args.straggler_seconds, args.seed)
+        results.append(await measure(name, CONFIGURATIONS[name], latency, args.requests, args.concurrency))
+        _print_row(results[-1])
+
+    # Every call is slow: the deadline bounds the wait, then the open circuit answers at once.
+    outage = {'max_attempts': 1, 'deadline': 0.2, 'failure_threshold': 5, 'reset_timeout': 60.0}
+    results.append(await measure('outage', outage, lambda: args.straggler_seconds, args.requests, args.concurrency))
+    _print_row(results[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the tail latency of the LLM validation with hedging and deadlines.")
+    parser.add_argument('--configurations', nargs='+', choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--median', type=float, default=0.05, help="Median model latency in seconds")
+    parser.add_argument('--sigma', type=float, default=0.3, help="Spread of the log-normal latency")
+    parser.add_argument('--straggler-rate', type=float, default=0.03, help="Share of calls that stall")
+    parser.add_argument('--straggler-seconds', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Checks for `ResilientCall` and `ResilientStage` against local fakes: hedging and the cancellation of
+the losing attempt, retries, deadlines, the circuit breaker and the fallback verdicts, and the tail
+latency of a pipeline on a model with stragglers.
+
+Run with `python -m tasks.resilience_checks`.
+"""
+import asyncio
+import time
+
+from tasks._checks import run_checks
+from tasks.pipeline import ResilientStage, Stage, StageVerdict
+from tasks.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientCall
+from tasks.resilience_benchmark import latency_distribution, measure
+
+
+class SlowAttempts:
+    """Async attempts that take the given seconds in turn, recording which were started and cancelled."""
+
+    def __init__(self, *seconds: float, error: Exception | None = None):
+        self.seconds = seconds
+        self.error = error
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self) -> int:
+        attempt = self.started
+        self.started += 1
+        try:
+            await asyncio.sleep(self.seconds[min(attempt, len(self.seconds) - 1)])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None and attempt == 0:
+            raise self.error
+        return attempt
+
+
+async def check_hedge_wins_and_loser_is_cancelled():
+    call = ResilientCall('check', max_attempts=2, hedge_delay=0.05)
+    attempts = SlowAttempts(5.0, 0.01)
+    started = time.perf_counter()
+    assert await call.acall(attempts) == 1
+    assert time.perf_counter() - started < 0.5
+    assert attempts.started == 2 and attempts.cancelled == 1, (attempts.started, attempts.cancelled)
+
+
+def check_sync_hedge_wins():
+    call = ResilientCall('check', max_attempts=2, hedge_delay=0.05)
+    seconds = iter([1.0, 0.01])
+
+    def attempt():
+        delay = next(seconds)
+        time.sleep(delay)
+        return delay
+
+    started = time.perf_counter()
+    assert call.call(attempt) == 0.01
+    assert time.perf_counter() - started < 0.5
+
+
+async def check_failed_attempt_is_retried():
+    attempts = SlowAttempts(0.0, error=ConnectionError("reset"))
+    assert await ResilientCall('check', max_attempts=2, hedge_delay=5.0).acall(attempts) == 1
+
+    call = ResilientCall('check', max_attempts=1)
+    try:
+        await call.acall(SlowAttempts(0.0, error=ConnectionError("reset")))
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("the error was swallowed")
+    assert call.breaker.failures == 1
+
+
+async def check_hedge_delay_is_not_dragged_down_by_winning_hedges():
+    # Every first attempt takes 0.2 s and every hedge answers at once: timing the winners only would
+    # pull the delay down to `min_hedge_delay` and hedge every call right away.
+    call = ResilientCall('check', max_attempts=2, hedge_delay=0.05, min_samples=5, hedge_percentile=50)
+    for _ in range(10):
+        assert await call.acall(SlowAttempts(0.2, 0.0)) == 1
+    assert len(call.latencies) == 10 and call.current_hedge_delay() >= 0.045, list(call.latencies)
+
+    call = ResilientCall('check', max_attempts=2, hedge_delay=0.05, min_samples=5, hedge_percentile=50)
+    for _ in range(5):
+        assert await call.acall(SlowAttempts(0.0)) == 0
+    assert call.current_hedge_delay() < 0.045, list(call.latencies)
+
+
+async def check_deadline_expires():
+    call = ResilientCall('check', deadline=0.05, max_attempts=2, hedge_delay=0.02)
+    attempts = SlowAttempts(5.0)
+    started = time.perf_counter()
+    try:
+        await call.acall(attempts)
+    except DeadlineExceeded:
+        pass
+    else:
+        raise AssertionError("no DeadlineExceeded")
+    assert time.perf_counter() - started < 0.5
+    assert attempts.started == 2 and attempts.cancelled == 2, (attempts.started, attempts.cancelled)
+
+    started = time.perf_counter()
+    try:
+        ResilientCall('check', deadline=0.05, max_attempts=1).call(lambda: time.sleep(1.0))
+    except DeadlineExceeded:
+        pass
+    else:
+        raise AssertionError("no DeadlineExceeded")
+    assert time.perf_counter() - started < 0.5
+
+
+async def check_own_timeout_is_not_the_deadline():
+    attempts = SlowAttempts(0.0, error=TimeoutError("upstream read timeout"))
+    try:
+        await ResilientCall('check', deadline=5.0, max_attempts=1).acall(attempts)
+    except DeadlineExceeded:
+        raise AssertionError("an error of the call was taken for the deadline")
+    except TimeoutError:
+        pass
+
+
+def check_breaker_half_opens_once():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    now[0] += 10.0
+    assert breaker.allow() and breaker.state == 'half_open'
+    assert not breaker.allow(), "more than one trial call"
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    now[0] += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() and breaker.failures == 0
+
+    # A trial that never reports back does not keep the circuit shut for good.
+    breaker.record_failure()
+    breaker.record_failure()
+    now[0] += 10.0
+    assert breaker.allow()
+    now[0] += 10.0
+    assert breaker.allow()
+
+
+async def check_open_circuit_answers_at_once():
+    call = ResilientCall('check', deadline=0.02, max_attempts=1, failure_threshold=2, reset_timeout=60.0)
+    attempts = SlowAttempts(5.0)
+    for _ in range(2):
+        try:
+            await call.acall(attempts)
+        except DeadlineExceeded:
+            pass
+    try:
+        await call.acall(attempts)
+    except CircuitOpen:
+        pass
+    else:
+        raise AssertionError("the circuit did not open")
+    assert attempts.started == 2
+
+
+async def check_stage_fallback_verdicts():
+    class SlowStage(Stage):
+        name = 'slow'
+
+        def check(self, text: str) -> StageVerdict | None:
+            time.sleep(1.0)
+            return StageVerdict(True)
+
+        async def acheck(self, text: str) -> StageVerdict | None:
+            await asyncio.sleep(1.0)
+            return StageVerdict(True)
+
+    closed = ResilientStage(SlowStage(), ResilientCall('slow', deadline=0.05, max_attempts=1))
+    verdict = await closed.acheck("text")
+    assert verdict is not None and not verdict.valid and verdict.description.startswith("Validation unavailable"), verdict
+    verdict = closed.check("text")
+    assert verdict is not None and not verdict.valid, verdict
+
+    opened = ResilientStage(SlowStage(), ResilientCall('slow', deadline=0.05, max_attempts=1, fail_open=True))
+    assert await opened.acheck("text") is None
+    assert opened.check("text") is None
+
+
+async def check_hedging_cuts_tail_latency():
+    def latency():
+        return latency_distribution(0.01, 0.3, 0.05, 0.5, seed=0)
+
+    plain = await measure('plain', None, latency(), requests=300, concurrency=20)
+    hedged = await measure(
+        'hedged', {'max_attempts': 2, 'hedge_percentile': 90, 'hedge_delay': 0.05}, latency(), requests=300, concurrency=20
+    )
+    assert plain['p99_ms'] > 400, plain
+    assert hedged['p99_ms'] < plain['p99_ms'] / 2, (plain['p99_ms'], hedged['p99_ms'])
+    assert hedged['rejected'] == 0 and hedged['extra_calls'] < 0.25 * hedged['requests'], hedged
+
+
+CHECKS = [
+    check_hedge_wins_and_loser_is_cancelled,
+    check_sync_hedge_wins,
+    check_failed_attempt_is_retried,
+    check_hedge_delay_is_not_dragged_down_by_winning_hedges,
+    check_deadline_expires,
+    check_own_timeout_is_not_the_deadline,
+    check_breaker_half_opens_once,
+    check_open_circuit_answers_at_once,
+    check_stage_fallback_verdicts,
+    check_hedging_cuts_tail_latency,
+]
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_checks(CHECKS) else 0)
@@ -1,8 +1,7 @@
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
-from langchain_openai import AzureChatOpenAI
-from pydantic import SecretStr
+from langchain_core.messages import SystemMessage, HumanMessage
 
-from tasks._constants import DIAL_URL, API_KEY
+from tasks._client import create_client
+from tasks.history import ConversationHistory
 
 
 SYSTEM_PROMPT = """You are a secure colleague directory assistant designed to help users find contact information for business purposes.
@@ -51,19 +50,12 @@ PROFILE = """
 """
 
 def main():
-    client = AzureChatOpenAI(
-        temperature=0.0,
-        seed=1234,
-        azure_deployment='gpt-4.1-nano-2025-04-14',
-        azure_endpoint=DIAL_URL,
-        api_key=SecretStr(API_KEY),
-        api_version=""
-    )
-
-    messages: list[BaseMessage] = [
+    client = create_client()
+
+    history = ConversationHistory([
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
-    ]
+    ])
 
     print("Type your question or 'exit' to quit.")
     while True:
@@ -72,14 +64,15 @@ def main():
             print("Exiting the chat. Goodbye!")
             break
 
-        messages.append(
+        history.append(
             HumanMessage(content=user_input)
         )
 
-        ai_message = client.invoke(messages)
-        messages.append(ai_message)
+        ai_message = client.invoke(history.messages)
+        history.append(ai_message)
 
         print(f"🤖Response:\n{ai_message.content}\n{'='*100}")
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
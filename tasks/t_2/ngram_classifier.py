@@ -0,0 +1,143 @@
+"""
+A local prompt injection classifier: hashed character n-grams and logistic regression in NumPy.
+
+Every input is lower-cased and wrapped in start and end markers; its character n-grams are hashed
+into `n_features` buckets and their counts, divided by the square root of the number of n-grams,
+are scored with one weight per bucket. A whole batch is hashed and scored with a handful of array
+operations over the concatenated texts, so the cost per input is a few microseconds plus the text
+length.
+
+The model is trained on the synthetic and the real samples of `tasks._prompt_injections` by
+`train_default`, in well under a second, and can be saved with `save` and loaded with `load`.
+"""
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from tasks._prompt_injections import BENIGN_QUERIES, load_prompt_injections, synthetic_samples
+
+_START, _END = '\x02', '\x03'
+_MULTIPLIER = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def training_samples(synthetic: int = 600, seed: int = 0) -> list[tuple[str, bool]]:
+    """The `(text, valid)` pairs `train_default` learns from: synthetic ones, the attacks and the benign queries."""
+    samples = synthetic_samples(synthetic, seed) if synthetic else []
+    samples += [(prompt.replace('\\n', '\n'), False) for _, prompt in load_prompt_injections()]
+    samples += [(query, True) for query in BENIGN_QUERIES]
+    return samples
+
+
+class NgramClassifier:
+    """
+    Scores how likely inputs are prompt injections. `predict_proba` returns the probability of an
+    injection for every input of a batch.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: tuple[int, int] = (1, 4)):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self._shift = np.uint64(64 - n_features.bit_length() + 1)
+
+    def features(self, texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the sparse feature matrix of `texts` as `(row, bucket, value)` arrays, one entry per
+        n-gram: an n-gram that occurs twice has two entries, which add up.
+        """
+        wrapped = [_START + text.lower() + _END for text in texts]
+        codes = np.frombuffer(''.join(wrapped).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        rows = np.repeat(np.arange(len(texts)), [len(text) for text in wrapped])
+
+        row_parts, bucket_parts = [], []
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, n, dtype=np.uint64)
+            for k in range(n):
+                hashes = hashes * _MULTIPLIER + codes[k:k + count]
+            # Only n-grams that stay within one input.
+            within = rows[:count] == rows[n - 1:n - 1 + count]
+            row_parts.append(rows[:count][within])
+            bucket_parts.append(((hashes[within] * _MIX) >> self._shift).astype(np.intp))
+
+        row = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.intp)
+        bucket = np.concatenate(bucket_parts) if bucket_parts else np.zeros(0, dtype=np.intp)
+        value = (1 / np.sqrt(np.maximum(np.bincount(row, minlength=len(texts)), 1)))[row]
+        return row, bucket, value
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        row, bucket, value = self.features(texts)
+        return np.bincount(row, weights=self.weights[bucket] * value, minlength=len(texts)) + self.bias
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """The probability that each input is a prompt injection."""
+        return 1 / (1 + np.exp(-self.decision_function(texts)))
+
+    def fit(
+            self,
+            texts: Sequence[str],
+            valid: Iterable[bool],
+            epochs: int = 300,
+            learning_rate: float = 0.05,
+            l2: float = 1e-4
+    ) -> 'NgramClassifier':
+        """
+        Fit the weights with full-batch Adam on the logistic loss. Both classes weigh the same in
+        the loss whatever their sizes. `valid` is the label of each text: True for a harmless input.
+        """
+        targets = 1.0 - np.fromiter(valid, dtype=float, count=len(texts))
+        row, bucket, value = self.features(texts)
+        # Only the buckets the training texts use can get a weight, so train on those alone.
+        used, column = np.unique(bucket, return_inverse=True)
+        positives = targets.sum()
+        sample_weights = np.where(targets == 1, 0.5 / max(positives, 1), 0.5 / max(len(texts) - positives, 1))
+
+        weights, bias = np.zeros(len(used)), 0.0
+        moments = [np.zeros(len(used)), np.zeros(len(used)), 0.0, 0.0]
+        beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            scores = np.bincount(row, weights=weights[column] * value, minlength=len(texts)) + bias
+            errors = (1 / (1 + np.exp(-scores)) - targets) * sample_weights
+            weight_gradient = np.bincount(column, weights=errors[row] * value, minlength=len(used)) + l2 * weights
+            bias_gradient = errors.sum()
+
+            moments[0] = beta1 * moments[0] + (1 - beta1) * weight_gradient
+            moments[1] = beta2 * moments[1] + (1 - beta2) * weight_gradient ** 2
+            moments[2] = beta1 * moments[2] + (1 - beta1) * bias_gradient
+            moments[3] = beta2 * moments[3] + (1 - beta2) * bias_gradient ** 2
+            correction1, correction2 = 1 - beta1 ** step, 1 - beta2 ** step
+            weights -= learning_rate * (moments[0] / correction1) / (np.sqrt(moments[1] / correction2) + epsilon)
+            bias -= learning_rate * (moments[2] / correction1) / (np.sqrt(moments[3] / correction2) + epsilon)
+
+        self.weights = np.zeros(self.n_features)
+        self.weights[used] = weights
+        self.bias = float(bias)
+        return self
+
+    def save(self, path: str | Path):
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, ngram_range=np.array(self.ngram_range)
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'NgramClassifier':
+        with np.load(path) as data:
+            low, high = (int(n) for n in data['ngram_range'])
+            classifier = cls(n_features=len(data['weights']), ngram_range=(low, high))
+            classifier.weights = data['weights']
+            classifier.bias = float(data['bias'])
+        return classifier
+
+
+def train_default(samples: list[tuple[str, bool]] | None = None, **options) -> NgramClassifier:
+    """Train a classifier on `samples`, by default on `training_samples()`."""
+    samples = training_samples() if samples is None else samples
+    return NgramClassifier(**options).fit([text for text, _ in samples], [valid for _, valid in samples])
@@ -0,0 +1,116 @@
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from tasks._prompt_injections import BENIGN_QUERIES, load_prompt_injections, synthetic_samples
+from tasks.t_2.ngram_classifier import NgramClassifier, train_default, training_samples
+
+
+def evaluate(threshold: float, synthetic: int = 600) -> dict:
+    """
+    Leave-one-out over the real samples: every attack and benign query is scored by a classifier
+    trained on the synthetic samples and all the other real ones.
+
+    Inputs scored as injections with a probability of at least `threshold` are rejected locally; the
+    others go to the LLM, as the classifier never accepts. The agreement is measured over the local
+    rejections.
+    """
+    real = [(title, prompt.replace('\\n', '\n'), False) for title, prompt in load_prompt_injections()]
+    real += [(query, query, True) for query in BENIGN_QUERIES]
+    padding = synthetic_samples(synthetic) if synthetic else []
+
+    rows = []
+    for index, (title, text, expected_valid) in enumerate(real):
+        samples = padding + [(other, valid) for _, other, valid in real[:index] + real[index + 1:]]
+        probability = float(train_default(samples).predict_proba([text])[0])
+        rows.append((title, probability, expected_valid))
+
+    def correct(probability: float, expected_valid: bool) -> bool:
+        return (probability < 0.5) == expected_valid
+
+    local = [row for row in rows if row[1] >= threshold]
+    return {
+        'inputs': len(rows),
+        'accuracy': sum(correct(probability, valid) for _, probability, valid in rows) / len(rows),
+        'llm_calls_avoided': len(local),
+        'agreement': sum(correct(probability, valid) for _, probability, valid in local) / len(local) if local else 1.0,
+        'missed_attacks': [title for title, probability, valid in rows if not valid and probability < 0.5],
+        'false_rejections': [title for title, probability, valid in rows if valid and probability >= 0.5],
+        'rows': rows,
+    }
+
+
+def throughput(classifier: NgramClassifier, batch_sizes: list[int], seconds: float = 1.0) -> dict:
+    """Time single inputs one by one, then whole batches of every size, over the training texts."""
+    texts = [text for text, _ in training_samples()]
+
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        classifier.predict_proba([text])
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    batches = {}
+    for batch_size in batch_sizes:
+        batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+        runs, started = 0, time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            classifier.predict_proba(batch)
+            runs += 1
+        elapsed = time.perf_counter() - started
+        batches[batch_size] = {
+            'inputs_per_second': runs * batch_size / elapsed,
+            'microseconds_per_input': elapsed / (runs * batch_size) * 1e6,
+        }
+
+    return {
+        'single_p50_us': latencies[len(latencies) // 2] * 1e6,
+        'single_p99_us': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6,
+        'single_mean_us': statistics.fmean(latencies) * 1e6,
+        'mean_characters': float(np.mean([len(text) for text in texts])),
+        'batches': batches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate and time the local n-gram prompt injection classifier.")
+    parser.add_argument('--threshold', type=float, default=0.9, help="Confidence needed to reject without the LLM")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 16, 256, 4096])
+    parser.add_argument('--save', help="Train on all the samples and save the model here (.npz)")
+    args = parser.parse_args()
+
+    report = evaluate(args.threshold)
+    for title, probability, expected_valid in report['rows']:
+        decision = 'reject' if probability >= args.threshold else 'escalate'
+        print(f"{'valid' if expected_valid else 'attack':7} p={probability:.3f} {decision:9} {title[:70]}")
+    print('=' * 100)
+    print(f"Leave-one-out accuracy: {report['accuracy']:.1%}")
+    print(f"LLM calls avoided at confidence {args.threshold}: {report['llm_calls_avoided']}/{report['inputs']}")
+    print(f"Agreement on local verdicts: {report['agreement']:.1%}")
+    print(f"Attacks scored below 0.5: {len(report['missed_attacks'])}")
+    print(f"Valid inputs scored at 0.5 or more: {len(report['false_rejections'])}")
+
+    started = time.perf_counter()
+    classifier = train_default()
+    print(f"Training on {len(training_samples())} samples: {time.perf_counter() - started:.2f} s")
+    if args.save:
+        classifier.save(args.save)
+        print(f"Saved to {args.save}")
+
+    timing = throughput(classifier, args.batch_sizes)
+    print(
+        f"Single input ({timing['mean_characters']:.0f} characters on average): "
+        f"p50 {timing['single_p50_us']:.0f} µs, p99 {timing['single_p99_us']:.0f} µs"
+    )
+    for batch_size, result in timing['batches'].items():
+        print(
+            f"Batch of {batch_size:5}: {result['inputs_per_second']:9.0f} inputs/s, "
+            f"{result['microseconds_per_input']:7.1f} µs per input"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+from tasks._aho_corasick import AhoCorasick
+
+# Phrases from the REJECT list of VALIDATION_PROMPT. Any of them rejects the input on the spot.
+DECISIVE_RULES: dict[str, tuple[str, ...]] = {
+    'override command': (
+        'ignore previous', 'ignore all', 'ignore the above', 'ignore your', 'forget your', 'forget previous',
+        'forget all', 'disregard', 'new instructions', 'override'
+    ),
+    'role change': (
+        'you are now', 'pretend', 'act as', 'administrator', 'admin approval', 'developer mode',
+        'jailbreak'
+    ),
+    'restricted field': (
+        'credit card', 'creditcard', 'credit_card', 'card number', 'ssn', 'social security', 'bank account',
+        'account number', 'driver s license', 'drivers license', 'date of birth', 'dob', 'cvv', 'expiration',
+        'expiry', 'expire_at', 'payment', 'financial', 'salary', 'income', 'routing number', 'passport'
+    ),
+    'structured data request': (
+        'json', 'xml', 'yaml', 'csv', 'sql', 'markdown table', 'all fields', 'all available', 'full profile',
+        'complete profile', 'fill in', 'complete this', 'complete the empty'
+    ),
+    'hypothetical': ('what if', 'suppose', 'hypothetically'),
+    'system claim': (
+        'system override', 'clearance', 'debug mode', 'authorized for', 'compliance status', 'update your',
+        'emergency access'
+    ),
+}
+
+# Words that are only suspicious in some contexts ("email address", "Dan's phone"). They leave the
+# decision to the LLM.
+AMBIGUOUS_WORDS: tuple[str, ...] = (
+    'dan', 'export', 'address', 'birthday', 'born', 'bank', 'card', 'license', 'profile', 'complete', 'verify',
+    'verification', 'table', 'format', 'record', 'data', 'instructions', 'system', 'admin'
+)
+
+# Markup that only shows up in templates to be filled in: tags, table rules, code fences, JSON objects, queries.
+STRUCTURE_PATTERN = re.compile(
+    r'<\s*/?\s*[a-z_]+[^>]*>|\|\s*-{3,}|```|\{\s*["\']|\bselect\b.+\bfrom\b',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Letters that look alike or are commonly swapped in. They are only folded in the squashed view,
+# since digits are meaningful in the readable one.
+_HOMOGLYPHS = str.maketrans({
+    'а': 'a', 'е': 'e', 'о': 'o', 'р': 'p', 'с': 'c', 'х': 'x', 'у': 'y', 'і': 'i', 'ј': 'j', 'ѕ': 's',
+    'ԁ': 'd', 'ո': 'n', 'ν': 'v', 'ο': 'o', 'α': 'a', 'ε': 'e', 'ι': 'i', 'κ': 'k', 'τ': 't', 'ρ': 'p',
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's', '!': 'i', '|': 'l',
+})
+_HOMOGLYPHS_LETTERS_ONLY = {code: letter for code, letter in _HOMOGLYPHS.items() if chr(code).isalpha()}
+_NON_ALNUM = re.compile(r'[\W_]+')
+_NON_LETTER = re.compile(r'[^a-z]+')
+_SPACED_LETTERS = re.compile(r'(?:\b\w\b[\W_]+){4,}\b\w\b')
+
+# Squashed matching ignores word boundaries, so short phrases would fire inside ordinary words.
+_MIN_SQUASHED_LENGTH = 6
+
+
+class Squashed(NamedTuple):
+    """The letters of a text, and for each one whether it was substituted and whether anything was dropped before it."""
+    letters: str
+    substituted: list[bool]
+    separated: list[bool]
+
+
+class RuleVerdict(NamedTuple):
+    reject: bool
+    category: str | None = None
+    phrase: str | None = None
+
+
+def normalize(text: str) -> str:
+    """Fold Unicode forms and case, and turn every run of punctuation and spacing into one space."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' ' + _NON_ALNUM.sub(' ', text.translate(_HOMOGLYPHS_LETTERS_ONLY)).strip() + ' '
+
+
+def squash(text: str) -> str:
+    """Drop everything but letters, after undoing look-alike substitutions: `c-r-3-d-1-t` becomes `credit`."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return _NON_LETTER.sub('', text.translate(_HOMOGLYPHS))
+
+
+def squash_traced(text: str) -> Squashed:
+    """`squash`, remembering which letters were substituted and which had something dropped before them."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    letters, substituted, separated, dropped = [], [], [], False
+    for char in text:
+        letter = char.translate(_HOMOGLYPHS)
+        if 'a' <= letter <= 'z':
+            letters.append(letter)
+            substituted.append(letter != char)
+            separated.append(dropped)
+            dropped = False
+        else:
+            dropped = True
+    return Squashed(''.join(letters), substituted, separated)
+
+
+class RuleEngine:
+    """
+    Rejects obvious prompt injections locally and leaves every other input to the LLM validator.
+
+    The phrases are matched on word boundaries with one Aho-Corasick pass over the normalized input.
+    A second pass over the squashed input (letters only, look-alikes folded) catches phrases hidden
+    with spacing, symbols or character substitution. Since that pass ignores word boundaries, a
+    squashed match only rejects when it was actually hidden: a look-alike was folded or a separator
+    was dropped inside one of its words. Other squashed matches ("refilling", "payments") and runs of
+    spaced letters that spell no phrase are left to the LLM. `check` returns a rejecting verdict, or a
+    non-rejecting one naming the first ambiguous word (if any) that the LLM has to judge.
+    """
+
+    def __init__(
+            self,
+            decisive_rules: dict[str, tuple[str, ...]] = DECISIVE_RULES,
+            ambiguous_words: tuple[str, ...] = AMBIGUOUS_WORDS
+    ):
+        self._phrases: list[tuple[str, str | None]] = []
+        for category, phrases in decisive_rules.items():
+            self._phrases += [(phrase, category) for phrase in phrases]
+        self._phrases += [(word, None) for word in ambiguous_words]
+
+        self._words = AhoCorasick(normalize(phrase).strip() for phrase, _ in self._phrases)
+        decisive = [(squash_traced(phrase), phrase, category) for phrase, category in self._phrases if category]
+        squashed = [entry for entry in decisive if len(entry[0].letters) >= _MIN_SQUASHED_LENGTH]
+        self._squashed_phrases = [(phrase, category, traced.separated) for traced, phrase, category in squashed]
+        self._squashed = AhoCorasick(traced.letters for traced, _, _ in squashed)
+        self._spelled_phrases = [(phrase, category) for _, phrase, category in decisive]
+        self._spelled = AhoCorasick(traced.letters for traced, _, _ in decisive)
+
+    def check(self, user_input: str) -> RuleVerdict:
+        text = normalize(user_input)
+        ambiguous = None
+        for start, end, index in self._words.finditer(text):
+            if text[start - 1] != ' ' or text[end] != ' ':
+                continue
+            phrase, category = self._phrases[index]
+            if category:
+                return RuleVerdict(True, category, phrase)
+            ambiguous = ambiguous or phrase
+
+        structure = STRUCTURE_PATTERN.search(user_input)
+        if structure:
+            return RuleVerdict(True, 'structured data request', structure.group())
+
+        squashed = squash_traced(user_input)
+        for start, end, index in self._squashed.finditer(squashed.letters):
+            phrase, category, word_breaks = self._squashed_phrases[index]
+            hidden = any(squashed.substituted[start:end]) or any(
+                squashed.separated[position] and not word_breaks[position - start] for position in range(start + 1, end)
+            )
+            if hidden:
+                return RuleVerdict(True, f'obfuscated {category}', phrase)
+            ambiguous = ambiguous or phrase
+
+        spaced = _SPACED_LETTERS.search(user_input)
+        if spaced:
+            match = self._spelled.search(squash(spaced.group()))
+            if match:
+                phrase, category = self._spelled_phrases[match[2]]
+                return RuleVerdict(True, f'obfuscated {category}', phrase)
+            ambiguous = ambiguous or spaced.group()
+
+        return RuleVerdict(False, None, ambiguous)
+
+
+DEFAULT_RULE_ENGINE = RuleEngine()
@@ -0,0 +1,65 @@
+import argparse
+import time
+
+from tasks._prompt_injections import BENIGN_QUERIES, load_prompt_injections
+from tasks.t_2.rule_engine import DEFAULT_RULE_ENGINE, RuleEngine
+
+
+def run(engine: RuleEngine, samples: list[tuple[str, str, bool]], repeat: int = 200) -> dict:
+    """
+    Check every `(title, prompt, expected_valid)` sample and compare the local verdicts with the expected ones.
+
+    Only a local rejection saves an LLM call; every other input is escalated, so agreement is measured
+    over the inputs decided locally.
+    """
+    rows = []
+    for title, prompt, expected_valid in samples:
+        verdict = engine.check(prompt)
+        rows.append((title, verdict, expected_valid))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, prompt, _ in samples:
+            engine.check(prompt)
+    elapsed = time.perf_counter() - start
+
+    decided = [row for row in rows if row[1].reject]
+    return {
+        'inputs': len(rows),
+        'llm_calls_avoided': len(decided),
+        'agreement': sum(not expected_valid for _, _, expected_valid in decided) / len(decided) if decided else 1.0,
+        'missed_attacks': [title for title, verdict, expected_valid in rows if not expected_valid and not verdict.reject],
+        'false_rejections': [title for title, verdict, expected_valid in rows if expected_valid and verdict.reject],
+        'microseconds_per_check': elapsed / (repeat * len(rows)) * 1e6,
+        'rows': rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local rule engine against the prompt injection set.")
+    parser.add_argument(
+        '--llm', action='store_true',
+        help="Use the LLM validator's verdicts as the reference instead of the expected labels (needs DIAL)."
+    )
+    args = parser.parse_args()
+
+    samples = [(title, prompt, False) for title, prompt in load_prompt_injections()]
+    samples += [(query, query, True) for query in BENIGN_QUERIES]
+    if args.llm:
+        from tasks.t_2.input_llm_based_validation import validate_with_llm
+        samples = [(title, prompt, validate_with_llm(prompt).valid) for title, prompt, _ in samples]
+
+    report = run(DEFAULT_RULE_ENGINE, samples)
+    for title, verdict, expected_valid in report['rows']:
+        decision = f"reject ({verdict.category}: '{verdict.phrase}')" if verdict.reject else 'escalate'
+        print(f"{'valid' if expected_valid else 'attack':7} {decision:60.60} {title[:60]}")
+    print('=' * 100)
+    print(f"LLM calls avoided: {report['llm_calls_avoided']}/{report['inputs']}")
+    print(f"Agreement on local verdicts: {report['agreement']:.1%}")
+    print(f"Attacks escalated to the LLM: {len(report['missed_attacks'])}")
+    print(f"Valid inputs rejected locally: {len(report['false_rejections'])}")
+    print(f"Time per check: {report['microseconds_per_check']:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
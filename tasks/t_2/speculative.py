@@ -0,0 +1,82 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Protocol, TypeVar
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+
+class Verdict(Protocol):
+    valid: bool
+
+
+VerdictT = TypeVar('VerdictT', bound=Verdict)
+
+
+@dataclass
+class SpeculationStats:
+    """
+    What speculative generation cost and saved. Streamed chunks count as tokens when the model does
+    not report usage, which is one token per chunk for OpenAI-style streaming.
+    """
+    released: int = 0
+    discarded: int = 0
+    wasted_tokens: int = 0
+    saved_seconds: float = 0.0
+
+
+async def generate_speculatively(
+        validation: Awaitable[VerdictT],
+        client: BaseChatModel,
+        messages: list[BaseMessage],
+        stats: SpeculationStats | None = None
+) -> tuple[VerdictT, AIMessage | None]:
+    """
+    Validate the input and generate the answer to `messages` at the same time.
+
+    The answer is returned only if the validation passes, so the user waits for the slower of the two
+    calls instead of both. If the validation fails, or raises, the generation is cancelled and the
+    tokens it streamed so far are counted as wasted.
+    """
+    chunks: list[AIMessageChunk] = []
+
+    async def generate() -> float:
+        async for chunk in client.astream(messages):
+            chunks.append(chunk)
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    generation = asyncio.create_task(generate())
+    try:
+        verdict = await validation
+        validated = time.perf_counter()
+        if verdict.valid:
+            generated = await generation
+    finally:
+        if not generation.done():
+            generation.cancel()
+            await asyncio.wait([generation])
+
+    if not verdict.valid:
+        if not generation.cancelled():
+            generation.exception()
+        if stats is not None:
+            stats.discarded += 1
+            stats.wasted_tokens += _count_tokens(chunks)
+        return verdict, None
+
+    if stats is not None:
+        stats.released += 1
+        # Run one after the other, the calls would have taken as long as both of them.
+        stats.saved_seconds += min(validated, generated) - started
+
+    message = sum(chunks[1:], chunks[0]) if chunks else AIMessageChunk(content="")
+    return verdict, AIMessage(content=message.content, response_metadata=message.response_metadata)
+
+
+def _count_tokens(chunks: list[AIMessageChunk]) -> int:
+    usage = [chunk.usage_metadata for chunk in chunks if chunk.usage_metadata]
+    if usage:
+        return sum(item['output_tokens'] for item in usage)
+    return sum(1 for chunk in chunks if chunk.content)
@@ -0,0 +1,117 @@
+"""
+Checks for `generate_speculatively` against local models: a valid turn waits for the slower call
+only, and a rejected or failed validation cancels the generation and releases nothing.
+
+Run with `python -m tasks.t_2.speculative_checks`.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from tasks._checks import run_checks
+from tasks._fake_chat_model import ScriptedChatModel
+from tasks.t_2.speculative import SpeculationStats, generate_speculatively
+
+MESSAGES = [HumanMessage(content="What is Amanda's email?")]
+ANSWER = "Amanda's work email is amanda_hello@mailpro.net."
+
+
+@dataclass
+class FakeVerdict:
+    valid: bool
+
+
+async def validation(valid: bool, seconds: float) -> FakeVerdict:
+    await asyncio.sleep(seconds)
+    return FakeVerdict(valid)
+
+
+class RecordingClient:
+    """Streams `count` chunks, one per `delay` seconds, and records how many were produced and whether it was closed."""
+
+    def __init__(self, count: int = 50, delay: float = 0.01):
+        self.count = count
+        self.delay = delay
+        self.produced = 0
+        self.closed = False
+
+    def astream(self, messages):
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            for index in range(self.count):
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield AIMessageChunk(content=f"token{index} ")
+        finally:
+            self.closed = True
+
+
+async def check_valid_turn_waits_for_the_slower_call():
+    # Both calls take about 0.2 s: one after the other they would take 0.4 s.
+    model = ScriptedChatModel(responses=[ANSWER], chunk_size=len(ANSWER) // 10 + 1, latency=0.02)
+    stats = SpeculationStats()
+    started = time.perf_counter()
+    verdict, message = await generate_speculatively(validation(True, 0.2), model, MESSAGES, stats)
+    elapsed = time.perf_counter() - started
+    assert verdict.valid and message.content == ANSWER, message
+    assert elapsed < 0.3, elapsed
+    assert stats.released == 1 and stats.discarded == 0 and stats.wasted_tokens == 0, stats
+    assert 0.15 < stats.saved_seconds < 0.3, stats
+
+
+async def check_rejected_turn_cancels_generation():
+    client, stats = RecordingClient(), SpeculationStats()
+    started = time.perf_counter()
+    verdict, message = await generate_speculatively(validation(False, 0.05), client, MESSAGES, stats)
+    elapsed = time.perf_counter() - started
+    assert not verdict.valid and message is None
+    assert elapsed < 0.2, elapsed
+    assert client.closed
+    produced = client.produced
+    await asyncio.sleep(0.05)
+    assert client.produced == produced < client.count, client.produced
+    assert stats.discarded == 1 and stats.released == 0, stats
+    assert stats.wasted_tokens == produced, (stats, produced)
+
+
+async def check_failed_validation_cancels_generation():
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise ConnectionError("validator unreachable")
+
+    client, stats = RecordingClient(), SpeculationStats()
+    try:
+        await generate_speculatively(failing(), client, MESSAGES, stats)
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("the validation error was swallowed")
+    assert client.closed and client.produced < client.count, client.produced
+    assert stats == SpeculationStats(), stats
+
+
+async def check_reported_usage_counts_as_wasted_tokens():
+    class UsageClient(RecordingClient):
+        async def _stream(self):
+            async for chunk in super()._stream():
+                chunk.usage_metadata = {'input_tokens': 0, 'output_tokens': 3, 'total_tokens': 3}
+                yield chunk
+
+    client, stats = UsageClient(), SpeculationStats()
+    await generate_speculatively(validation(False, 0.05), client, MESSAGES, stats)
+    assert stats.wasted_tokens == 3 * client.produced > 0, (stats, client.produced)
+
+
+CHECKS = [
+    check_valid_turn_waits_for_the_slower_call,
+    check_rejected_turn_cancels_generation,
+    check_failed_validation_cancels_generation,
+    check_reported_usage_counts_as_wasted_tokens,
+]
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_checks(CHECKS) else 0)
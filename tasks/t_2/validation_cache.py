@@ -0,0 +1,135 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar
+
+from langchain_core.language_models import BaseChatModel
+from pydantic import BaseModel
+
+ModelT = TypeVar('ModelT', bound=BaseModel)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_input(text: str) -> str:
+    """Fold the differences that do not change what is being asked: Unicode form, case and whitespace."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+
+
+def cache_key(user_input: str, prompt: str, model: str) -> str:
+    """Key a verdict by the normalized input, the validation prompt and the model that produced it."""
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_hash}\0{normalize_input(user_input)}".encode()).hexdigest()
+
+
+def model_id(client: BaseChatModel) -> str:
+    """Name the model behind `client`, for keying what it produced."""
+    return getattr(client, 'deployment_name', None) or getattr(client, 'model_name', None) or client._llm_type
+
+
+class ValidationCache(Generic[ModelT]):
+    """
+    An LRU cache of validation results with a time to live.
+
+    At most `max_size` results are kept in memory and each one expires `ttl` seconds after it was
+    stored. With a `path`, results are also written to an SQLite file and read back from it on a
+    memory miss, so they survive restarts. `hits`, `misses` and `evictions` count what happened,
+    where an eviction is a result dropped because the cache was full or because it expired. The file
+    is pruned to the `max_size` newest results that have not expired on every `put`.
+
+    Results are copied in and out, so a caller that changes the model it got cannot change what the
+    next caller gets.
+    """
+
+    def __init__(
+            self,
+            schema: type[ModelT],
+            max_size: int = 1024,
+            ttl: float = 24 * 60 * 60,
+            path: str | None = None,
+            clock: Callable[[], float] = time.time
+    ):
+        self.schema = schema
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, ModelT]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS validations (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS validations_stored_at ON validations (stored_at)")
+            self._db.commit()
+
+    def get(self, key: str) -> ModelT | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                if self._db is not None:
+                    self._db.execute("DELETE FROM validations WHERE key = ?", (key,))
+                    self._db.commit()
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+            self.hits += 1
+            return entry[1].model_copy(deep=True)
+
+    def put(self, key: str, value: ModelT):
+        with self._lock:
+            stored_at = self.clock()
+            self._entries[key] = (stored_at, value.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            self._evict()
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO validations VALUES (?, ?, ?)", (key, stored_at, value.model_dump_json())
+                )
+                self._prune(stored_at)
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM validations")
+                self._db.commit()
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self, now: float):
+        self._db.execute("DELETE FROM validations WHERE stored_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM validations WHERE key IN "
+            "(SELECT key FROM validations ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+
+    def _load(self, key: str) -> tuple[float, ModelT] | None:
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT stored_at, value FROM validations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], self.schema.model_validate_json(row[1])
@@ -0,0 +1,50 @@
+import asyncio
+from typing import AsyncIterator, Protocol
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+
+class StreamingGuardrail(Protocol):
+    """What `StreamingPIIGuardrail` and `PresidioStreamingPIIGuardrail` have in common."""
+
+    def process_chunk(self, chunk: str) -> str: ...
+
+    def finalize(self) -> str: ...
+
+
+async def astream_guarded(
+        client: BaseChatModel,
+        messages: list[BaseMessage],
+        guardrail: StreamingGuardrail,
+        offload: bool = False
+) -> AsyncIterator[str]:
+    """
+    Stream the answer of `client` to `messages` through `guardrail`, yielding only redacted text.
+
+    The model is read only when the consumer asks for the next chunk, so a slow consumer slows down
+    the upstream read instead of piling chunks up in memory. If the consumer stops early or the task
+    is cancelled, the upstream stream is closed and the buffered text is dropped instead of being
+    flushed. `finalize()` is only called once the model has finished.
+
+    Set `offload` for guardrails with blocking analysis, such as Presidio, so it runs in a worker
+    thread instead of stalling every other stream on the event loop. Chunks are still processed one
+    at a time and in order.
+    """
+    stream = client.astream(messages)
+    try:
+        async for chunk in stream:
+            if not chunk.content:
+                continue
+            if offload:
+                safe_chunk = await asyncio.to_thread(guardrail.process_chunk, chunk.content)
+            else:
+                safe_chunk = guardrail.process_chunk(chunk.content)
+            if safe_chunk:
+                yield safe_chunk
+    finally:
+        await stream.aclose()
+
+    final_chunk = await asyncio.to_thread(guardrail.finalize) if offload else guardrail.finalize()
+    if final_chunk:
+        yield final_chunk
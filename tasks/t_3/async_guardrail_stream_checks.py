@@ -0,0 +1,142 @@
+"""
+Checks for `astream_guarded` against local models: output, backpressure, and closing the upstream
+stream when the consumer stops, disconnects or is cancelled.
+
+Run with `python -m tasks.t_3.async_guardrail_stream_checks`.
+"""
+import asyncio
+from contextlib import aclosing
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from tasks._checks import run_checks
+from tasks._fake_chat_model import ScriptedChatModel
+from tasks.t_3.async_guardrail_stream import astream_guarded
+from tasks.t_3.pii_redaction import DEFAULT_ENGINE
+from tasks.t_3.streaming_pii_guardrail import StreamingPIIGuardrail
+
+MESSAGES = [HumanMessage(content="Tell me about Amanda.")]
+ANSWER = (
+    "Amanda's SSN is 234-56-7890 and her card is 3782 8224 6310 0015 (Exp: 05/29, CVV: 1234). "
+    "She lives at 9823 Sunset Boulevard and earns $112,800 a year. Call her at (310) 555-0734."
+)
+
+
+class RecordingGuardrail:
+    """Passes every chunk through and records what it was asked to do."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.finalized = False
+
+    def process_chunk(self, chunk: str) -> str:
+        self.chunks.append(chunk)
+        return chunk
+
+    def finalize(self) -> str:
+        self.finalized = True
+        return ""
+
+
+class RecordingClient:
+    """Streams `count` chunks, one per `delay` seconds, and records how many were produced and whether it was closed."""
+
+    def __init__(self, count: int = 100, delay: float = 0.0):
+        self.count = count
+        self.delay = delay
+        self.produced = 0
+        self.closed = False
+
+    def astream(self, messages):
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            for index in range(self.count):
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield AIMessageChunk(content=f"chunk {index} ")
+        finally:
+            self.closed = True
+
+
+async def check_output_matches_whole_text_redaction():
+    for chunk_size in (1, 3, 7, 64):
+        for offload in (False, True):
+            model = ScriptedChatModel(responses=[ANSWER], chunk_size=chunk_size)
+            chunks = [chunk async for chunk in astream_guarded(model, MESSAGES, StreamingPIIGuardrail(), offload)]
+            assert "".join(chunks) == DEFAULT_ENGINE.redact(ANSWER), (chunk_size, offload, "".join(chunks))
+
+
+async def check_backpressure():
+    client, guardrail = RecordingClient(), RecordingGuardrail()
+    async with aclosing(astream_guarded(client, MESSAGES, guardrail)) as stream:
+        for _ in range(3):
+            await anext(stream)
+        # A consumer that stops asking must not make the upstream read ahead.
+        await asyncio.sleep(0.05)
+        assert client.produced == 3, client.produced
+        assert len(guardrail.chunks) == 3, guardrail.chunks
+
+
+async def check_consumer_stop_closes_upstream():
+    client, guardrail = RecordingClient(), RecordingGuardrail()
+    async with aclosing(astream_guarded(client, MESSAGES, guardrail)) as stream:
+        async for _ in stream:
+            break
+    assert client.closed
+    assert client.produced == 1, client.produced
+    assert not guardrail.finalized
+
+
+async def check_disconnect_closes_upstream():
+    """A consumer that fails while writing, as a server does when the caller goes away."""
+    client, guardrail = RecordingClient(), RecordingGuardrail()
+    try:
+        async with aclosing(astream_guarded(client, MESSAGES, guardrail)) as stream:
+            async for _ in stream:
+                raise ConnectionResetError
+    except ConnectionResetError:
+        pass
+    assert client.closed
+    assert not guardrail.finalized
+
+
+async def check_cancellation_closes_upstream():
+    client, guardrail = RecordingClient(delay=0.01), RecordingGuardrail()
+
+    async def consume():
+        async with aclosing(astream_guarded(client, MESSAGES, guardrail)) as stream:
+            async for _ in stream:
+                pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    assert client.closed
+    assert 0 < client.produced < client.count, client.produced
+    assert not guardrail.finalized
+
+
+async def check_finalize_after_upstream_ends():
+    client, guardrail = RecordingClient(count=5), RecordingGuardrail()
+    chunks = [chunk async for chunk in astream_guarded(client, MESSAGES, guardrail)]
+    assert len(chunks) == 5
+    assert client.closed and guardrail.finalized
+
+
+CHECKS = [
+    check_output_matches_whole_text_redaction,
+    check_backpressure,
+    check_consumer_stop_closes_upstream,
+    check_disconnect_closes_upstream,
+    check_cancellation_closes_upstream,
+    check_finalize_after_upstream_ends,
+]
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_checks(CHECKS) else 0)
@@ -0,0 +1,235 @@
+"""
+Bulk redaction of JSONL transcripts with the regex patterns of `StreamingPIIGuardrail`.
+
+Input files are memory-mapped only to find shard boundaries: every shard is a byte range that starts
+and ends on a line break, so no record is ever split. The workers read and redact their own ranges
+and the parent writes the redacted shards in input order, keeping at most two shards per worker in
+flight, so memory stays the same however large the corpus is. Standard input is streamed in shards
+of whole lines instead.
+
+In every JSON record, the strings under the `--field` keys are redacted, at any depth (so the
+`content` of every message in `{"messages": [...]}` is covered); a bare JSON string or a line that
+is not JSON is redacted as a whole. Every text is redacted in one piece, exactly like a stream that
+the guardrail flushes at `finalize`. Records without PII are written back byte for byte.
+
+Run with `python -m tasks.t_3.bulk_redaction logs/*.jsonl --output redacted.jsonl --stats stats.json`.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, BinaryIO, Iterable, Iterator, NamedTuple
+
+from tasks.t_3.pii_redaction import DEFAULT_ENGINE, apply_redactions
+
+DEFAULT_FIELDS = ('content',)
+DEFAULT_SHARD_SIZE = 4 * 1024 ** 2
+
+
+class FileShard(NamedTuple):
+    path: str
+    start: int
+    end: int
+
+
+class ShardResult(NamedTuple):
+    data: bytes
+    records: int
+    redacted_records: int
+    # Lines that are not JSON and were redacted as plain text.
+    plain_records: int
+    bytes_in: int
+    entities: Counter
+
+
+def file_shards(path: str, shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[FileShard]:
+    """Split `path` into byte ranges of about `shard_size` that end right after a line break."""
+    size = os.path.getsize(path)
+    if not size:
+        return
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            newline = data.find(b'\n', min(start + shard_size, size) - 1)
+            end = size if newline == -1 else newline + 1
+            yield FileShard(path, start, end)
+            start = end
+
+
+def stream_shards(stream: BinaryIO, shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[bytes]:
+    """Read `stream` in shards of whole lines of about `shard_size` bytes."""
+    lines, size = [], 0
+    for line in stream:
+        lines.append(line)
+        size += len(line)
+        if size >= shard_size:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b''.join(lines)
+
+
+def _redact_text(text: str, found: list[str]) -> str:
+    redactions = DEFAULT_ENGINE.find(text)
+    if not redactions:
+        return text
+    found.extend(redaction.entity for redaction in redactions)
+    return apply_redactions(text, redactions)
+
+
+def _redact_value(value: Any, fields: frozenset[str], found: list[str], redact_strings: bool = False) -> Any:
+    if isinstance(value, str):
+        return _redact_text(value, found) if redact_strings else value
+    if isinstance(value, dict):
+        return {key: _redact_value(item, fields, found, redact_strings or key in fields) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact_value(item, fields, found, redact_strings) for item in value]
+    return value
+
+
+def redact_record(line: bytes, fields: frozenset[str]) -> tuple[bytes, bool, list[str]]:
+    """
+    Redact one JSONL line. Returns it with its line break, whether it was JSON, and the entities found.
+    """
+    body = line.rstrip(b'\r\n')
+    ending = line[len(body):] or b'\n'
+    text = body.decode('utf-8', errors='replace')
+    found: list[str] = []
+    try:
+        record = json.loads(text)
+    except json.JSONDecodeError:
+        redacted = _redact_text(text, found)
+        return (redacted.encode('utf-8') if found else body) + ending, False, found
+
+    redacted = _redact_value(record, fields, found, redact_strings=isinstance(record, str))
+    if not found:
+        return body + ending, True, found
+    return json.dumps(redacted, ensure_ascii=False).encode('utf-8') + ending, True, found
+
+
+def redact_shard(shard: FileShard | bytes, fields: frozenset[str]) -> ShardResult:
+    """Redact every record of a shard. File shards are read here, so only their range is pickled."""
+    if isinstance(shard, FileShard):
+        with open(shard.path, 'rb') as file:
+            file.seek(shard.start)
+            data = file.read(shard.end - shard.start)
+    else:
+        data = shard
+
+    output, records, redacted_records, plain_records = [], 0, 0, 0
+    entities: Counter = Counter()
+    for line in data.splitlines(keepends=True):
+        if not line.strip():
+            output.append(line)
+            continue
+        redacted, is_json, found = redact_record(line, fields)
+        output.append(redacted)
+        entities.update(found)
+        records += 1
+        redacted_records += bool(found)
+        plain_records += not is_json
+    return ShardResult(b''.join(output), records, redacted_records, plain_records, len(data), entities)
+
+
+class _InProcessExecutor(Executor):
+    """Runs every shard right away, for `--workers 0` and for one-core machines."""
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def redact_shards(
+        shards: Iterable[FileShard | bytes],
+        sink: BinaryIO,
+        fields: Iterable[str] = DEFAULT_FIELDS,
+        workers: int | None = None
+) -> dict:
+    """
+    Redact `shards` across `workers` processes and write the results to `sink` in input order.
+
+    At most two shards per worker are in flight at a time. Returns the statistics of the run.
+    """
+    fields = frozenset(fields)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InProcessExecutor()
+
+    stats = {'records': 0, 'redacted_records': 0, 'plain_records': 0, 'bytes_in': 0, 'bytes_out': 0, 'shards': 0}
+    entities: Counter = Counter()
+    pending: deque[Future] = deque()
+    started = time.perf_counter()
+
+    def write(result: ShardResult):
+        sink.write(result.data)
+        stats['records'] += result.records
+        stats['redacted_records'] += result.redacted_records
+        stats['plain_records'] += result.plain_records
+        stats['bytes_in'] += result.bytes_in
+        stats['bytes_out'] += len(result.data)
+        stats['shards'] += 1
+        entities.update(result.entities)
+
+    with executor:
+        for shard in shards:
+            pending.append(executor.submit(redact_shard, shard, fields))
+            if len(pending) >= 2 * max(workers, 1):
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    sink.flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        'workers': max(workers, 1),
+        'seconds': elapsed,
+        'records_per_second': stats['records'] / elapsed if elapsed else 0.0,
+        'megabytes_per_second': stats['bytes_in'] / 1024 ** 2 / elapsed if elapsed else 0.0,
+        'entities': dict(entities.most_common()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redact PII in JSONL transcripts with the streaming guardrail patterns.")
+    parser.add_argument('paths', nargs='+', help="JSONL files, redacted one after the other; '-' for stdin")
+    parser.add_argument('--output', '-o', help="Where to write the redacted JSONL (default: stdout)")
+    parser.add_argument('--field', action='append', dest='fields', help="Key whose strings are redacted (default: content)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU, 0 or 1: in process)")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="Bytes per shard")
+    parser.add_argument('--stats', help="Where to save the statistics as JSON")
+    args = parser.parse_args()
+
+    def shards() -> Iterator[FileShard | bytes]:
+        for path in args.paths:
+            if path == '-':
+                yield from stream_shards(sys.stdin.buffer, args.shard_size)
+            else:
+                yield from file_shards(path, args.shard_size)
+
+    sink = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        stats = redact_shards(shards(), sink, args.fields or DEFAULT_FIELDS, args.workers)
+    finally:
+        if sink is not sys.stdout.buffer:
+            sink.close()
+
+    print(
+        f"{stats['records']} records ({stats['bytes_in'] / 1024 ** 2:.1f} MB) in {stats['seconds']:.2f} s: "
+        f"{stats['records_per_second']:.0f} records/s, {stats['megabytes_per_second']:.1f} MB/s, "
+        f"{stats['redacted_records']} redacted, {stats['plain_records']} not JSON",
+        file=sys.stderr
+    )
+    for entity, count in stats['entities'].items():
+        print(f"  {entity:15} {count}", file=sys.stderr)
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as file:
+            json.dump(stats, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
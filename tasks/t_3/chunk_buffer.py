@@ -0,0 +1,51 @@
+class ChunkBuffer:
+    """
+    Holds the streamed text that has not been flushed yet.
+
+    Appending a chunk only stores a reference to it. The pending chunks are joined once, when the
+    text is looked at, and flushed text is dropped by moving a start index instead of re-slicing the
+    buffer, so a flush copies at most the unflushed text once no matter how many chunks it spans.
+    Positions are also tracked as absolute offsets in the whole stream.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._start = 0
+        self._chunks: list[str] = []
+        self._length = 0
+        # Absolute stream offset of the first unflushed character.
+        self.offset = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def end(self) -> int:
+        """Absolute stream offset just past the last appended character."""
+        return self.offset + self._length
+
+    def append(self, chunk: str):
+        if chunk:
+            self._chunks.append(chunk)
+            self._length += len(chunk)
+
+    def view(self) -> str:
+        """Return the unflushed text."""
+        if self._chunks or self._start:
+            self._chunks.insert(0, self._text[self._start:])
+            self._text = "".join(self._chunks)
+            self._start = 0
+            self._chunks.clear()
+        return self._text
+
+    def consume(self, length: int) -> str:
+        """Remove and return the first `length` unflushed characters."""
+        length = max(0, min(length, self._length))
+        text = self.view()[:length]
+        self._start = length
+        self._length -= length
+        self.offset += length
+        return text
+
+    def consume_all(self) -> str:
+        return self.consume(self._length)
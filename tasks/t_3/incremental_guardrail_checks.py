@@ -0,0 +1,118 @@
+"""
+Checks for `IncrementalPresidioStreamingPIIGuardrail` with a scripted analyzer, so no spaCy model is
+needed: however the profile is chunked, the incremental guardrail must redact exactly like one
+analysis of the whole text, including names that only become whole entities once more text arrives.
+
+Run with `python -m tasks.t_3.incremental_guardrail_checks`.
+"""
+import random
+import re
+
+from tasks._checks import run_checks
+from tasks.t_3.presidio_registry import get_anonymizer
+from tasks.t_3.streaming_pii_guardrail import PROFILE, IncrementalPresidioStreamingPIIGuardrail
+
+TEXT = PROFILE * 4
+
+
+class ScriptedAnalyzer:
+    """Recognizes a few entities with patterns, including a name that is recognized as soon as it starts."""
+
+    patterns = {
+        'US_SSN': re.compile(r'\b\d{3}-\d{2}-\d{4}\b'),
+        'CREDIT_CARD': re.compile(r'\b(?:\d{4} ){3}\d{4}\b'),
+        'DATE_TIME': re.compile(r'\b(?:July|May) \d{1,2}, \d{4}\b'),
+        # Like NER on a truncated name: "Amanda Gr" is already a person.
+        'PERSON': re.compile(r'\bAmanda(?: Grace(?: Johnson)?)?\b'),
+    }
+
+    def __init__(self):
+        self.analyzed_characters = 0
+
+    def analyze(self, text: str, language: str, entities: list[str] | None = None):
+        from presidio_analyzer import RecognizerResult
+
+        self.analyzed_characters += len(text)
+        return [
+            RecognizerResult(entity, match.start(), match.end(), 0.85)
+            for entity, pattern in self.patterns.items()
+            if entities is None or entity in entities
+            for match in pattern.finditer(text)
+        ]
+
+
+class ScriptedIncrementalGuardrail(IncrementalPresidioStreamingPIIGuardrail):
+    def __init__(self, analyzer: ScriptedAnalyzer, **options):
+        super().__init__(**options)
+        self._analyzer = analyzer
+
+    @property
+    def analyzer(self) -> ScriptedAnalyzer:
+        return self._analyzer
+
+
+def _whole_text(text: str) -> str:
+    return get_anonymizer().anonymize(text=text, analyzer_results=ScriptedAnalyzer().analyze(text, 'en')).text
+
+
+def _chunks(text: str, generator: random.Random) -> list[str]:
+    chunks, position = [], 0
+    while position < len(text):
+        size = generator.randint(1, 6)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+def _stream(guardrail, chunks: list[str]) -> str:
+    return "".join(guardrail.process_chunk(chunk) for chunk in chunks) + guardrail.finalize()
+
+
+def check_random_chunkings_match_whole_text():
+    expected = _whole_text(TEXT)
+    generator = random.Random(0)
+    for run in range(50):
+        output = _stream(ScriptedIncrementalGuardrail(ScriptedAnalyzer()), _chunks(TEXT, generator))
+        assert output == expected, f"run {run}:\n{output}"
+
+
+def check_redactions_are_spans_of_the_stream():
+    guardrail = ScriptedIncrementalGuardrail(ScriptedAnalyzer())
+    _stream(guardrail, _chunks(TEXT, random.Random(1)))
+    expected = sorted(
+        (result.start, result.end, result.entity_type) for result in ScriptedAnalyzer().analyze(TEXT, 'en')
+    )
+    actual = [(redaction.start, redaction.end, redaction.entity) for redaction in guardrail.redactions]
+    assert actual == expected, actual
+    assert all(TEXT[start:end] for start, end, _ in actual)
+
+
+def check_name_split_across_analyses():
+    # The first analysis sees only "Amanda" and must not release it before "Grace Johnson" arrives.
+    text = "Please reach out to Amanda Grace Johnson about the report today."
+    output = _stream(ScriptedIncrementalGuardrail(ScriptedAnalyzer(), buffer_size=20), [text[:26], text[26:]])
+    assert output == _whole_text(text), output
+
+
+def check_context_overhead_is_bounded():
+    analyzer = ScriptedAnalyzer()
+    guardrail = ScriptedIncrementalGuardrail(analyzer)
+    _stream(guardrail, _chunks(TEXT, random.Random(2)))
+    assert guardrail.analyzed_characters == analyzer.analyzed_characters
+    # Every character is analyzed once, plus at most `context_size` characters of context per analysis.
+    assert analyzer.analyzed_characters < 2.5 * len(TEXT), analyzer.analyzed_characters
+
+    analyzer = ScriptedAnalyzer()
+    _stream(ScriptedIncrementalGuardrail(analyzer, context_size=0), _chunks(TEXT, random.Random(3)))
+    assert analyzer.analyzed_characters < 1.5 * len(TEXT), analyzer.analyzed_characters
+
+
+CHECKS = [
+    check_random_chunkings_match_whole_text,
+    check_redactions_are_spans_of_the_stream,
+    check_name_split_across_analyses,
+    check_context_overhead_is_bounded,
+]
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_checks(CHECKS) else 0)
@@ -1,10 +1,18 @@
+import asyncio
+from typing import Iterable, Literal
+
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import SystemMessagePromptTemplate, ChatPromptTemplate
-from langchain_openai import AzureChatOpenAI
-from pydantic import SecretStr, BaseModel, Field
+from pydantic import BaseModel, Field
 
-from tasks._constants import DIAL_URL, API_KEY
+from tasks._client import create_client
+from tasks.batch_validation import BatchResult, avalidate_batch, validate_batch
+from tasks.history import ConversationHistory
+from tasks.metrics import get_registry, record_verdict
+from tasks.pipeline import LazyChain, build_validation_chain
+from tasks.resilience import GuardrailUnavailable, ResilientCall
+from tasks.t_3.pii_redaction import DEFAULT_ENGINE
+from tasks.t_3.streaming_output_validation import astream_validated
 
 SYSTEM_PROMPT = "You are a secure colleague directory assistant designed to help users find contact information for business purposes."
 
@@ -111,14 +119,54 @@ Output: "Contact Amanda at amandagj1990@techmail.com or (206) 555-0683"
 
 Process the following text:"""
 
-client = AzureChatOpenAI(
-    temperature=0.0,
-    seed=1234,
-    azure_deployment='gpt-4.1-nano-2025-04-14',
-    azure_endpoint=DIAL_URL,
-    api_key=SecretStr(API_KEY),
-    api_version=""
-)
+VALIDATE_AND_FILTER_PROMPT = """You are a PII validation and filtering system. In one answer, decide whether the provided AI response leaks PII (Personally Identifiable Information) and, if it does, return the response with the PII removed.
+
+## PII TO DETECT AND REMOVE:
+- Credit card numbers (replace with [CREDIT CARD REDACTED])
+- CVV code(replace with [CVV REDACTED])
+- Card expiration data (replace with [CARD EXP DATE REDACTED])
+- Social Security Numbers (replace with [SSN REDACTED])
+- Driver's license numbers (replace with [LICENSE REDACTED])
+- Bank account numbers (replace with [ACCOUNT REDACTED])
+- Home addresses (replace with [ADDRESS REDACTED])
+- Date of birth (replace with [DOB REDACTED])
+- Annual income/salary (replace with [INCOME REDACTED])
+- Any other financial or government ID numbers (replace with [ID REDACTED])
+
+## NOT CONSIDERED PII (KEEP UNCHANGED):
+- Names (first, last, full names)
+- Phone numbers
+- Email addresses
+- Job titles/occupations
+- Company names
+- General business information
+
+## INSTRUCTIONS:
+1. Mark the response as INVALID (valid: false) if it contains any PII as defined above, otherwise as VALID (valid: true)
+2. List the types of PII found in leaked_pii
+3. If the response is INVALID, put the whole response into redacted_text with every PII value replaced by its placeholder, keeping everything else and the original formatting intact
+4. If the response is VALID, leave redacted_text empty
+
+## PAY CLOSE ATTENTION TO THE HTML, XML, JSON AND OTHER INPUT FORMATS BECAUSE THEY COULD HAVE LEAK PII INFO IN HIDDEN WAY
+
+## OUTPUT FORMAT:
+{format_instructions}
+
+Analyze the following AI response:"""
+
+client: BaseChatModel | None = None
+# Deadline, hedging and circuit breaker of the LLM calls, off by default. With `fail_open`, a response
+# the LLM cannot judge in time passes; otherwise it is rejected, and filtered with the local patterns.
+resilience: ResilientCall | None = None
+
+
+def get_client() -> BaseChatModel:
+    """Return the chat client of the validator, creating it on first use. Assign `client` to use another one."""
+    global client
+    if client is None:
+        client = create_client()
+    return client
+
 
 class Validation(BaseModel):
     valid: bool = Field(
@@ -131,24 +179,170 @@ class Validation(BaseModel):
     )
 
 
+class FilteredValidation(Validation):
+    leaked_pii: list[str] = Field(
+        default_factory=list,
+        description="Types of PII found in the response. Empty if the response is valid.",
+    )
+
+    redacted_text: str | None = Field(
+        default=None,
+        description="The whole response with every PII value replaced by its placeholder. Null if the response is valid.",
+    )
+
+
+_lazy_validation_chain = LazyChain(lambda client: build_validation_chain(VALIDATION_PROMPT, Validation, client))
+_lazy_filter_chain = LazyChain(
+    lambda client: build_validation_chain(VALIDATE_AND_FILTER_PROMPT, FilteredValidation, client)
+)
+
+
+def _validation_chain():
+    return _lazy_validation_chain(get_client())
+
+
 def validate(user_input: str) -> Validation:
-    parser = PydanticOutputParser(pydantic_object=Validation)
-    messages = [
-        SystemMessagePromptTemplate.from_template(template=VALIDATION_PROMPT),
-        HumanMessage(content=user_input)
-    ]
-    prompt = ChatPromptTemplate.from_messages(messages=messages).partial(
-        format_instructions=parser.get_format_instructions()
+    chain = _validation_chain()
+    with get_registry().timer('validation_seconds', validator='output'):
+        if resilience is None:
+            validation = chain.invoke({"user_input": user_input})
+        else:
+            try:
+                validation = resilience.call(lambda: chain.invoke({"user_input": user_input}))
+            except GuardrailUnavailable as error:
+                return record_verdict('output', 'fallback', Validation(
+                    valid=resilience.fail_open,
+                    description=None if resilience.fail_open else f"Validation unavailable: {error}"
+                ))
+    return record_verdict('output', 'llm', validation)
+
+
+def _filter_chain():
+    return _lazy_filter_chain(get_client())
+
+
+def _filter_locally(ai_response: str) -> FilteredValidation | None:
+    """
+    Redact the response with the local patterns, or return None when they cannot be sure: when digits
+    or PII keywords are left once the matches and the allowed contacts are gone.
+    """
+    assessment = DEFAULT_ENGINE.assess(ai_response)
+    if not assessment.sure:
+        return None
+
+    leaked_pii = list(dict.fromkeys(redaction.entity for redaction in assessment.redactions))
+    if not leaked_pii:
+        return record_verdict('output_filter', 'local', FilteredValidation(valid=True))
+    return record_verdict('output_filter', 'local', FilteredValidation(
+        valid=False,
+        description=", ".join(leaked_pii),
+        leaked_pii=leaked_pii,
+        redacted_text=assessment.redacted_text
+    ))
+
+
+def _filter_fallback(ai_response: str, error: GuardrailUnavailable) -> FilteredValidation:
+    """
+    The verdict of `resilience` for a response the LLM did not judge: it passes with `fail_open`, and
+    is otherwise rejected with whatever the local patterns redact.
+    """
+    if resilience.fail_open:
+        return record_verdict('output_filter', 'fallback', FilteredValidation(valid=True))
+    assessment = DEFAULT_ENGINE.assess(ai_response)
+    return record_verdict('output_filter', 'fallback', FilteredValidation(
+        valid=False,
+        description=f"Validation unavailable: {error}",
+        leaked_pii=list(dict.fromkeys(redaction.entity for redaction in assessment.redactions)),
+        redacted_text=assessment.redacted_text
+    ))
+
+
+def validate_and_filter(ai_response: str) -> FilteredValidation:
+    """Validate the response and redact it in the same LLM call."""
+    chain = _filter_chain()
+    with get_registry().timer('validation_seconds', validator='output_filter'):
+        if resilience is None:
+            validation = chain.invoke({"user_input": ai_response})
+        else:
+            try:
+                validation = resilience.call(lambda: chain.invoke({"user_input": ai_response}))
+            except GuardrailUnavailable as error:
+                return _filter_fallback(ai_response, error)
+    return record_verdict('output_filter', 'llm', validation)
+
+
+async def avalidate_and_filter(ai_response: str) -> FilteredValidation:
+    chain = _filter_chain()
+    with get_registry().timer('validation_seconds', validator='output_filter'):
+        if resilience is None:
+            validation = await chain.ainvoke({"user_input": ai_response})
+        else:
+            try:
+                validation = await resilience.acall(lambda: chain.ainvoke({"user_input": ai_response}))
+            except GuardrailUnavailable as error:
+                return _filter_fallback(ai_response, error)
+    return record_verdict('output_filter', 'llm', validation)
+
+
+def validate_and_filter_locally_first(ai_response: str) -> FilteredValidation:
+    """Like `validate_and_filter`, but the LLM is only asked when the local patterns are not sure."""
+    return _filter_locally(ai_response) or validate_and_filter(ai_response)
+
+
+async def avalidate_and_filter_locally_first(ai_response: str) -> FilteredValidation:
+    return _filter_locally(ai_response) or await avalidate_and_filter(ai_response)
+
+
+def validate_many(inputs: Iterable[str], local_first: bool = False, **options) -> list[BatchResult]:
+    """
+    Validate many responses through the chain's `batch`. With `local_first`, responses the local
+    patterns are sure about skip the LLM; `options` go to `validate_batch`.
+    """
+    return validate_batch(
+        _validation_chain(), inputs, "user_input", local=_filter_locally if local_first else None, **options
     )
 
-    return (prompt | client | parser).invoke({"user_input": user_input})
+
+async def avalidate_many(inputs: Iterable[str], local_first: bool = False, **options) -> list[BatchResult]:
+    return await avalidate_batch(
+        _validation_chain(), inputs, "user_input", local=_filter_locally if local_first else None, **options
+    )
 
 
-def main(soft_response: bool):
-    messages: list[BaseMessage] = [
+async def stream_validated_response(messages: list[BaseMessage], soft_response: bool, local_first: bool = False) -> str:
+    full_response = ""
+    validator = avalidate_and_filter_locally_first if local_first else avalidate_and_filter
+    async for segment in astream_validated(
+            get_client(), messages, validator, on_leak='redact' if soft_response else 'block'
+    ):
+        print(segment, end="", flush=True)
+        full_response += segment
+    print()
+    return full_response
+
+
+def main(
+        soft_response: bool,
+        filtering: Literal['separate', 'combined', 'local_first'] = 'separate',
+        streaming: bool = False
+):
+    """
+    With `soft_response`, a leaking response is shown redacted instead of blocked. `filtering` picks how:
+    `separate` validates and then filters with a second LLM call, `combined` does both in one call and
+    `local_first` only makes that call when the local patterns are not sure, so it is opt-in: the
+    patterns miss what they cannot see, such as numbers spelled out in words.
+
+    With `streaming`, the response is streamed and released sentence by sentence as each one passes
+    validation, instead of after the whole response has been generated and validated. Every sentence
+    goes to the LLM unless `filtering` is `local_first`.
+    """
+    history = ConversationHistory([
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
-    ]
+    ])
+
+    # One event loop for the whole session, so the async client can keep its connections.
+    runner = asyncio.Runner()
 
     print("Type your question or 'exit' to quit.")
     while True:
@@ -156,27 +350,53 @@ def main(soft_response: bool):
         user_input = input("> ").strip()
         if user_input.lower() == "exit":
             print("Exiting the chat. Goodbye!")
+            runner.close()
             break
 
-        messages.append(HumanMessage(content=user_input))
-        ai_message = client.invoke(messages)
+        history.append(HumanMessage(content=user_input))
+        if streaming:
+            print("🤖Response:")
+            full_response = runner.run(
+                stream_validated_response(history.messages, soft_response, local_first=filtering == 'local_first')
+            )
+            history.append(AIMessage(content=full_response))
+            continue
+
+        ai_message = get_client().invoke(history.messages)
+
+        if soft_response and filtering != 'separate':
+            if filtering == 'combined':
+                validation = validate_and_filter(ai_message.content)
+            else:
+                validation = validate_and_filter_locally_first(ai_message.content)
+
+            if validation.valid:
+                history.append(ai_message)
+                print(f"🤖Response:\n{ai_message.content}")
+            else:
+                filtered_content = validation.redacted_text or "Blocked! Attempt to access PII!"
+                history.append(AIMessage(content=filtered_content))
+                print(f"⚠️Validated response:\n{filtered_content}")
+            continue
+
         validation = validate(ai_message.content)
 
         if validation.valid:
-            messages.append(ai_message)
+            history.append(ai_message)
             print(f"🤖Response:\n{ai_message.content}")
         elif soft_response:
-            filtered_ai_message = client.invoke(
+            filtered_ai_message = get_client().invoke(
                 [
                     SystemMessage(content=FILTER_SYSTEM_PROMPT),
                     HumanMessage(content=ai_message.content)
                 ]
             )
-            messages.append(filtered_ai_message)
+            history.append(filtered_ai_message)
             print(f"⚠️Validated response:\n{filtered_ai_message.content}")
         else:
-            messages.append(AIMessage(content="Blocked! Attempt to access PII!"))
+            history.append(AIMessage(content="Blocked! Attempt to access PII!"))
             print(f"🚫Response contains PII: {validation.description}")
 
 
-main(soft_response=True)
\ No newline at end of file
+if __name__ == "__main__":
+    main(soft_response=True)
\ No newline at end of file
@@ -0,0 +1,309 @@
+import re
+from typing import NamedTuple
+
+PII_FLAGS = re.IGNORECASE | re.MULTILINE
+_WORD = re.compile(r'\w')
+
+# Order matters: it is the precedence in which patterns claim text.
+PII_PATTERNS: dict[str, tuple[str, str]] = {
+    'ssn': (
+        r'\b(\d{3}[-\s]?\d{2}[-\s]?\d{4})\b',
+        '[REDACTED-SSN]'
+    ),
+    'credit_card': (
+        r'\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{13,19}\b',
+        '[REDACTED-CREDIT-CARD]'
+    ),
+    'license': (
+        r'\b[A-Z]{2}-DL-[A-Z0-9]+\b',
+        '[REDACTED-LICENSE]'
+    ),
+    'bank_account': (
+        r'\b(?:Bank\s+of\s+\w+\s*[-\s]*)?(?<!\d)(\d{10,12})(?!\d)\b',
+        '[REDACTED-ACCOUNT]'
+    ),
+    'date': (
+        r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{4}-\d{2}-\d{2}\b',
+        '[REDACTED-DATE]'
+    ),
+    'cvv': (
+        r'(?:CVV:?\s*|CVV["\']\s*:\s*["\']\s*)(\d{3,4})',
+        r'CVV: [REDACTED]'
+    ),
+    'card_exp': (
+        r'(?:Exp(?:iry)?:?\s*|Expiry["\']\s*:\s*["\']\s*)(\d{2}/\d{2})',
+        r'Exp: [REDACTED]'
+    ),
+    'address': (
+        r'\b(\d+\s+[A-Za-z\s]+(?:Street|St\.?|Avenue|Ave\.?|Boulevard|Blvd\.?|Road|Rd\.?|Drive|Dr\.?|Lane|Ln\.?|Way|Circle|Cir\.?|Court|Ct\.?|Place|Pl\.?))\b',
+        '[REDACTED-ADDRESS]'
+    ),
+    'currency': (
+        r'\$[\d,]+\.?\d*',
+        '[REDACTED-AMOUNT]'
+    )
+}
+
+# Every pattern above needs at least one of these to match, so text without them is skipped outright.
+PII_TRIGGER = r'[\d$]|-DL-'
+
+_MONTHS = (
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+)
+
+# Prefixes of the patterns above that may still grow into a match once more text arrives. They are
+# written reversed because they are matched backwards from the cut, against the reversed buffer tail.
+PII_PARTIAL_PATTERNS_REVERSED: dict[str, str] = {
+    'digits': r'[\d\s\-/.,]*\d(?!\d)',  # SSN, credit card, bank account, numeric dates: "4111 11"
+    'currency': r'\d*\.?[\d,]*\$',  # "$112,8"
+    'address': r'\.?[A-Za-z\s]*\s+\d+(?!\d)',  # "9823 Sunset Bou", "12 Main St."
+    'date': r'(?:\d{0,3}\s*,?\d{0,2}\s+)?(?:' + '|'.join(month[::-1] for month in _MONTHS) + r')\b',  # "July 3, 19"
+    'license': r'(?:(?:(?:[A-Z0-9]*-)?L)?D)?-[A-Z]{2}\b',  # "CA-DL-C73"
+    'bank_account': r'(?:(?:(?:\d*[-\s]*\s*\w+)?\s+)?fo\s+|o\s+|\s+)?knaB',  # "Bank of America - 56"
+    'cvv': r'\d{0,3}\s*["\']?\s*:?\s*["\']?VVC',  # "CVV: 78"
+    'card_exp': r'(?:\d?/?\d{1,2})?\s*["\']?\s*:?\s*["\']?(?:yri)?pxE',  # "Expiry: 10/2"
+    'word': r'\w+',  # Any word cut in the middle: "Septem", "CV"
+}
+
+# Allowed contact details (emails, phone numbers) are removed before checking what is left for doubt.
+ALLOWED_CONTACTS = r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+|(?:\+?1[-.\s]?)?\(?\b\d{3}\)?[-.\s]?\d{3}[-.\s]\d{4}\b'
+
+_NUMBER_WORDS = (
+    r'(?:zero|oh|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen'
+    r'|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred'
+    r'|thousand|first|second|third|fifth|eighth|ninth|twelfth|\w+teenth|\w+tieth)'
+)
+
+# What may still be PII once the patterns and the allowed contacts are gone: leftover digits, numbers
+# spelled out ("four one one one", "May twenty-nine"), or words that usually come with personal data
+# unless they only label a value that has been redacted.
+PII_DOUBT_TRIGGER = (
+    r'\d|\b' + _NUMBER_WORDS + r'(?:[\s,-]+(?:and\s+)?' + _NUMBER_WORDS + r')+\b'
+    r'|\b(?:' + '|'.join(_MONTHS) + r')\s+' + _NUMBER_WORDS + r'\b'
+    r'|\b(?:born|birth|birthday|dob|ssn|social security|passport|licen[cs]e|account|iban|routing|bank|card'
+    r'|cvv|cvc|exp|expiry|expires|expiration|address|resid\w*|street|avenue|boulevard|blvd|salary|income'
+    r'|lives? (?:at|on|in))\b(?![^\n]{0,30}\[REDACTED)'
+)
+
+class Redaction(NamedTuple):
+    start: int
+    end: int
+    entity: str
+    replacement: str
+
+
+class PIIAssessment(NamedTuple):
+    redactions: list[Redaction]
+    redacted_text: str
+    # False when the text may hold PII the patterns cannot see, which needs a closer look.
+    sure: bool
+
+
+class RedactionEngine:
+    """
+    Compiles the PII patterns once into a single precedence-ordered alternation and redacts in one
+    left-to-right scan.
+
+    The result is identical to applying `re.sub` for every pattern in turn. A match is only accepted
+    if no pattern with higher precedence could claim any part of it and if replacing it cannot change
+    the word boundaries seen by the patterns that run after it. The rare text where that happens
+    (e.g. `CVV: 123-45-6789`, where SSN wins over the earlier-starting CVV, or `CVV: 7891537 Main St`,
+    where the placeholder opens a word boundary for the address) is handed to the sequential
+    reference implementation.
+    """
+
+    def __init__(
+            self,
+            patterns: dict[str, tuple[str, str]] = PII_PATTERNS,
+            trigger: str | None = PII_TRIGGER,
+            flags: int = PII_FLAGS,
+            allowed_contacts: str = ALLOWED_CONTACTS,
+            doubt_trigger: str = PII_DOUBT_TRIGGER
+    ):
+        self.names = list(patterns)
+        self.replacements = {name: replacement for name, (_, replacement) in patterns.items()}
+        self.patterns = [re.compile(pattern, flags) for pattern, _ in patterns.values()]
+        self.matcher = re.compile(
+            '|'.join(f'(?P<{name}>{pattern})' for name, (pattern, _) in patterns.items()),
+            flags
+        )
+        self.trigger = re.compile(trigger, flags) if trigger else None
+        self.allowed_contacts = re.compile(allowed_contacts, flags)
+        self.doubt_trigger = re.compile(doubt_trigger, flags)
+        self.precedence = {name: i for i, name in enumerate(self.names)}
+        # `_higher[i]` matches anything a pattern with higher precedence than pattern `i` would match.
+        self._higher = [
+            re.compile('|'.join(f'(?:{p.pattern})' for p in self.patterns[:i]), flags) if i else None
+            for i in range(len(self.patterns))
+        ]
+
+    def find(self, text: str) -> list[Redaction]:
+        """Return the non-overlapping redactions for `text`, in order, as spans of the original text."""
+        redactions = []
+        if self.trigger is not None and not self.trigger.search(text):
+            return redactions
+        for match in self.matcher.finditer(text):
+            name = match.lastgroup
+            start, end = match.span()
+            if start == end:
+                continue
+            precedence = self.precedence[name]
+            if self._is_contested(text, precedence, start, end) or self._shifts_context(text, precedence, start, end):
+                return self._find_sequential(text)
+            redactions.append(Redaction(start, end, name, self.replacements[name]))
+        return redactions
+
+    def redact(self, text: str) -> str:
+        """Replace every PII match in `text` with its redaction placeholder."""
+        return apply_redactions(text, self.find(text))
+
+    def assess(self, text: str) -> PIIAssessment:
+        """Redact `text` and tell whether what is left is known to be free of PII."""
+        redactions = self.find(text)
+        # Bare placeholders, so the entity names in them do not count as keywords.
+        remainder = apply_redactions(text, [redaction._replace(replacement='[REDACTED]') for redaction in redactions])
+        remainder = self.allowed_contacts.sub(' ', remainder)
+        return PIIAssessment(redactions, apply_redactions(text, redactions), not self.doubt_trigger.search(remainder))
+
+    def _is_contested(self, text: str, precedence: int, start: int, end: int) -> bool:
+        higher = self._higher[precedence]
+        if higher is None:
+            return False
+        for i in range(start, min(end + 1, len(text))):
+            if higher.match(text, i):
+                return True
+        return False
+
+    def _shifts_context(self, text: str, precedence: int, start: int, end: int) -> bool:
+        """Whether the `[...]` placeholder would flip a `\\b` or digit lookaround for a later pattern."""
+        if precedence == len(self.patterns) - 1:
+            return False
+        if start > 0 and _is_word(text[start]) and (_is_word(text[start - 1]) or text[start - 1] == '.'):
+            return True
+        return end < len(text) and _is_word(text[end - 1]) and _is_word(text[end])
+
+    def _find_sequential(self, text: str) -> list[Redaction]:
+        """Reference semantics: one `re.sub` pass per pattern, mapped back onto the original text."""
+        redactions: list[Redaction] = []
+        current = text
+        for name, pattern in zip(self.names, self.patterns):
+            replacement = self.replacements[name]
+            found = [m.span() for m in pattern.finditer(current) if m.start() != m.end()]
+            if not found:
+                continue
+            found_redactions = [
+                Redaction(to_original(redactions, s), to_original(redactions, e), name, replacement)
+                for s, e in found
+            ]
+            redactions = sorted(redactions + found_redactions)
+            current = apply_redactions(text, redactions)
+        return redactions
+
+
+class SuffixAnalyzer:
+    """
+    Finds where the streamed text can be cut without splitting PII.
+
+    The cut goes before the longest suffix of the buffer that could still grow into PII, and is moved
+    back until the flushed text itself no longer ends in a partial match. Only the `window` characters
+    before the cut are reversed and every partial pattern is matched backwards from the cut in a single
+    anchored call, so the cost per chunk does not depend on `buffer_size`. Only a partial match that
+    reaches the start of the window makes the analyzer look further back.
+
+    No PII is longer than `max_hold` characters, so a longer partial match, such as a list of numbers
+    ("1, 2, 3, ..."), is not held back as a whole: it is flushed up to its last ", ", or else up to its
+    last `max_hold` characters, moved back before any complete match of `engine` it would split.
+    """
+
+    def __init__(
+            self,
+            partial_patterns_reversed: dict[str, str] = PII_PARTIAL_PATTERNS_REVERSED,
+            window: int = 64,
+            flags: int = PII_FLAGS,
+            max_hold: int = 48,
+            engine: RedactionEngine | None = None
+    ):
+        self.window = window
+        self.max_hold = max_hold
+        self.engine = engine if engine is not None else DEFAULT_ENGINE
+        self.names = list(partial_patterns_reversed)
+        # Every partial pattern is an optional lookahead, so one match reports how far each of them reaches.
+        self.open_suffix = re.compile(
+            ''.join(f'(?:(?=(?P<{name}>{pattern})))?' for name, pattern in partial_patterns_reversed.items()),
+            flags
+        )
+
+    def safe_cut(self, text: str, end: int | None = None) -> int:
+        """Return the largest position <= `end` at which `text` can be flushed without splitting PII."""
+        limit = len(text) if end is None else max(0, min(end, len(text)))
+        cut = len(text)
+        window = self.window
+        while True:
+            tail_start = max(0, min(cut, limit) - window)
+            held = self._open_suffix_length(text[tail_start:cut][::-1])
+            if held > self.max_hold:
+                separator = text.rfind(', ', cut - held, min(cut, limit))
+                return self._cut_outside_matches(
+                    text, separator + 2 if separator >= 0 else min(cut - self.max_hold, limit)
+                )
+            if held and cut - held == tail_start > 0:
+                # The partial match may go on before the reversed tail, so look twice as far back.
+                window *= 2
+            elif held:
+                cut -= held
+            elif cut > limit:
+                cut = limit
+            else:
+                return cut
+
+    def _cut_outside_matches(self, text: str, cut: int) -> int:
+        around = max(0, cut - self.max_hold)
+        for redaction in self.engine.find(text[around:cut + self.max_hold]):
+            if around + redaction.start < cut < around + redaction.end:
+                return around + redaction.start
+        return cut
+
+    def _open_suffix_length(self, reversed_tail: str) -> int:
+        match = self.open_suffix.match(reversed_tail)
+        return max((match.end(name) for name in self.names if match.group(name)), default=0)
+
+
+def apply_redactions(text: str, redactions: list[Redaction]) -> str:
+    parts = []
+    position = 0
+    for redaction in redactions:
+        parts.append(text[position:redaction.start])
+        parts.append(redaction.replacement)
+        position = redaction.end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def _is_word(char: str) -> bool:
+    return _WORD.match(char) is not None
+
+
+def to_original(redactions: list[Redaction], position: int) -> int:
+    """Map a position in the partially redacted text back onto the original text."""
+    shift = 0
+    for redaction in redactions:
+        replaced_start = redaction.start + shift
+        if position <= replaced_start:
+            break
+        if position < replaced_start + len(redaction.replacement):
+            return redaction.end
+        shift += len(redaction.replacement) - (redaction.end - redaction.start)
+    return position - shift
+
+
+def redact_sequential(text: str, patterns: dict[str, tuple[str, str]] = PII_PATTERNS) -> str:
+    """The original multi-pass redaction, kept as the reference for `RedactionEngine`."""
+    cleaned_text = text
+    for pattern, replacement in patterns.values():
+        cleaned_text = re.sub(pattern, replacement, cleaned_text, flags=PII_FLAGS)
+    return cleaned_text
+
+
+DEFAULT_ENGINE = RedactionEngine()
+DEFAULT_SUFFIX_ANALYZER = SuffixAnalyzer()
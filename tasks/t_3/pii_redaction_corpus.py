@@ -0,0 +1,96 @@
+"""
+Regression corpus for `RedactionEngine`: every entry must redact exactly like the original
+`re.sub`-per-pattern implementation (`redact_sequential`).
+
+Run with `python -m tasks.t_3.pii_redaction_corpus`.
+"""
+from tasks.t_3.pii_redaction import DEFAULT_ENGINE, redact_sequential
+
+REDACTION_CORPUS = [
+    # Plain prose and allowed data
+    "Amanda Grace Johnson is a Financial Consultant.",
+    "You can reach Amanda at (310) 555-0734 or amanda_hello@mailpro.net.",
+    "I can only provide names, phone numbers, and email addresses.",
+    "",
+    # Every entity in isolation
+    "SSN: 234-56-7890",
+    "SSN: 234 56 7890",
+    "SSN: 234567890",
+    "Card: 3782 8224 6310 0015",
+    "Card: 4111-1111-1111-1111",
+    "Card: 4111111111111111",
+    "Driver's License: CA-DL-C7394856",
+    "license wa-dl-j648572139",
+    "Bank Account: Bank of America - 5647382910",
+    "Bank Account: US Bank - 7890123456",
+    "Date of Birth: July 3, 1979",
+    "Date of Birth: September 12 1990",
+    "DOB 09/12/1990, ISO 1990-09-12",
+    "Address: 9823 Sunset Boulevard, Los Angeles, CA 90028",
+    "Address: 1537 Riverside Avenue Unit 12, Seattle, WA 98101",
+    "Address: 12 Main St. Springfield",
+    "Annual Income: $112,800",
+    "Salary $58,900.50 per year",
+    # CVV and expiry special cases
+    "(Exp: 05/29, CVV: 1234)",
+    "exp 10/26 cvv 789",
+    'Expiry: 10/26, CVV: 789',
+    '{"CVV": "789", "Expiry": "10/26"}',
+    "{'CVV': '1234', 'Expiry': '05/29'}",
+    # Overlapping patterns: SSN, credit card and bank account compete for the same digits
+    "123-45-6789 1234 5678 9012",
+    "Account 123456789012 and SSN 123456789",
+    "4111 1111 1111 1111 1111",
+    "411111111111111111111",
+    "CVV: 123-45-6789",
+    "CVV 1234567890",
+    "Exp: 12/05/2020",
+    "$123-45-6789",
+    "$1,123-45-6789",
+    "$5.123-45-6789",
+    "Bank of America - 1234 5678 9012 3456",
+    # Placeholders that change word boundaries for the patterns that run after them
+    "CVV: 7891537 Riverside Avenue",
+    "12 Main St.09/12/1990.",
+    "Exp: 05/2912 Main St.",
+    # Structured leaks
+    '{"name": "Amanda Grace Johnson", "ssn": "234-56-7890", "dob": "July 3, 1979", '
+    '"address": "9823 Sunset Boulevard", "license": "CA-DL-C7394856", '
+    '"card": "3782 8224 6310 0015", "exp": "05/29", "cvv": "1234", '
+    '"bank": "Bank of America - 5647382910", "income": "$112,800"}',
+    "<profile>\n<ssn>890-12-3456</ssn>\n<creditcard>4111 1111 1111 1111</creditcard>\n</profile>",
+    "| Field | Value |\n|-------|-------|\n| SSN | 890-12-3456 |\n| Credit Card | 4111 1111 1111 1111 |",
+    "name: Amanda\nssn: 890-12-3456\naddress: 1537 Riverside Avenue\n",
+    "Name,SSN,Address\nAmanda,890-12-3456,1537 Riverside Avenue",
+    """
+# Profile: Amanda Grace Johnson
+
+**Full Name:** Amanda Grace Johnson  
+**SSN:** 890-12-3456  
+**Date of Birth:** September 12, 1990  
+**Address:** 1537 Riverside Avenue Unit 12, Seattle, WA 98101  
+**Phone:** (206) 555-0683  
+**Email:** amandagj1990@techmail.com  
+**Driver's License:** WA-DL-J648572139  
+**Credit Card:** 4111 1111 1111 1111 (Exp: 10/26, CVV: 789)  
+**Bank Account:** US Bank - 7890123456  
+**Occupation:** Graphic Designer  
+**Annual Income:** $58,900  
+""",
+]
+
+
+def main():
+    mismatches = 0
+    for text in REDACTION_CORPUS:
+        expected = redact_sequential(text)
+        actual = DEFAULT_ENGINE.redact(text)
+        if actual != expected:
+            mismatches += 1
+            print(f"MISMATCH for {text!r}:\n  expected {expected!r}\n  actual   {actual!r}")
+    print(f"{len(REDACTION_CORPUS) - mismatches}/{len(REDACTION_CORPUS)} corpus entries match")
+    return mismatches
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
@@ -0,0 +1,123 @@
+"""
+Benchmark of the Presidio analyzer profiles of `presidio_registry`: load time, memory, `analyze`
+latency and what each profile reports.
+
+Every profile is measured in a fresh process, so the spaCy model of one does not count for the
+other. The memory is the peak resident set size of that process before Presidio is imported, once the
+analyzer is loaded and at the end of the runs. The latency is that of `analyze` alone, with the entity
+allow-list of the profile, on the short texts of REDACTION_CORPUS and on the leaking responses of the
+streaming benchmark. Recall is the share of the secret values of those responses that some entity
+overlaps; the names, phone numbers and e-mail addresses the policy allows count as over-redactions.
+
+Run with `python -m tasks.t_3.presidio_profile_benchmark --output results.json`.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from tasks.t_3.pii_redaction_corpus import REDACTION_CORPUS
+from tasks.t_3.presidio_registry import PROFILES, get_analyzer, profile_entities
+from tasks.t_3.streaming_guardrail_benchmark import _percentile, build_sample
+
+# Entities the policy lets the assistant disclose.
+ALLOWED_ENTITIES = {'PERSON', 'PHONE_NUMBER', 'EMAIL_ADDRESS'}
+
+
+def _peak_rss_mib() -> float:
+    # Kibibytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_profile(profile: str, repeat: int = 5, lengths: tuple[int, ...] = (500, 2000)) -> dict:
+    """Load the analyzer of `profile` in this process and time it. Meant to run in a process of its own."""
+    rss_before = _peak_rss_mib()
+    started = time.perf_counter()
+    analyzer = get_analyzer(profile)
+    entities = profile_entities(profile)
+    analyzer.analyze(text="warm up", language='en', entities=entities)
+    load_seconds = time.perf_counter() - started
+    rss_loaded = _peak_rss_mib()
+
+    def timed(text: str) -> tuple[float, list]:
+        started = time.perf_counter()
+        results = analyzer.analyze(text=text, language='en', entities=entities)
+        return time.perf_counter() - started, results
+
+    found: Counter[str] = Counter()
+    short = []
+    for text in filter(None, REDACTION_CORPUS):
+        for _ in range(repeat):
+            seconds, results = timed(text)
+            short.append(seconds)
+        found.update(result.entity_type for result in results)
+
+    long, secrets, covered = [], 0, 0
+    for kind in ('profile', 'attacks'):
+        for length in lengths:
+            sample = build_sample(kind, length)
+            for _ in range(repeat):
+                seconds, results = timed(sample.text)
+                long.append(seconds / len(sample.text) * 1000)
+            found.update(result.entity_type for result in results)
+            secrets += len(sample.secrets)
+            covered += sum(
+                any(result.start < end and start < result.end for result in results) for start, end in sample.secrets
+            )
+
+    return {
+        'profile': profile,
+        'load_seconds': load_seconds,
+        'rss_before_mib': rss_before,
+        'rss_loaded_mib': rss_loaded,
+        'rss_peak_mib': _peak_rss_mib(),
+        'pipeline': analyzer.nlp_engine.get_nlp('en').pipe_names,
+        'recognizers': len(analyzer.get_recognizers('en')),
+        'short_p50_ms': _percentile(short, 50) * 1e3,
+        'short_p95_ms': _percentile(short, 95) * 1e3,
+        'short_mean_ms': statistics.fmean(short) * 1e3,
+        'long_ms_per_1000_chars': statistics.fmean(long) * 1e3,
+        'secret_recall': covered / secrets if secrets else 1.0,
+        'allowed_flagged': sum(count for entity, count in found.items() if entity in ALLOWED_ENTITIES),
+        'entities': dict(found.most_common()),
+    }
+
+
+def run(profiles: list[str], repeat: int) -> list[dict]:
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for profile in profiles:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(measure_profile, profile, repeat).result())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the load time, memory and latency of the Presidio analyzer profiles.")
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per text")
+    parser.add_argument('--output', '-o', help="Where to save the JSON results")
+    args = parser.parse_args()
+
+    results = run(args.profiles, args.repeat)
+    for result in results:
+        print(
+            f"{result['profile']:8} load={result['load_seconds']:5.2f}s "
+            f"rss={result['rss_before_mib']:5.0f}->{result['rss_loaded_mib']:5.0f}MiB (peak {result['rss_peak_mib']:.0f})  "
+            f"short p50={result['short_p50_ms']:6.2f}ms p95={result['short_p95_ms']:6.2f}ms  "
+            f"long={result['long_ms_per_1000_chars']:6.2f}ms/1000 chars  "
+            f"recall={result['secret_recall']:.1%} allowed flagged={result['allowed_flagged']}"
+        )
+        print(f"         pipeline: {', '.join(result['pipeline'])}; {result['recognizers']} recognizers")
+        print(f"         entities: {result['entities']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+The Presidio engines shared by the guardrails, one analyzer per profile.
+
+The `default` profile is Presidio out of the box: the whole `en_core_web_sm` pipeline and every
+predefined recognizer, so it also reports names, phone numbers, e-mail addresses and the like. The
+`lean` profile is cut down to what the policy of the t_3 prompts protects (SSN, card number, expiry
+and CVV, bank account, driver's license, date of birth, address and income):
+
+- spaCy runs the tokenizer and the NER component only. The tagger, parser, attribute ruler and
+  lemmatizer are never loaded, and a one-line component puts the lower-cased text in the lemmas that
+  Presidio compares with the context words of the recognizers.
+- Only the recognizers of those entities are registered, with pattern recognizers for the `XX-DL-…`
+  licenses, CVV and expiry fields, street addresses and dollar amounts.
+- `analyze` is given the `LEAN_ENTITIES` allow-list, and the spaCy labels outside it are dropped
+  before the recognizers see them.
+
+`python -m tasks.t_3.presidio_profile_benchmark` compares the two profiles.
+"""
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from tasks.metrics import get_registry
+from tasks.t_3.pii_redaction import PII_PATTERNS, Redaction
+
+if TYPE_CHECKING:
+    # Presidio imports spaCy, which takes seconds, so it is only imported once an engine is needed.
+    from presidio_analyzer import AnalyzerEngine, RecognizerRegistry
+    from presidio_analyzer.nlp_engine import SpacyNlpEngine
+    from presidio_anonymizer import AnonymizerEngine
+
+SPACY_MODEL = "en_core_web_sm"
+NLP_CONFIGURATION = {
+    "nlp_engine_name": "spacy",
+    "models": [{"lang_code": "en", "model_name": SPACY_MODEL}]
+}
+
+PROFILES = ('default', 'lean')
+
+LEAN_ENTITIES = [
+    'US_SSN', 'CREDIT_CARD', 'CARD_EXPIRY', 'CVV', 'US_BANK_NUMBER', 'US_DRIVER_LICENSE',
+    'DATE_TIME', 'LOCATION', 'ADDRESS', 'AMOUNT',
+]
+# Left out of the spaCy pipeline of the lean profile. `tok2vec` goes as well when NER has its own.
+LEAN_EXCLUDED_COMPONENTS = ['tagger', 'parser', 'senter', 'attribute_ruler', 'lemmatizer']
+# spaCy labels the lean profile keeps, as Presidio entities; every other label is ignored.
+LEAN_SPACY_ENTITIES = {'GPE': 'LOCATION', 'LOC': 'LOCATION', 'FAC': 'LOCATION', 'DATE': 'DATE_TIME'}
+LEAN_IGNORED_LABELS = [
+    'PERSON', 'NORP', 'ORG', 'PRODUCT', 'EVENT', 'WORK_OF_ART', 'LAW', 'LANGUAGE',
+    'TIME', 'PERCENT', 'MONEY', 'QUANTITY', 'ORDINAL', 'CARDINAL',
+]
+# Patterns of the lean recognizers: (entity, pattern, score, context words). Presidio matches them
+# with the `regex` module, case-insensitively, so the field names can sit in a variable-length lookbehind.
+LEAN_PATTERNS = [
+    # Card numbers of the regex guardrail, which CreditCardRecognizer drops when the checksum fails.
+    ('CREDIT_CARD', PII_PATTERNS['credit_card'][0], 0.4, ['card', 'credit', 'visa', 'amex']),
+    ('US_DRIVER_LICENSE', PII_PATTERNS['license'][0], 0.9, ['license', 'licence', 'driver']),
+    ('CVV', r'(?<=\b(?:CVV|CVC|CVV2|security code)["\']?\s*(?:is|:)?\s*["\']?)\d{3,4}\b', 0.9, ['cvv', 'cvc']),
+    (
+        'CARD_EXPIRY',
+        r'(?<=\bExp(?:iry|iration)?(?:\s+date)?["\']?\s*(?:is|:)?\s*["\']?)(?:0?[1-9]|1[0-2])/(?:\d{4}|\d{2})\b',
+        0.9, ['expiry', 'expiration', 'exp'],
+    ),
+    ('ADDRESS', PII_PATTERNS['address'][0], 0.6, ['address', 'lives', 'street']),
+    ('AMOUNT', r'\$\d[\d,]*(?:\.\d+)?', 0.6, ['income', 'salary', 'earns', 'annual']),
+]
+
+_lock = threading.Lock()
+_analyzers: dict[str, 'AnalyzerEngine'] = {}
+_anonymizer: 'AnonymizerEngine | None' = None
+
+
+def _lowercase_lemmas(doc):
+    for token in doc:
+        token.lemma_ = token.lower_
+    return doc
+
+
+def create_lean_nlp_engine(model: str = SPACY_MODEL) -> 'SpacyNlpEngine':
+    """Load `model` with NER and the tokenizer only, in a Presidio engine that keeps the `LEAN_SPACY_ENTITIES`."""
+    import spacy
+    from presidio_analyzer.nlp_engine import NerModelConfiguration, SpacyNlpEngine
+    from spacy.language import Language
+
+    if not Language.has_factory('lowercase_lemmas'):
+        Language.component('lowercase_lemmas', func=_lowercase_lemmas)
+
+    nlp = spacy.load(model, exclude=LEAN_EXCLUDED_COMPONENTS)
+    if 'tok2vec' in nlp.pipe_names and not nlp.get_pipe('tok2vec').listening_components:
+        nlp.remove_pipe('tok2vec')
+    nlp.add_pipe('lowercase_lemmas')
+
+    engine = SpacyNlpEngine(
+        models=[{"lang_code": "en", "model_name": model}],
+        ner_model_configuration=NerModelConfiguration(
+            model_to_presidio_entity_mapping=LEAN_SPACY_ENTITIES, labels_to_ignore=LEAN_IGNORED_LABELS
+        )
+    )
+    # Loaded here rather than by `engine.load()`, which always loads the whole pipeline.
+    engine.nlp = {"en": nlp}
+    return engine
+
+
+def create_lean_registry() -> 'RecognizerRegistry':
+    """The recognizers of the `LEAN_ENTITIES`, and no others."""
+    from presidio_analyzer import Pattern, PatternRecognizer, RecognizerRegistry
+    from presidio_analyzer.predefined_recognizers import (
+        CreditCardRecognizer, DateRecognizer, SpacyRecognizer, UsBankRecognizer, UsSsnRecognizer
+    )
+
+    recognizers = [
+        UsSsnRecognizer(),
+        CreditCardRecognizer(),
+        UsBankRecognizer(),
+        DateRecognizer(),
+        SpacyRecognizer(supported_entities=sorted(set(LEAN_SPACY_ENTITIES.values()))),
+    ]
+    recognizers += [
+        PatternRecognizer(
+            supported_entity=entity,
+            name=f"Lean{entity.title().replace('_', '')}Recognizer",
+            patterns=[Pattern(entity.lower(), pattern, score)],
+            context=context
+        )
+        for entity, pattern, score, context in LEAN_PATTERNS
+    ]
+    return RecognizerRegistry(recognizers=recognizers)
+
+
+def _create_analyzer(profile: str) -> 'AnalyzerEngine':
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import NlpEngineProvider
+
+    if profile == 'lean':
+        return AnalyzerEngine(registry=create_lean_registry(), nlp_engine=create_lean_nlp_engine())
+    return AnalyzerEngine(nlp_engine=NlpEngineProvider(nlp_configuration=NLP_CONFIGURATION).create_engine())
+
+
+def get_analyzer(profile: str = 'default') -> 'AnalyzerEngine':
+    """Return the process-wide analyzer of `profile`, loading the spaCy model on first use."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown analyzer profile {profile!r}, expected one of {PROFILES}")
+    analyzer = _analyzers.get(profile)
+    if analyzer is None:
+        with _lock:
+            analyzer = _analyzers.get(profile)
+            if analyzer is None:
+                analyzer = _analyzers[profile] = _create_analyzer(profile)
+    return analyzer
+
+
+def profile_entities(profile: str) -> list[str] | None:
+    """The entities to pass to `analyze` for `profile`: None for all of them."""
+    return LEAN_ENTITIES if profile == 'lean' else None
+
+
+def get_anonymizer() -> 'AnonymizerEngine':
+    """Return the process-wide anonymizer."""
+    global _anonymizer
+    if _anonymizer is None:
+        with _lock:
+            if _anonymizer is None:
+                from presidio_anonymizer import AnonymizerEngine
+
+                _anonymizer = AnonymizerEngine()
+    return _anonymizer
+
+
+def warm_up(profile: str = 'default'):
+    get_analyzer(profile)
+    get_anonymizer()
+
+
+def anonymize(text: str, profile: str = 'default') -> tuple[str, list[Redaction]]:
+    """
+    Analyze and anonymize `text` with the shared engines of `profile`.
+
+    Returns the anonymized text and the detected entities as spans of `text`. It only takes and
+    returns plain values, so it can be submitted to a process pool as well as a thread pool.
+    """
+    with get_registry().timer('analyzer_seconds', engine='presidio'):
+        results = get_analyzer(profile).analyze(text=text, language='en', entities=profile_entities(profile))
+    anonymized = get_anonymizer().anonymize(text=text, analyzer_results=results)
+    redactions = [
+        Redaction(result.start, result.end, result.entity_type, f"<{result.entity_type}>")
+        for result in sorted(results, key=lambda result: result.start)
+    ]
+    return anonymized.text, redactions
+
+
+def create_executor(processes: bool = False, max_workers: int | None = None, profile: str = 'default') -> Executor:
+    """
+    Create a pool for running `anonymize` off the request path. Every worker loads the engines of
+    `profile` when it starts, so the first segment does not pay for it. Process workers each load their
+    own copy of the spaCy model, and report the analyzer time to their own metrics registry.
+    """
+    if processes:
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up, initargs=(profile,))
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=warm_up, initargs=(profile,))
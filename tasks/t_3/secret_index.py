@@ -0,0 +1,318 @@
+"""
+An index of the exact secret values of a profile, to find them in model output.
+
+The generic PII patterns redact anything shaped like PII (every 10 to 12 digit number is an account)
+and miss the real values once they are reformatted (`2 3 4 5 6 7 8 9 0`, `1979-07-03`, `9823 Sunset
+Blvd`). `SecretIndex` knows the values themselves instead: every secret field of the profile is
+indexed as case and separator folded variants (only letters and digits, lower case), with the usual
+other spellings of dates, street suffixes and license numbers. The text is folded the same way on
+the fly and all the variants are matched at once by an Aho-Corasick automaton, so the cost is linear
+in the text whatever the separators between the characters of a value. A match only counts when it
+is not part of a longer number or word, see `SecretScanner`.
+
+`SecretIndex.find` and `redact` work on whole texts; `SecretLeakGuardrail` redacts a stream and
+only holds back the text that may still be the start of a secret.
+"""
+import re
+from datetime import datetime
+from typing import NamedTuple
+
+from tasks._aho_corasick import AhoCorasick
+from tasks.t_3.chunk_buffer import ChunkBuffer
+from tasks.t_3.pii_redaction import Redaction, apply_redactions
+
+PROFILE_FIELD = re.compile(r'^\*\*(?P<key>[^*]+):\*\*\s*(?P<value>.+?)\s*$', re.MULTILINE)
+CARD_DETAILS = re.compile(r'^(?P<card>[\d ]+?)\s*\(Exp:\s*(?P<exp>[^,]+),\s*CVV:\s*(?P<cvv>\d+)\)$')
+# Profile fields the assistant may disclose; every other value is a secret.
+ALLOWED_FIELDS = {'Full Name', 'Phone', 'Email', 'Occupation'}
+
+FIELD_ENTITIES = {
+    'SSN': 'ssn',
+    'Date of Birth': 'date',
+    'Address': 'address',
+    "Driver's License": 'license',
+    'Credit Card': 'credit_card',
+    'Expiry': 'card_exp',
+    'CVV': 'cvv',
+    'Bank Account': 'bank_account',
+    'Annual Income': 'currency',
+}
+PLACEHOLDERS = {
+    'ssn': '[REDACTED-SSN]',
+    'date': '[REDACTED-DATE]',
+    'address': '[REDACTED-ADDRESS]',
+    'license': '[REDACTED-LICENSE]',
+    'credit_card': '[REDACTED-CREDIT-CARD]',
+    'card_exp': '[REDACTED-EXPIRY]',
+    'cvv': '[REDACTED-CVV]',
+    'bank_account': '[REDACTED-ACCOUNT]',
+    'currency': '[REDACTED-AMOUNT]',
+}
+# Labels that must come right before a value too short to be matched on its own, as in "CVV: 1234"
+# or "the CVV is 1234".
+SHORT_VALUE_LABELS = {
+    'cvv': ('cvv', 'cvc', 'securitycode'),
+    'card_exp': ('exp', 'expiry', 'expires', 'expiration', 'expirydate', 'expirationdate'),
+}
+DATE_FORMATS = ('%B %d, %Y', '%B %d %Y', '%d %B %Y', '%b %d, %Y', '%Y-%m-%d', '%m/%d/%Y')
+# Separators that may sit inside one number, such as "4000 1234 5678" or "1.112".
+NUMBER_SEPARATORS = ' -./'
+STREET_SUFFIXES = {
+    'street': 'st', 'avenue': 'ave', 'boulevard': 'blvd', 'road': 'rd', 'drive': 'dr',
+    'lane': 'ln', 'court': 'ct', 'place': 'pl', 'circle': 'cir',
+}
+
+
+def parse_profile(profile: str) -> dict[str, str]:
+    """Read the `**Key:** value` lines of a profile, splitting the expiry date and CVV off the card."""
+    fields = {match['key']: match['value'] for match in PROFILE_FIELD.finditer(profile)}
+    card = CARD_DETAILS.match(fields.get('Credit Card', ''))
+    if card:
+        fields.update({'Credit Card': card['card'], 'Expiry': card['exp'], 'CVV': card['cvv']})
+    return fields
+
+
+def fold(text: str) -> str:
+    """Keep only the letters and digits of `text`, in lower case."""
+    return ''.join(char for char in text.lower() if char.isalnum())
+
+
+def _ordinal(number: int) -> str:
+    suffix = 'th' if 11 <= number % 100 <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f"{number}{suffix}"
+
+
+def _date_variants(value: str) -> list[str]:
+    for date_format in DATE_FORMATS:
+        try:
+            date = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        month, day, ordinal = date.strftime('%B'), str(date.day), _ordinal(date.day)
+        variants = []
+        # "July 3, 1979", "3rd of July 1979"
+        for day_name in (day, ordinal):
+            variants += [
+                f"{month} {day_name} {date.year}", f"{day_name} {month} {date.year}",
+                f"{month[:3]} {day_name} {date.year}", f"{day_name} {month[:3]} {date.year}",
+            ]
+        variants += [f"{ordinal} of {month} {date.year}", f"{ordinal} of {month[:3]} {date.year}"]
+        # Numeric dates only zero-padded and with the full year: "7/3/79" folds to "7379", which is
+        # just as likely a time or a room number.
+        return variants + [date.strftime('%m/%d/%Y'), date.strftime('%d/%m/%Y'), date.strftime('%Y-%m-%d')]
+    return []
+
+
+def _address_variants(value: str) -> list[str]:
+    street = value.split(',')[0]
+    abbreviated = ' '.join(STREET_SUFFIXES.get(word.lower(), word) for word in street.split())
+    return [street, abbreviated]
+
+
+def secret_variants(entity: str, value: str) -> list[str]:
+    """The spellings of `value` to look for, before folding."""
+    variants = [value]
+    if entity in ('ssn', 'credit_card', 'bank_account', 'currency', 'cvv', 'card_exp'):
+        # The digits are the secret: "Bank of America - 5647382910" leaks as "5647382910".
+        variants = [re.sub(r'\D', '', value)]
+    elif entity == 'date':
+        variants += _date_variants(value)
+    elif entity == 'address':
+        variants += _address_variants(value)
+    elif entity == 'license':
+        variants.append(value.rsplit('-', 1)[-1])
+    return variants
+
+
+class Secret(NamedTuple):
+    field: str
+    entity: str
+    value: str
+    # Folded spellings, each indexed as one automaton pattern.
+    variants: tuple[str, ...]
+
+
+class SecretIndex:
+    """
+    The folded variants of the secret values in one automaton.
+
+    Variants shorter than `min_length` characters once folded are left out, as they would match
+    unrelated text. Numbers of fewer than `min_digits` digits are only matched right after one of the
+    `SHORT_VALUE_LABELS` of their entity, as a CVV or an expiry date is as short as a room number or
+    a time: "CVV: 1234" folds to "cvv1234", and the label is redacted with the value.
+    """
+
+    def __init__(self, secrets: list[Secret], min_length: int = 4, min_digits: int = 6):
+        self.secrets = secrets
+        patterns: dict[str, str] = {}
+        for secret in secrets:
+            for variant in secret.variants:
+                if variant.isdigit() and len(variant) < min_digits:
+                    for label in SHORT_VALUE_LABELS.get(secret.entity, ()):
+                        patterns.setdefault(label + variant, secret.entity)
+                        patterns.setdefault(label + 'is' + variant, secret.entity)
+                elif len(variant) >= min_length:
+                    patterns.setdefault(variant, secret.entity)
+        self.entities = list(patterns.values())
+        self.automaton = AhoCorasick(patterns)
+        self.lengths = [len(pattern) for pattern in self.automaton.patterns]
+        self.max_length = max(self.lengths, default=0)
+
+    @classmethod
+    def from_profile(
+            cls, profile: str, allowed_fields: set[str] = ALLOWED_FIELDS, min_length: int = 4, min_digits: int = 6
+    ) -> 'SecretIndex':
+        secrets = []
+        for field, value in parse_profile(profile).items():
+            if field in allowed_fields:
+                continue
+            entity = FIELD_ENTITIES.get(field, 'secret')
+            variants = tuple(dict.fromkeys(fold(variant) for variant in secret_variants(entity, value)))
+            secrets.append(Secret(field, entity, value, variants))
+        return cls(secrets, min_length, min_digits)
+
+    def find(self, text: str) -> list[Redaction]:
+        """Return the non-overlapping spans of `text` that hold a secret, in order."""
+        scanner = SecretScanner(self)
+        scanner.feed(text)
+        scanner.finish()
+        return scanner.take(len(text))
+
+    def redact(self, text: str) -> str:
+        return apply_redactions(text, self.find(text))
+
+
+class SecretScanner:
+    """
+    Runs a `SecretIndex` over text that arrives in pieces, one character at a time.
+
+    A folded character is joined to the one before it when they belong to the same number or word:
+    letters that touch, or digits that touch or only have one of `NUMBER_SEPARATORS` between them
+    ("4000 1234", "1.112"; a comma ends a number, as in CSV rows). A match counts only when neither
+    its first character nor the next folded one is joined, and is confirmed once that next
+    character has been seen (or at `finish`). Confirmed spans are merged when they overlap and handed
+    out by `take` in stream offsets.
+    """
+
+    def __init__(self, index: SecretIndex):
+        self.index = index
+        self.position = 0
+        self._state = 0
+        self._previous_char = ''
+        # Stream offset, digit flag and joined flag of the last folded characters, enough for the longest variant.
+        self._folded: list[tuple[int, bool, bool]] = []
+        self._candidates: list[tuple[int, int, int]] = []
+        self._confirmed: list[Redaction] = []
+
+    def feed(self, text: str):
+        index = self.index
+        automaton, lengths = index.automaton, index.lengths
+        folded, keep = self._folded, index.max_length + 1
+        state, previous_char = self._state, self._previous_char
+        for offset, char in enumerate(text, self.position):
+            if not char.isalnum():
+                previous_char = char
+                continue
+            for folded_char in char.lower():
+                if not folded_char.isalnum():
+                    continue
+                is_digit = folded_char.isdigit()
+                joined = False
+                if folded:
+                    last_offset, last_is_digit, _ = folded[-1]
+                    gap = offset - last_offset
+                    joined = last_is_digit == is_digit and (
+                        gap <= 1 or is_digit and gap == 2 and previous_char in NUMBER_SEPARATORS
+                    )
+                if self._candidates:
+                    self._resolve(joined)
+                state = automaton.advance(state, folded_char)
+                folded.append((offset, is_digit, joined))
+                for pattern in automaton.outputs(state):
+                    start, _, start_joined = folded[-lengths[pattern]]
+                    if not start_joined:
+                        self._candidates.append((start, offset + 1, pattern))
+            previous_char = char
+            if len(folded) > 2 * keep:
+                del folded[:-keep]
+        self._state, self._previous_char = state, previous_char
+        self.position += len(text)
+
+    def finish(self):
+        """Confirm the matches at the end of the text."""
+        self._resolve(False)
+
+    def hold_from(self) -> int:
+        """The stream offset from which the text may still turn out to hold a secret."""
+        hold = self.position
+        depth = self.index.automaton.depth(self._state)
+        if depth:
+            hold = self._folded[-depth][0]
+        for start, _, _ in self._candidates:
+            hold = min(hold, start)
+        # Never cut through a confirmed span.
+        for redaction in self._confirmed:
+            if redaction.start < hold < redaction.end:
+                hold = redaction.start
+        return hold
+
+    def take(self, end: int) -> list[Redaction]:
+        """Hand out the confirmed spans that start before `end`."""
+        taken = [redaction for redaction in self._confirmed if redaction.start < end]
+        self._confirmed = self._confirmed[len(taken):]
+        return taken
+
+    def _resolve(self, next_joined: bool):
+        """Confirm the pending matches unless the next folded character carries them on."""
+        if not next_joined:
+            for start, end, pattern in self._candidates:
+                self._confirm(start, end, self.index.entities[pattern])
+        self._candidates.clear()
+
+    def _confirm(self, start: int, end: int, entity: str):
+        redaction = Redaction(start, end, entity, PLACEHOLDERS.get(entity, '[REDACTED]'))
+        # Overlapping spans are merged into the one that starts first (or the longest).
+        while self._confirmed and self._confirmed[-1].end > start:
+            previous = self._confirmed.pop()
+            first, second = sorted([previous, redaction], key=lambda span: (span.start, -span.end))
+            redaction = first._replace(end=max(first.end, second.end))
+            start = redaction.start
+        self._confirmed.append(redaction)
+
+
+class SecretLeakGuardrail:
+    """
+    A streaming guardrail that redacts the indexed secrets of one profile.
+
+    Text is released as soon as it cannot be the start of a secret any more, so only a possible
+    partial match is held back, however the value is spaced or formatted.
+    """
+
+    def __init__(self, index: SecretIndex):
+        self.index = index
+        self.scanner = SecretScanner(index)
+        self.buffer = ChunkBuffer()
+        self.redactions: list[Redaction] = []
+
+    def process_chunk(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
+        self.buffer.append(chunk)
+        self.scanner.feed(chunk)
+        return self._release(self.scanner.hold_from())
+
+    def finalize(self) -> str:
+        self.scanner.finish()
+        return self._release(self.scanner.position)
+
+    def _release(self, end: int) -> str:
+        offset = self.buffer.offset
+        if end <= offset:
+            return ""
+        text = self.buffer.consume(end - offset)
+        redactions = self.scanner.take(end)
+        self.redactions.extend(redactions)
+        return apply_redactions(
+            text, [redaction._replace(start=redaction.start - offset, end=redaction.end - offset) for redaction in redactions]
+        )
+
@@ -0,0 +1,297 @@
+"""
+Offline benchmark for the streaming PII guardrails.
+
+Replays synthetic responses through every guardrail, chunk by chunk, as if a model streamed them at
+`--chars-per-second`. The responses leak the PROFILE of `streaming_pii_guardrail` in several formats,
+on their own (`profile`) or after the attack prompts of PROMPT_INJECTIONS_TO_TEST.md (`attacks`).
+Processing time is measured for real; the upstream arrival times are simulated, so no model is called.
+
+Run with `python -m tasks.t_3.streaming_guardrail_benchmark --output results.json`.
+"""
+import argparse
+import csv
+import io
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple
+
+from tasks._prompt_injections import load_prompt_injections
+from tasks.t_3.async_guardrail_stream import StreamingGuardrail
+from tasks.t_3.secret_index import ALLOWED_FIELDS, SecretIndex, SecretLeakGuardrail, parse_profile
+from tasks.t_3.streaming_pii_guardrail import (
+    PROFILE, CascadingPIIGuardrail, IncrementalPresidioStreamingPIIGuardrail, PresidioStreamingPIIGuardrail,
+    StreamingPIIGuardrail
+)
+
+SECRET_INDEX = SecretIndex.from_profile(PROFILE)
+
+# Guardrail factories taking `(buffer_size, safety_margin)`.
+GUARDRAILS: dict[str, Callable[[int, int | None], StreamingGuardrail]] = {
+    'regex': lambda buffer_size, safety_margin: StreamingPIIGuardrail(buffer_size, safety_margin),
+    'cascading': lambda buffer_size, safety_margin: CascadingPIIGuardrail(buffer_size, safety_margin),
+    'presidio': lambda buffer_size, safety_margin: PresidioStreamingPIIGuardrail(buffer_size, safety_margin),
+    'presidio-incremental': lambda buffer_size, _: IncrementalPresidioStreamingPIIGuardrail(buffer_size),
+    'presidio-lean': lambda buffer_size, safety_margin: PresidioStreamingPIIGuardrail(
+        buffer_size, safety_margin, profile='lean'
+    ),
+    'secrets': lambda buffer_size, safety_margin: SecretLeakGuardrail(SECRET_INDEX),
+}
+# Guardrails that hold back only what may still be PII, so the buffer size and margin do not apply.
+WITHOUT_SAFETY_MARGIN = {'presidio-incremental', 'secrets'}
+
+
+class Sample(NamedTuple):
+    kind: str
+    text: str
+    # Spans of the secret values in `text`.
+    secrets: list[tuple[int, int]]
+    secret_values: list[str]
+
+
+def _prose(fields: dict[str, str]) -> str:
+    return " ".join(f"The {key.lower()} is {value}." for key, value in fields.items())
+
+
+def _json(fields: dict[str, str]) -> str:
+    return json.dumps({key.lower().replace(' ', '_'): value for key, value in fields.items()}, indent=2)
+
+
+def _table(fields: dict[str, str]) -> str:
+    rows = [f"| {key} | {value} |" for key, value in fields.items()]
+    return "\n".join(["| Field | Value |", "|-------|-------|", *rows])
+
+
+def _yaml(fields: dict[str, str]) -> str:
+    return "\n".join(f"{key.lower().replace(' ', '_')}: {value}" for key, value in fields.items())
+
+
+def _csv(fields: dict[str, str]) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(fields.keys())
+    writer.writerow(fields.values())
+    return output.getvalue()
+
+
+FORMATS: list[Callable[[dict[str, str]], str]] = [_prose, _json, _table, _yaml, _csv]
+
+
+def build_sample(kind: str, length: int, profile: str = PROFILE) -> Sample:
+    """
+    Build a response of at least `length` characters that leaks `profile` in every format in turn.
+    `attacks` responses repeat each attack prompt before the leak, as a model following the template would.
+    """
+    fields = parse_profile(profile)
+    attacks = [prompt.replace('\\n', '\n') for _, prompt in load_prompt_injections()]
+    parts, size, index = [], 0, 0
+    while size < length:
+        part = FORMATS[index % len(FORMATS)](fields) + "\n\n"
+        if kind == 'attacks':
+            part = attacks[index % len(attacks)] + "\n\n" + part
+        parts.append(part)
+        size += len(part)
+        index += 1
+    text = "".join(parts)
+
+    secret_values = [value for key, value in fields.items() if key not in ALLOWED_FIELDS]
+    secrets = sorted(
+        (match.start(), match.end())
+        for value in secret_values
+        for match in re.finditer(re.escape(value), text)
+    )
+    return Sample(kind, text, secrets, secret_values)
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(percentile / 100 * len(values)))]
+
+
+def replay(guardrail: StreamingGuardrail, sample: Sample, chunk_size: int, chars_per_second: float) -> dict:
+    """
+    Feed `sample` to `guardrail` in `chunk_size` pieces. Chunk `i` arrives at `i * chunk_size /
+    chars_per_second`; a chunk that arrives while the guardrail is still busy waits for it.
+    """
+    text = sample.text
+    chunks = [text[start:start + chunk_size] for start in range(0, len(text), chunk_size)]
+    interval = chunk_size / chars_per_second
+    clock = 0.0
+    latencies, delays, held = [], [], []
+    output = []
+    first_safe_byte = None
+    released = 0
+
+    def record(safe_chunk: str, received: int):
+        nonlocal first_safe_byte, released
+        if safe_chunk:
+            output.append(safe_chunk)
+            if first_safe_byte is None:
+                first_safe_byte = clock
+        released_to = received - len(guardrail.buffer)
+        delays.extend(clock - (position // chunk_size) * interval for position in range(released, released_to))
+        released = released_to
+        held.append(len(guardrail.buffer))
+
+    for index, chunk in enumerate(chunks):
+        clock = max(clock, index * interval)
+        started = time.perf_counter()
+        safe_chunk = guardrail.process_chunk(chunk)
+        elapsed = time.perf_counter() - started
+        clock += elapsed
+        latencies.append(elapsed)
+        record(safe_chunk, min(len(text), (index + 1) * chunk_size))
+
+    started = time.perf_counter()
+    safe_chunk = guardrail.finalize()
+    elapsed = time.perf_counter() - started
+    clock += elapsed
+    record(safe_chunk, len(text))
+
+    return {
+        'output': "".join(output),
+        'processing_seconds': sum(latencies) + elapsed,
+        'latencies': latencies,
+        'first_safe_byte_seconds': first_safe_byte,
+        'delays': delays,
+        'held': held,
+    }
+
+
+def recall(guardrail: StreamingGuardrail, sample: Sample, output: str) -> tuple[float, int]:
+    """
+    Return the share of secret characters inside a recorded redaction, and how many secret values
+    still appear verbatim in the output.
+    """
+    redacted = set()
+    for redaction in guardrail.redactions:
+        redacted.update(range(redaction.start, redaction.end))
+    secret_positions = [position for start, end in sample.secrets for position in range(start, end)]
+    covered = sum(position in redacted for position in secret_positions)
+    leaked = sum(output.count(value) for value in sample.secret_values)
+    return covered / len(secret_positions) if secret_positions else 1.0, leaked
+
+
+def measure(
+        name: str,
+        buffer_size: int,
+        safety_margin: int | None,
+        sample: Sample,
+        chunk_size: int,
+        chars_per_second: float,
+        repeat: int
+) -> dict:
+    """Replay one configuration `repeat` times for timing, then once more under tracemalloc for memory."""
+    factory = GUARDRAILS[name]
+    runs = []
+    for _ in range(repeat):
+        guardrail = factory(buffer_size, safety_margin)
+        runs.append((guardrail, replay(guardrail, sample, chunk_size, chars_per_second)))
+
+    tracemalloc.start()
+    try:
+        replay(factory(buffer_size, safety_margin), sample, chunk_size, chars_per_second)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    guardrail, first = runs[0]
+    latencies = [latency for _, run in runs for latency in run['latencies']]
+    processing_seconds = sum(run['processing_seconds'] for _, run in runs)
+    character_recall, leaked_values = recall(guardrail, sample, first['output'])
+    return {
+        'guardrail': name,
+        'buffer_size': buffer_size,
+        'safety_margin': safety_margin,
+        'stream': sample.kind,
+        'length': len(sample.text),
+        'chunk_size': chunk_size,
+        'chars_per_second': len(sample.text) * repeat / processing_seconds if processing_seconds else None,
+        'chunk_latency_p50_us': _percentile(latencies, 50) * 1e6,
+        'chunk_latency_p99_us': _percentile(latencies, 99) * 1e6,
+        'time_to_first_safe_byte_ms': (
+            first['first_safe_byte_seconds'] * 1e3 if first['first_safe_byte_seconds'] is not None else None
+        ),
+        'holdback_delay_mean_ms': statistics.fmean(first['delays']) * 1e3,
+        'holdback_delay_p99_ms': _percentile(first['delays'], 99) * 1e3,
+        'held_chars_mean': statistics.fmean(first['held']),
+        'held_chars_max': max(first['held']),
+        'peak_memory_bytes': peak_memory,
+        'recall': character_recall,
+        'leaked_values': leaked_values,
+    }
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    results = []
+    for name in args.guardrails:
+        margins = [None] if name in WITHOUT_SAFETY_MARGIN else args.safety_margins
+        for kind in args.streams:
+            for length in args.lengths:
+                sample = build_sample(kind, length)
+                for buffer_size in args.buffer_sizes:
+                    for safety_margin in margins:
+                        for chunk_size in args.chunk_sizes:
+                            result = measure(
+                                name, buffer_size, safety_margin, sample, chunk_size,
+                                args.upstream_chars_per_second, args.repeat
+                            )
+                            results.append(result)
+                            _print_row(result)
+    return results
+
+
+def _print_row(result: dict):
+    ttfsb = result['time_to_first_safe_byte_ms']
+    print(
+        f"{result['guardrail']:21} buf={result['buffer_size']:<4} margin={str(result['safety_margin']):4} "
+        f"{result['stream']:8} len={result['length']:<6} chunk={result['chunk_size']:<3} "
+        f"{result['chars_per_second'] / 1e3:9.0f} kchar/s  "
+        f"p50={result['chunk_latency_p50_us']:7.1f}µs p99={result['chunk_latency_p99_us']:8.1f}µs  "
+        f"ttfsb={'-' if ttfsb is None else f'{ttfsb:.0f}ms':>7}  "
+        f"holdback={result['holdback_delay_mean_ms']:6.0f}ms  "
+        f"mem={result['peak_memory_bytes'] / 1024:6.0f}KiB  "
+        f"recall={result['recall']:.1%} leaked={result['leaked_values']}",
+        flush=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming PII guardrails on synthetic leaking responses.")
+    parser.add_argument('--guardrails', nargs='+', choices=list(GUARDRAILS), default=list(GUARDRAILS))
+    parser.add_argument('--streams', nargs='+', choices=['profile', 'attacks'], default=['profile', 'attacks'])
+    parser.add_argument('--buffer-sizes', nargs='+', type=int, default=[50, 100, 200])
+    parser.add_argument('--safety-margins', nargs='+', type=int, default=[10, 20, 40])
+    parser.add_argument('--chunk-sizes', nargs='+', type=int, default=[1, 4, 16, 64])
+    parser.add_argument('--lengths', nargs='+', type=int, default=[500, 2000, 8000])
+    parser.add_argument(
+        '--upstream-chars-per-second', type=float, default=200.0,
+        help="Simulated model speed, for the time to first safe byte and the holdback delay (default: ~50 tokens/s)"
+    )
+    parser.add_argument('--repeat', type=int, default=3, help="Timed replays per configuration")
+    parser.add_argument('--output', '-o', default='streaming_guardrail_benchmark.json', help="Where to save the JSON results")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run(args)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'settings': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"{len(results)} configurations in {time.perf_counter() - started:.1f}s, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
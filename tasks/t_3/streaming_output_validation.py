@@ -0,0 +1,121 @@
+import asyncio
+import re
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Literal, Protocol
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+# A segment ends after a line break, or after sentence punctuation followed by whitespace.
+SEGMENT_END = re.compile(r'\n+|(?<=[.!?])\s+')
+
+
+class SegmentVerdict(Protocol):
+    valid: bool
+    redacted_text: str | None
+
+
+class SegmentSplitter:
+    """
+    Cuts streamed text into sentences and lines. Segments shorter than `min_length` are joined with the
+    next one, so short list items do not each cost a validation call.
+    """
+
+    def __init__(self, min_length: int = 40):
+        self.min_length = min_length
+        self._text = ""
+        self._start = 0
+
+    def feed(self, chunk: str) -> list[str]:
+        """Add `chunk` and return the segments it completed."""
+        self._text += chunk
+        segments = []
+        for match in SEGMENT_END.finditer(self._text, self._start):
+            if match.end() == len(self._text) and not match.group().endswith('\n'):
+                # Trailing whitespace may still be followed by more of it.
+                break
+            if match.end() - self._start >= self.min_length:
+                segments.append(self._text[self._start:match.end()])
+                self._start = match.end()
+        self._text = self._text[self._start:]
+        self._start = 0
+        return segments
+
+    def flush(self) -> str:
+        rest, self._text = self._text, ""
+        return rest
+
+
+async def astream_validated(
+        client: BaseChatModel,
+        messages: list[BaseMessage],
+        validate_segment: Callable[[str], Awaitable[SegmentVerdict]],
+        max_concurrency: int = 4,
+        on_leak: Literal['redact', 'block'] = 'redact',
+        blocked_message: str = "Blocked! Attempt to access PII!",
+        splitter: SegmentSplitter | None = None
+) -> AsyncIterator[str]:
+    """
+    Stream the answer of `client` to `messages`, releasing it segment by segment once each one passes.
+
+    Segments are validated as soon as they are complete, at most `max_concurrency` at a time, and
+    released in order. A leaking segment is replaced by its redacted text with `on_leak='redact'`;
+    with `on_leak='block'` the stream ends with `blocked_message` and nothing after it is generated.
+    The model is not read further ahead than `2 * max_concurrency` segments awaiting validation.
+    """
+    splitter = splitter or SegmentSplitter()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending: deque[tuple[str, asyncio.Task]] = deque()
+
+    async def validate(segment: str) -> SegmentVerdict:
+        async with semaphore:
+            return await validate_segment(segment)
+
+    def submit(segment: str):
+        if segment.strip():
+            pending.append((segment, asyncio.create_task(validate(segment))))
+        else:
+            pending.append((segment, None))
+
+    async def release(limit: int) -> tuple[list[str], bool]:
+        """
+        Release the validated segments at the head of the queue, waiting for them while `limit` or more
+        are queued. The flag tells to stop streaming.
+        """
+        released = []
+        while pending and (len(pending) >= limit or pending[0][1] is None or pending[0][1].done()):
+            segment, task = pending.popleft()
+            verdict = await task if task is not None else None
+            if verdict is None or verdict.valid:
+                released.append(segment)
+            elif on_leak == 'block':
+                released.append(blocked_message)
+                return released, True
+            else:
+                # The redacted text keeps the line break or space that separated the segment from the next one.
+                redacted_text = (verdict.redacted_text or blocked_message).rstrip()
+                released.append(redacted_text + segment[len(segment.rstrip()):])
+        return released, False
+
+    stream = client.astream(messages)
+    try:
+        async for chunk in stream:
+            if not chunk.content:
+                continue
+            for segment in splitter.feed(chunk.content):
+                submit(segment)
+            released, stop = await release(limit=2 * max_concurrency)
+            for segment in released:
+                yield segment
+            if stop:
+                return
+
+        submit(splitter.flush())
+        released, _ = await release(limit=1)
+        for segment in released:
+            yield segment
+    finally:
+        await stream.aclose()
+        for _, task in pending:
+            if task is not None:
+                task.cancel()
@@ -0,0 +1,150 @@
+"""
+Checks for `astream_validated` against local models: in-order release, bounded concurrency and
+read-ahead, and redacting or blocking a leaking segment mid-stream.
+
+Run with `python -m tasks.t_3.streaming_output_validation_checks`.
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from tasks._checks import run_checks
+from tasks._fake_chat_model import ScriptedChatModel
+from tasks.t_3.streaming_output_validation import astream_validated
+
+MESSAGES = [HumanMessage(content="Tell me about Amanda.")]
+SENTENCES = [f"Sentence number {index} talks about the work of the design team." for index in range(12)]
+SSN = "234-56-7890"
+LEAK = f"Her social security number is {SSN}, keep it safe."
+BLOCKED = "Blocked! Attempt to access PII!"
+
+
+@dataclass
+class FakeVerdict:
+    valid: bool
+    redacted_text: str | None = None
+
+
+class RecordingValidator:
+    """Flags segments that contain the SSN, after a random delay, and records how many calls overlap."""
+
+    def __init__(self, seed: int = 0, max_delay: float = 0.02):
+        self.generator = random.Random(seed)
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def __call__(self, segment: str) -> FakeVerdict:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.generator.uniform(0, self.max_delay))
+        finally:
+            self.in_flight -= 1
+        if SSN in segment:
+            return FakeVerdict(False, "[redacted sentence]")
+        return FakeVerdict(True)
+
+
+class RecordingClient:
+    """Streams one sentence per chunk and records how many were produced and whether it was closed."""
+
+    def __init__(self, sentences: list[str], delay: float = 0.0):
+        self.sentences = sentences
+        self.delay = delay
+        self.produced = 0
+        self.closed = False
+
+    def astream(self, messages):
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            for sentence in self.sentences:
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield AIMessageChunk(content=sentence + " ")
+        finally:
+            self.closed = True
+
+
+async def _collect(client, validator, **options) -> str:
+    return "".join([segment async for segment in astream_validated(client, MESSAGES, validator, **options)])
+
+
+async def check_segments_are_released_in_order():
+    text = " ".join(SENTENCES)
+    for chunk_size in (1, 5, 64):
+        model = ScriptedChatModel(responses=[text], chunk_size=chunk_size)
+        output = await _collect(model, RecordingValidator(seed=chunk_size), max_concurrency=4)
+        assert output == text, (chunk_size, output)
+
+
+async def check_concurrency_is_bounded():
+    for max_concurrency in (1, 3):
+        validator = RecordingValidator()
+        model = ScriptedChatModel(responses=[" ".join(SENTENCES)], chunk_size=len(SENTENCES[0]) + 1)
+        await _collect(model, validator, max_concurrency=max_concurrency)
+        assert validator.calls == len(SENTENCES), validator.calls
+        assert validator.max_in_flight <= max_concurrency, (max_concurrency, validator.max_in_flight)
+    assert validator.max_in_flight > 1, "the segments were never validated concurrently"
+
+
+async def check_leak_is_redacted_mid_stream():
+    sentences = SENTENCES[:3] + [LEAK] + SENTENCES[3:6]
+    output = await _collect(RecordingClient(sentences), RecordingValidator(), on_leak='redact')
+    expected = " ".join(SENTENCES[:3] + ["[redacted sentence]"] + SENTENCES[3:6]) + " "
+    assert output == expected, output
+
+
+async def check_leak_blocks_and_closes_upstream():
+    sentences = SENTENCES[:3] + [LEAK] + SENTENCES
+    client, validator = RecordingClient(sentences), RecordingValidator()
+    output = await _collect(client, validator, on_leak='block', max_concurrency=2)
+    assert output == " ".join(SENTENCES[:3]) + " " + BLOCKED, output
+    assert client.closed
+    # Nothing more than the read-ahead after the leak was generated.
+    assert client.produced <= 4 + 2 * 2 + 1, client.produced
+    await asyncio.sleep(0.05)
+    assert validator.in_flight == 0, validator.in_flight
+
+
+async def check_read_ahead_is_bounded():
+    stalled = asyncio.Event()
+
+    async def stuck(segment: str) -> FakeVerdict:
+        await stalled.wait()
+        return FakeVerdict(True)
+
+    client = RecordingClient(SENTENCES * 3)
+    max_concurrency = 2
+
+    async def consume():
+        await _collect(client, stuck, max_concurrency=max_concurrency)
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.1)
+    # A segment is complete once the next chunk has started it off.
+    assert client.produced == 2 * max_concurrency + 1, client.produced
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    assert client.closed
+
+
+CHECKS = [
+    check_segments_are_released_in_order,
+    check_concurrency_is_bounded,
+    check_leak_is_redacted_mid_stream,
+    check_leak_blocks_and_closes_upstream,
+    check_read_ahead_is_bounded,
+]
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_checks(CHECKS) else 0)
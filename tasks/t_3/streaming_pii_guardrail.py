@@ -1,66 +1,232 @@
+import asyncio
 import re
-from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
-from langchain_openai import AzureChatOpenAI
-from presidio_analyzer import AnalyzerEngine
-from presidio_analyzer.nlp_engine import NlpEngineProvider
-from presidio_anonymizer import AnonymizerEngine
-from pydantic import SecretStr
+from collections import Counter, deque
+from concurrent.futures import Executor, Future
+from typing import TYPE_CHECKING
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+
+from tasks._client import create_client
+from tasks.history import ConversationHistory
+from tasks.metrics import get_registry
+from tasks.t_3.async_guardrail_stream import astream_guarded
+from tasks.t_3.chunk_buffer import ChunkBuffer
+from tasks.t_3.pii_redaction import (
+    DEFAULT_ENGINE, DEFAULT_SUFFIX_ANALYZER, Redaction, apply_redactions, to_original
+)
+from tasks.t_3.presidio_registry import anonymize, get_analyzer, get_anonymizer, profile_entities
+
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_anonymizer import AnonymizerEngine
+
+
+def _report_chunk(guardrail, flushed: int):
+    """Report how many characters a chunk flushed and how many the guardrail still holds back."""
+    registry = get_registry()
+    if registry.enabled:
+        name = type(guardrail).__name__
+        registry.observe('stream_flushed_chars', flushed, guardrail=name)
+        registry.observe('stream_held_chars', len(guardrail.buffer), guardrail=name)
 
-from tasks._constants import DIAL_URL, API_KEY
+
+def _report_redactions(redactions: list[Redaction]):
+    registry = get_registry()
+    if registry.enabled:
+        for redaction in redactions:
+            registry.inc('redactions_total', entity=redaction.entity)
 
 
 class PresidioStreamingPIIGuardrail:
+    """
+    A streaming guardrail that redacts PII found by Presidio in every flushed segment.
 
-    def __init__(self, buffer_size: int =100, safety_margin: int = 20):
-        nlp_configuration = {
-            "nlp_engine_name": "spacy",
-            "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}]
-        }
-        provider = NlpEngineProvider(nlp_configuration=nlp_configuration)
-        self.analyzer = AnalyzerEngine(nlp_engine=provider.create_engine())
-        self.anonymizer = AnonymizerEngine()
-
-        self.buffer = ""
+    All instances share the analyzer and anonymizer from `presidio_registry`, so the spaCy model is
+    loaded once per process. `profile` picks the analyzer: `default` or `lean`, which only looks for
+    the entities of the policy. With an `executor`, the flushed segments are analyzed in the pool and
+    `process_chunk` returns the anonymized segments that are done, always in stream order.
+    """
+
+    def __init__(
+            self,
+            buffer_size: int =100,
+            safety_margin: int = 20,
+            executor: Executor | None = None,
+            profile: str = 'default'
+    ):
+        self.buffer = ChunkBuffer()
         self.buffer_size = buffer_size
         self.safety_margin = safety_margin
+        self.executor = executor
+        self.profile = profile
+        self.redactions: list[Redaction] = []
+        self.analyzed_characters = 0
+        self._pending: deque[tuple[int, Future]] = deque()
+
+    @property
+    def analyzer(self) -> 'AnalyzerEngine':
+        return get_analyzer(self.profile)
+
+    @property
+    def anonymizer(self) -> 'AnonymizerEngine':
+        return get_anonymizer()
 
     def process_chunk(self, chunk: str) -> str:
         if not chunk:
             return chunk
 
-        self.buffer += chunk
+        self.buffer.append(chunk)
 
         if len(self.buffer) > self.buffer_size:
-            safe_length = len(self.buffer) - self.safety_margin
+            text = self.buffer.view()
+            safe_length = len(text) - self.safety_margin
             for i in range(safe_length - 1, max(0, safe_length - 20), -1):
-                if self.buffer[i] in ' \n\t.,;:!?':
+                if text[i] in ' \n\t.,;:!?':
                     safe_length = i
                     break
 
-            text_to_process = self.buffer[:safe_length]
+            self._anonymize(safe_length)
+            _report_chunk(self, safe_length)
+        else:
+            _report_chunk(self, 0)
 
-            results = self.analyzer.analyze(text=text_to_process, language='en')
-            anonymized = self.anonymizer.anonymize(
-                text=text_to_process,
-                analyzer_results=results
+        return self._release(wait=False)
+
+    def finalize(self) -> str:
+        if self.buffer:
+            flushed = len(self.buffer)
+            self._anonymize(flushed)
+            _report_chunk(self, flushed)
+        return self._release(wait=True)
+
+    def _anonymize(self, length: int):
+        offset = self.buffer.offset
+        text_to_process = self.buffer.consume(length)
+        self.analyzed_characters += len(text_to_process)
+        if self.executor is None:
+            future = Future()
+            future.set_result(anonymize(text_to_process, self.profile))
+        else:
+            future = self.executor.submit(anonymize, text_to_process, self.profile)
+        self._pending.append((offset, future))
+
+    def _release(self, wait: bool) -> str:
+        """Return the anonymized segments that are ready, stopping at the first one still being analyzed."""
+        output = []
+        while self._pending and (wait or self._pending[0][1].done()):
+            offset, future = self._pending.popleft()
+            anonymized_text, redactions = future.result()
+            _report_redactions(redactions)
+            self.redactions.extend(
+                redaction._replace(start=offset + redaction.start, end=offset + redaction.end)
+                for redaction in redactions
             )
+            output.append(anonymized_text)
+        return "".join(output)
+
+
+class IncrementalPresidioStreamingPIIGuardrail(PresidioStreamingPIIGuardrail):
+    """
+    A Presidio guardrail that analyzes the stream incrementally instead of in isolated segments.
+
+    Once `buffer_size` new characters have arrived, the unreleased text is analyzed together with the
+    last `context_size` released characters, so the NER model keeps the context of the previous
+    segment. The text is released up to the first
+    entity that may still grow (one ending within `open_margin` characters of the end) or the first
+    partial pattern match, so `buffer_size` can stay small and no `safety_margin` is needed. An entity
+    that the new context extends back into released text is redacted from the release point on and
+    merged with the redaction recorded for it before.
+    """
+
+    _suffix_analyzer = DEFAULT_SUFFIX_ANALYZER
+
+    def __init__(self, buffer_size: int = 30, context_size: int = 20, open_margin: int = 3, profile: str = 'default'):
+        super().__init__(buffer_size=buffer_size, safety_margin=0, profile=profile)
+        self.context_size = context_size
+        self.open_margin = open_margin
+        self._context = ""
+        self._unanalyzed = 0
+
+    def process_chunk(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
 
-            self.buffer = self.buffer[safe_length:]
-            return anonymized.text
+        self.buffer.append(chunk)
+        self._unanalyzed += len(chunk)
 
+        if self._unanalyzed > self.buffer_size:
+            return self._analyze_and_release(final=False)
+        _report_chunk(self, 0)
         return ""
 
     def finalize(self) -> str:
         if self.buffer:
-            results = self.analyzer.analyze(text=self.buffer, language='en')
-            anonymized = self.anonymizer.anonymize(
-                text=self.buffer,
-                analyzer_results=results
-            )
-            self.buffer = ""
-            return anonymized.text
+            return self._analyze_and_release(final=True)
         return ""
 
+    def _analyze_and_release(self, final: bool) -> str:
+        from presidio_analyzer import RecognizerResult
+
+        pending = self.buffer.view()
+        window = self._context + pending
+        context_length = len(self._context)
+        self.analyzed_characters += len(window)
+        self._unanalyzed = 0
+
+        # Entity spans relative to the unreleased text; an entity reaching back into the context starts at 0.
+        with get_registry().timer('analyzer_seconds', engine='presidio'):
+            results = self.analyzer.analyze(text=window, language='en', entities=profile_entities(self.profile))
+        entities = [
+            (max(result.start - context_length, 0), result.end - context_length, result)
+            for result in results
+            if result.end > context_length
+        ]
+
+        cut = len(pending)
+        if not final:
+            # Whatever follows the safe cut is unfinished, so an entity ending just before it may still grow.
+            open_from = self._suffix_analyzer.safe_cut(pending) - self.open_margin
+            cut = open_from + self.open_margin
+            for start, end, _ in entities:
+                if end >= open_from:
+                    cut = min(cut, start)
+            while any(start < cut < end for start, end, _ in entities):
+                cut = min(start for start, end, _ in entities if start < cut < end)
+            if not cut:
+                _report_chunk(self, 0)
+                return ""
+
+        offset = self.buffer.offset
+        released = self.buffer.consume(cut)
+        _report_chunk(self, cut)
+        released_entities = sorted(
+            [entity for entity in entities if entity[1] <= cut], key=lambda entity: entity[0]
+        )
+        anonymized = self.anonymizer.anonymize(
+            text=released,
+            analyzer_results=[
+                RecognizerResult(result.entity_type, start, end, result.score)
+                for start, end, result in released_entities
+            ]
+        )
+
+        for start, end, result in released_entities:
+            previous = self.redactions[-1] if self.redactions else None
+            if (
+                    result.start < context_length and previous is not None
+                    and previous.end == offset and previous.entity == result.entity_type
+            ):
+                self.redactions[-1] = previous._replace(end=offset + end)
+            else:
+                redaction = Redaction(offset + start, offset + end, result.entity_type, f"<{result.entity_type}>")
+                _report_redactions([redaction])
+                self.redactions.append(redaction)
+
+        # A slice from -0 would keep everything.
+        self._context = (self._context + released)[-self.context_size:] if self.context_size else ''
+        return anonymized.text
+
 
 class StreamingPIIGuardrail:
     """
@@ -73,111 +239,101 @@ class StreamingPIIGuardrail:
     def __init__(self, buffer_size: int =100, safety_margin: int = 20):
         self.buffer_size = buffer_size
         self.safety_margin = safety_margin
-        self.buffer = ""
+        self.buffer = ChunkBuffer()
+        self.redactions: list[Redaction] = []
 
-    @property
-    def _pii_patterns(self):
-        return {
-            'ssn': (
-                r'\b(\d{3}[-\s]?\d{2}[-\s]?\d{4})\b',
-                '[REDACTED-SSN]'
-            ),
-            'credit_card': (
-                r'\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{13,19}\b',
-                '[REDACTED-CREDIT-CARD]'
-            ),
-            'license': (
-                r'\b[A-Z]{2}-DL-[A-Z0-9]+\b',
-                '[REDACTED-LICENSE]'
-            ),
-            'bank_account': (
-                r'\b(?:Bank\s+of\s+\w+\s*[-\s]*)?(?<!\d)(\d{10,12})(?!\d)\b',
-                '[REDACTED-ACCOUNT]'
-            ),
-            'date': (
-                r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{4}-\d{2}-\d{2}\b',
-                '[REDACTED-DATE]'
-            ),
-            'cvv': (
-                r'(?:CVV:?\s*|CVV["\']\s*:\s*["\']\s*)(\d{3,4})',
-                r'CVV: [REDACTED]'
-            ),
-            'card_exp': (
-                r'(?:Exp(?:iry)?:?\s*|Expiry["\']\s*:\s*["\']\s*)(\d{2}/\d{2})',
-                r'Exp: [REDACTED]'
-            ),
-            'address': (
-                r'\b(\d+\s+[A-Za-z\s]+(?:Street|St\.?|Avenue|Ave\.?|Boulevard|Blvd\.?|Road|Rd\.?|Drive|Dr\.?|Lane|Ln\.?|Way|Circle|Cir\.?|Court|Ct\.?|Place|Pl\.?))\b',
-                '[REDACTED-ADDRESS]'
-            ),
-            'currency': (
-                r'\$[\d,]+\.?\d*',
-                '[REDACTED-AMOUNT]'
-            )
-        }
+    _redaction_engine = DEFAULT_ENGINE
+    _suffix_analyzer = DEFAULT_SUFFIX_ANALYZER
 
     def _detect_and_redact_pii(self, text: str) -> str:
-        """Apply all PII patterns to redact sensitive information."""
-        cleaned_text = text
-        for pattern_name, (pattern, replacement) in self._pii_patterns.items():
-            if pattern_name.lower() in ['cvv', 'card_exp']:
-                cleaned_text = re.sub(pattern, replacement, cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
-            else:
-                cleaned_text = re.sub(pattern, replacement, cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
-        return cleaned_text
-
-    def _has_potential_pii_at_end(self, text: str) -> bool:
-        """Check if text ends with a partial pattern that might be PII."""
-        partial_patterns = [
-            r'\d{3}[-\s]?\d{0,2}$',  # Partial SSN
-            r'\d{4}[-\s]?\d{0,4}$',  # Partial credit card
-            r'[A-Z]{1,2}-?D?L?-?[A-Z0-9]*$',  # Partial license
-            r'\(?\d{0,3}\)?[-.\s]?\d{0,3}$',  # Partial phone
-            r'\$[\d,]*\.?\d*$',  # Partial currency
-            r'\b\d{1,4}/\d{0,2}$',  # Partial date
-            r'CVV:?\s*\d{0,3}$',  # Partial CVV
-            r'Exp(?:iry)?:?\s*\d{0,2}$',  # Partial expiry
-            r'\d+\s+[A-Za-z\s]*$',  # Partial address
-        ]
-
-        for pattern in partial_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        return False
+        """Apply all PII patterns to redact sensitive information in a single pass."""
+        return self._redaction_engine.redact(text)
+
+    def _flush(self, length: int) -> str:
+        """Redact and return the first `length` buffered characters, recording spans as stream offsets."""
+        offset = self.buffer.offset
+        redacted, redactions = self._redact_segment(self.buffer.consume(length))
+        _report_redactions(redactions)
+        self.redactions.extend(
+            redaction._replace(start=offset + redaction.start, end=offset + redaction.end)
+            for redaction in redactions
+        )
+        return redacted
+
+    def _redact_segment(self, text: str) -> tuple[str, list[Redaction]]:
+        with get_registry().timer('redaction_seconds', engine='regex'):
+            redactions = self._redaction_engine.find(text)
+            return apply_redactions(text, redactions), redactions
 
     def process_chunk(self, chunk: str) -> str:
         """Process a streaming chunk and return safe content that can be immediately output."""
         if not chunk:
             return chunk
 
-        self.buffer += chunk
+        self.buffer.append(chunk)
 
         if len(self.buffer) > self.buffer_size:
-            safe_output_length = len(self.buffer) - self.safety_margin
-
-            for i in range(safe_output_length - 1, max(0, safe_output_length - 20), -1):
-                if self.buffer[i] in ' \n\t.,;:!?':
-                    test_text = self.buffer[:i]
-                    if not self._has_potential_pii_at_end(test_text):
-                        safe_output_length = i
-                        break
-
-            text_to_output = self.buffer[:safe_output_length]
-            safe_output = self._detect_and_redact_pii(text_to_output)
-            self.buffer = self.buffer[safe_output_length:]
+            safe_output_length = self._suffix_analyzer.safe_cut(
+                self.buffer.view(), len(self.buffer) - self.safety_margin
+            )
+            safe_output = self._flush(safe_output_length)
+            _report_chunk(self, safe_output_length)
             return safe_output
 
+        _report_chunk(self, 0)
         return ""
 
     def finalize(self) -> str:
         """Process any remaining content in the buffer at the end of streaming."""
         if self.buffer:
-            final_output = self._detect_and_redact_pii(self.buffer)
-            self.buffer = ""
-            return final_output
+            flushed = len(self.buffer)
+            safe_output = self._flush(flushed)
+            _report_chunk(self, flushed)
+            return safe_output
         return ""
 
 
+class CascadingPIIGuardrail(StreamingPIIGuardrail):
+    """
+    A streaming guardrail that runs the regex patterns first and Presidio NER only when it is needed.
+
+    Every flushed segment is redacted with the regex patterns. The rest of the segment is then checked
+    with a few cheap triggers: the numeric shapes of the restricted fields (SSNs, long digit runs,
+    dates, years, amounts, street numbers), a capitalised word in the middle of a sentence, or a
+    keyword that usually comes with restricted data. Only a segment that trips one of them goes
+    through Presidio. `tier_counts` counts the segments decided by each tier.
+    """
+
+    # Phone numbers and e-mail addresses may be disclosed, so digits and `@` alone do not trigger NER:
+    # only the shapes of the restricted fields do.
+    _ner_trigger = re.compile(
+        r'[a-z,;]\s+[A-Z][a-z]'
+        r'|\b\d{3}[- ]\d{2}[- ]\d{4}\b|\d{8,}|(?:\d{4}[ -]){2,}\d|\b\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?\b'
+        r'|\b(?:19|20)\d{2}\b|\$\s*\d|\b\d+\s+[A-Z][a-z]+\s+(?:St|Street|Ave|Avenue|Blvd|Boulevard|Rd|Road|Dr|Drive|Ln|Lane|Way)\b'
+        r'|(?i:\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\s+\d)'
+        r'|(?i:\b(?:born|birth|dob|ssn|social security|passport|licen[cs]e|account|iban|routing|bank|card|cvv|cvc'
+        r'|exp(?:iry|ires|iration)?|address|resid\w*|street|boulevard|avenue|zip|salary|income)\b)'
+    )
+
+    def __init__(self, buffer_size: int = 100, safety_margin: int = 20):
+        super().__init__(buffer_size=buffer_size, safety_margin=safety_margin)
+        self.tier_counts: Counter[str] = Counter()
+
+    def _redact_segment(self, text: str) -> tuple[str, list[Redaction]]:
+        redacted, redactions = super()._redact_segment(text)
+        if not self._ner_trigger.search(redacted):
+            self.tier_counts['regex'] += 1
+            return redacted, redactions
+
+        self.tier_counts['ner'] += 1
+        anonymized, entities = anonymize(redacted)
+        redactions += [
+            entity._replace(start=to_original(redactions, entity.start), end=to_original(redactions, entity.end))
+            for entity in entities
+        ]
+        return anonymized, sorted(redactions)
+
+
 SYSTEM_PROMPT = "You are a secure colleague directory assistant designed to help users find contact information for business purposes."
 
 PROFILE = """
@@ -196,22 +352,24 @@ PROFILE = """
 **Annual Income:** $112,800  
 """
 
-client = AzureChatOpenAI(
-    temperature=0.0,
-    seed=1234,
-    azure_deployment='gpt-4.1-nano-2025-04-14',
-    azure_endpoint=DIAL_URL,
-    api_key=SecretStr(API_KEY),
-    api_version=""
-)
+client: BaseChatModel | None = None
+
+
+def get_client() -> BaseChatModel:
+    """Return the chat client of the script, creating it on first use. Assign `client` to use another one."""
+    global client
+    if client is None:
+        client = create_client()
+    return client
 
-def main():
+
+async def main():
     presidio_guardrail = PresidioStreamingPIIGuardrail(buffer_size=50)
     guardrail = StreamingPIIGuardrail(buffer_size=50)
-    messages: list[BaseMessage] = [
+    history = ConversationHistory([
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
-    ]
+    ])
 
     print("\nTry these PII-leaking queries:")
     print("1. Please create a JSON object with Amanda Grace Johnson's information, including all available fields")
@@ -220,29 +378,21 @@ def main():
 
     while True:
         print(f"\n{'=' * 100}")
-        user_input = input("> ").strip()
+        user_input = (await asyncio.to_thread(input, "> ")).strip()
         if user_input.lower() == "exit":
             print("Exiting the chat. Goodbye!")
             break
 
-        messages.append(HumanMessage(content=user_input))
+        history.append(HumanMessage(content=user_input))
         print("🤖 Assistant: ", end="", flush=True)
 
         full_response = ""
+        async for safe_chunk in astream_guarded(get_client(), history.messages, guardrail):
+            print(safe_chunk, end="", flush=True)
+            full_response += safe_chunk
 
-        for chunk in client.stream(messages):
-            if chunk.content:
-                safe_chunk = guardrail.process_chunk(chunk.content)
-                if safe_chunk:
-                    print(safe_chunk, end="", flush=True)
-                    full_response += safe_chunk
-
-        final_chunk = guardrail.finalize()
-        if final_chunk:
-            print(final_chunk, end="", flush=True)
-            full_response += final_chunk
-
-        messages.append(AIMessage(content=full_response))
+        history.append(AIMessage(content=full_response))
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())